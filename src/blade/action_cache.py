@@ -0,0 +1,112 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the action cache module which saves the outputs of the build
+ actions, such as running protoc or generating resource files, keyed by
+ the signature of everything the action depends on, so that the action
+ needn't be run again if the outputs are in the cache.
+
+"""
+
+
+import os
+import shutil
+import stat
+
+from blade_util import md5sum_str
+
+
+class ActionCache(object):
+    """The content addressed cache of the action outputs.
+
+    The key of an action is the md5sum of the command line, the contents
+    of its input files and the fingerprint of the toolchain, which are
+    given by the caller.  Each output of the action is saved as a file
+    named by the key and its index in the cache dir, the same 2-letter
+    subdirs as the scons cache are used, so the files could be managed
+    by the ScacheManager together with the scons cache files.  The files
+    missing in the cache dir are downloaded from the remote cache if it is
+    set, and the new files are uploaded to it.
+
+    """
+    def __init__(self, cache_path, scache_manager=None, remote_cache=None):
+        self.cache_path = cache_path
+        self.scache_manager = scache_manager
+        self.remote_cache = remote_cache
+
+    @staticmethod
+    def key(signature, outputs, inputs):
+        """Return the key of the action.
+
+        signature is a list of strings identifying the action, such as the
+        command line and the fingerprint of the tool, inputs is a list of
+        (path, content signature) of the input files.
+
+        """
+        items = signature + outputs
+        for (path, csig) in inputs:
+            items.append('%s %s' % (path, csig))
+        return md5sum_str('\n'.join(items))
+
+    def _cache_file(self, key, index):
+        return os.path.join(self.cache_path, key[:2].upper(),
+                            '%s_%d' % (key, index))
+
+    def _record(self, cache_file):
+        if self.scache_manager:
+            self.scache_manager.record(cache_file)
+
+    def _download(self, cache_file):
+        """Download the missing cache file from the remote cache. """
+        if not self.remote_cache:
+            return False
+        return self.remote_cache.get('ac', os.path.basename(cache_file),
+                                     cache_file)
+
+    @staticmethod
+    def _copy(src, dst):
+        """Copy the file atomically. """
+        temp = '%s.tmp%d' % (dst, os.getpid())
+        shutil.copy2(src, temp)
+        os.chmod(temp, stat.S_IMODE(os.stat(src).st_mode) | stat.S_IWRITE)
+        os.rename(temp, dst)
+
+    def retrieve(self, key, outputs):
+        """Copy the cached outputs of the action, return True on hit. """
+        cache_files = [self._cache_file(key, i) for i in range(len(outputs))]
+        for cache_file in cache_files:
+            if not os.path.isfile(cache_file) and not self._download(cache_file):
+                return False
+        try:
+            for cache_file, output in zip(cache_files, outputs):
+                self._copy(cache_file, output)
+        except (IOError, OSError):
+            # Evicted by others during copying
+            return False
+        for cache_file in cache_files:
+            self._record(cache_file)
+        return True
+
+    def store(self, key, outputs):
+        """Save the outputs of the action into the cache. """
+        for output in outputs:
+            if not os.path.isfile(output) or os.path.islink(output):
+                return
+        cache_dir = os.path.dirname(self._cache_file(key, 0))
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            for i, output in enumerate(outputs):
+                cache_file = self._cache_file(key, i)
+                self._copy(output, cache_file)
+                self._record(cache_file)
+                if self.remote_cache:
+                    self.remote_cache.put('ac', os.path.basename(cache_file),
+                                          cache_file)
+        except (IOError, OSError):
+            # The cache is only an optimization, ignore the failures
+            pass
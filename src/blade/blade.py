@@ -21,7 +21,17 @@ from blade_util import relative_path, cpu_count
 from dependency_analyzer import analyze_deps
 from load_build_files import load_targets
 from blade_platform import SconsPlatform
+from toolchain_cache import ToolchainCache
 from build_environment import BuildEnvironment
+from concurrency_controller import CONCURRENCY_LOG_FILE
+from concurrency_controller import ConcurrencyController
+from concurrency_controller import estimate_distcc_jobs
+from concurrency_controller import probe_distcc_hosts
+from link_scheduler import LINK_MEMORY_FILE
+from link_scheduler import estimate_link_jobs
+from link_scheduler import load_link_memory
+from rules_generator import NativeRulesGenerator
+from rules_generator import NinjaRulesGenerator
 from rules_generator import SconsRulesGenerator
 from binary_runner import BinaryRunner
 from test_runner import TestRunner
@@ -71,9 +81,24 @@ class Blade(object):
         # command line targets.
         self.__target_database = {}
 
+        # The keys of the targets in the target_database, in the order
+        # of registering.
+        self.__registered_target_keys = []
+
+        # Reverse dependency indexes of the target_database, map target key
+        # or dir to the keys of the targets depend on it directly, in the
+        # order of registering.
+        self.__direct_dependers = {}
+        self.__dir_dependers = {}
+
         # targets to build after loading the build files.
         self.__build_targets = {}
 
+        # Reverse dependency index of the build targets, map target key to
+        # the keys of the targets depend on it directly or indirectly.
+        # Built after the deps are expanded.
+        self.__all_dependers = {}
+
         # The targets keys list after sorting by topological sorting method.
         # Used to generate build rules in correct order.
         self.__sorted_targets_keys = []
@@ -81,8 +106,21 @@ class Blade(object):
         # Inidcating that whether the deps list is expanded by expander or not
         self.__targets_expanded = False
 
-        self.__scons_platform = SconsPlatform()
-        self.build_environment = BuildEnvironment(self.__root_dir)
+        # The executor of the build actions for the native backend
+        self.__native_executor = None
+
+        # The sources in more than one cc_binary or cc_test in the same dir,
+        # as (path, src) pairs, and the paths of the shared objects whose
+        # rules are already generated, see CcTarget._cc_object_path
+        self.__shared_sources = None
+        self.__generated_shared_objects = set()
+
+        # The toolchain info is probed on demand and cached in the build dir
+        toolchain_cache = ToolchainCache(
+                os.path.join(self.__build_path, '.blade.toolchain_cache'))
+        self.__scons_platform = SconsPlatform(toolchain_cache)
+        self.build_environment = BuildEnvironment(
+                self.__root_dir, toolchain_cache=toolchain_cache)
 
         self.svn_root_dirs = []
 
@@ -130,6 +168,7 @@ class Blade(object):
         console.info('analyzing dependency graph...')
         self.__sorted_targets_keys = analyze_deps(self.__build_targets)
         self.__targets_expanded = True
+        self._build_all_dependers_index()
 
         console.info('analyzing done.')
         return self.__build_targets  # For test
@@ -137,9 +176,22 @@ class Blade(object):
     def generate_build_rules(self):
         """Generate the constructing rules. """
         console.info('generating build rules...')
-        build_rules_generator = SconsRulesGenerator('SConstruct',
-                                                    self.__blade_path, self)
-        rules_buf = build_rules_generator.generate_scons_script()
+        self.__generated_shared_objects = set()
+        backend = getattr(self.__options, 'backend', 'scons')
+        if backend == 'native':
+            build_rules_generator = NativeRulesGenerator(self.__blade_path, self)
+            self.__native_executor = build_rules_generator.generate_executor()
+            rules_buf = ['%s\n' % cmd
+                         for cmd in self.__native_executor.get_commands()]
+        elif backend == 'ninja':
+            build_rules_generator = NinjaRulesGenerator(
+                    os.path.join(self.__build_path, 'build.ninja'),
+                    self.__blade_path, self)
+            rules_buf = build_rules_generator.generate_ninja_script()
+        else:
+            build_rules_generator = SconsRulesGenerator('SConstruct',
+                                                        self.__blade_path, self)
+            rules_buf = build_rules_generator.generate_scons_script()
         console.info('generating done.')
         return rules_buf
 
@@ -147,8 +199,53 @@ class Blade(object):
         """Generate the build script. """
         self.load_targets()
         self.analyze_targets()
+        if getattr(self.__options, 'report_incs', False):
+            self.report_include_paths()
         self.generate_build_rules()
 
+    def report_include_paths(self):
+        """Report the include paths saved by the direct export_incs. """
+        reductions = []
+        for key in self.__sorted_targets_keys:
+            target = self.__build_targets[key]
+            if not hasattr(target, 'get_include_paths_reduction'):
+                continue
+            (direct, transitive) = target.get_include_paths_reduction()
+            reductions.append((transitive - direct, direct, transitive, key))
+        reductions.sort(reverse=True)
+        for (saved, direct, transitive, key) in reductions:
+            if saved:
+                console.info('//%s:%s: %d include paths, %d if transitive' % (
+                             key[0], key[1], direct, transitive))
+        direct_total = sum([r[1] for r in reductions])
+        transitive_total = sum([r[2] for r in reductions])
+        console.info('%d include paths in %d cc targets, %d if transitive' % (
+                     direct_total, len(reductions), transitive_total))
+
+    def execute_build_actions(self):
+        """Run the build actions with the native executor. """
+        options = self.__options
+        concurrency_controller = None
+        if getattr(options, 'adaptive_jobs', False):
+            distcc_hosts = []
+            if (configparse.blade_config.get_config('distcc_config')['enabled']
+                and self.build_environment.distcc_env_prepared):
+                distcc_hosts = self.build_environment.get_distcc_hosts_list()
+            concurrency_controller = ConcurrencyController(
+                    options.jobs,
+                    os.path.join(self.__build_path, CONCURRENCY_LOG_FILE),
+                    distcc_hosts,
+                    distcc_jobs=options.distcc_jobs)
+        return self.__native_executor.execute(options.jobs,
+                                              options.keep_going,
+                                              options.verbose,
+                                              options.link_jobs,
+                                              concurrency_controller)
+
+    def clean_build_actions(self):
+        """Remove the outputs of the build actions of the native executor. """
+        return self.__native_executor.clean()
+
     def run(self, target):
         """Run the target. """
         key = self._get_normpath_target(target)
@@ -249,10 +346,7 @@ class Blade(object):
             result_map[key] = ([], [])
             deps = all_targets[key].expanded_deps
             deps.sort(key=lambda x: x, reverse=False)
-            depended_by = []
-            for tkey in all_targets:
-                if key in all_targets[tkey].expanded_deps:
-                    depended_by.append(tkey)
+            depended_by = self.get_all_dependers(key)
             depended_by.sort(key=lambda x: x, reverse=False)
             result_map[key] = (list(deps), list(depended_by))
         return result_map
@@ -277,6 +371,10 @@ class Blade(object):
         """Get the whole target database that haven't been expanded. """
         return self.__target_database
 
+    def get_registered_target_keys(self):
+        """Get the keys of all registered targets in registering order. """
+        return self.__registered_target_keys
+
     def get_direct_targets(self):
         """Return the direct targets. """
         return self.__direct_targets
@@ -293,6 +391,31 @@ class Blade(object):
         """Whether the targets are expanded. """
         return self.__targets_expanded
 
+    def is_shared_source(self, path, src):
+        """Whether the source is in several cc_binary or cc_test targets.
+
+        All loaded targets are counted, instead of the build targets, so
+        the result doesn't change with the targets to build.
+
+        """
+        if self.__shared_sources is None:
+            owners = {}
+            for target in self.__target_database.itervalues():
+                if target.type not in ('cc_binary', 'cc_test'):
+                    continue
+                for s in target.srcs:
+                    owners[(target.path, s)] = owners.get((target.path, s), 0) + 1
+            self.__shared_sources = set([k for k, n in owners.iteritems()
+                                         if n > 1])
+        return (path, src) in self.__shared_sources
+
+    def register_shared_object(self, obj):
+        """Return True if the rule of the shared object is not generated. """
+        if obj in self.__generated_shared_objects:
+            return False
+        self.__generated_shared_objects.add(obj)
+        return True
+
     def register_target(self, target):
         """Register scons targets into the scons targets map.
 
@@ -307,6 +430,39 @@ class Blade(object):
                     'target name %s is duplicate in //%s/BUILD' % (
                         target.name, target.path))
         self.__target_database[target_key] = target
+        self.__registered_target_keys.append(target_key)
+        # Before being expanded, the expanded_deps contains the direct deps
+        # and the hardcode deps
+        for dkey in target.expanded_deps:
+            self.__direct_dependers.setdefault(dkey, []).append(target_key)
+            dir_dependers = self.__dir_dependers.setdefault(dkey[0], [])
+            if not dir_dependers or dir_dependers[-1] != target_key:
+                dir_dependers.append(target_key)
+
+    def _build_all_dependers_index(self):
+        """Build the reverse index of the expanded deps of build targets. """
+        all_dependers = {}
+        for key, target in self.__build_targets.iteritems():
+            for dkey in target.expanded_deps:
+                all_dependers.setdefault(dkey, []).append(key)
+        self.__all_dependers = all_dependers
+
+    def get_direct_dependers(self, key):
+        """Get the keys of registered targets depend on the key directly. """
+        return list(self.__direct_dependers.get(key, []))
+
+    def get_dir_dependers(self, dir):
+        """Get the keys of registered targets depend on targets in the dir. """
+        return list(self.__dir_dependers.get(dir, []))
+
+    def get_all_dependers(self, key):
+        """Get the keys of build targets depend on the key.
+
+        Both direct and indirect dependers are included, only available
+        after the deps are expanded.
+
+        """
+        return list(self.__all_dependers.get(key, []))
 
     def _is_scons_object_type(self, target_type):
         """The types that shouldn't be registered into blade manager.
@@ -319,26 +475,50 @@ class Blade(object):
         """
         return target_type != 'system_library'
 
-    def gen_targets_rules(self):
-        """Get the build rules and return to the object who queries this. """
-        rules_buf = []
-        skip_test_targets = False
-        if getattr(self.__options, 'no_test', False):
-            skip_test_targets = True
+    def get_rules_targets_keys(self):
+        """Return the keys of targets to generate rules, deps go first. """
+        keys = []
+        skip_test_targets = getattr(self.__options, 'no_test', False)
         for k in self.__sorted_targets_keys:
             target = self.__build_targets[k]
             if not self._is_scons_object_type(target.type):
                 continue
+            if skip_test_targets and target.type == 'cc_test':
+                continue
+            keys.append(k)
+        return keys
+
+    def gen_targets_rules(self, keys=None):
+        """Get the build rules and return to the object who queries this.
+
+        Only the rules of the given targets are generated if keys is
+        specified, otherwise the rules of all targets are generated.
+
+        """
+        rules_buf = []
+        if keys is None:
+            keys = self.get_rules_targets_keys()
+        for k in keys:
             scons_object = self.__target_database.get(k, None)
             if not scons_object:
                 console.warning('not registered scons object, key %s' % str(k))
                 continue
-            if skip_test_targets and target.type == 'cc_test':
-                continue
             scons_object.scons_rules()
             rules_buf += scons_object.get_rules()
         return rules_buf
 
+    def gen_targets_build_actions(self):
+        """Get the build actions of targets as a list of (key, actions). """
+        targets_actions = []
+        for k in self.get_rules_targets_keys():
+            target = self.__build_targets[k]
+            actions = target.build_actions()
+            if actions is None:
+                console.error_exit('//%s:%s: %s can only be built by scons' % (
+                                   target.path, target.name, target.type))
+            targets_actions.append((k, actions))
+        return targets_actions
+
     def get_scons_platform(self):
         """Return handle of the platform class. """
         return self.__scons_platform
@@ -355,26 +535,45 @@ class Blade(object):
         return keywords
 
     def tune_parallel_jobs_num(self):
-        """Tune the jobs num. """
+        """Tune the jobs num.
+
+        The jobs num is the upper bound of the commands running at the same
+        time, unless it is specified by the user, the commands are adjusted
+        during building by the concurrency controller.
+
+        """
         user_jobs_num = self.__options.jobs
-        jobs_num = 0
+        self.__options.adaptive_jobs = user_jobs_num < 1
+        self.__options.distcc_jobs = None
         cpu_core_num = cpu_count()
         distcc_enabled = configparse.blade_config.get_config('distcc_config')['enabled']
 
-        if distcc_enabled and self.build_environment.distcc_env_prepared:
-            jobs_num = int(1.5 * len(self.build_environment.get_distcc_hosts_list())) + 1
-            if jobs_num > 20:
-                jobs_num = 20
-            if jobs_num and self.__options.jobs != jobs_num:
-                self.__options.jobs = jobs_num
-        elif self.__options.jobs < 1:
-            if cpu_core_num <= 4:
+        if self.__options.jobs < 1:
+            if distcc_enabled and self.build_environment.distcc_env_prepared:
+                host_status = probe_distcc_hosts(
+                        self.build_environment.get_distcc_hosts_list())
+                for (host, limit, latency) in host_status:
+                    if latency is None:
+                        console.warning('distcc host %s is down' % host)
+                    else:
+                        console.info('distcc host %s: %d jobs, %dms' % (
+                                     host, limit, latency * 1000))
+                self.__options.distcc_jobs = estimate_distcc_jobs(host_status)
+                self.__options.jobs = self.__options.distcc_jobs
+            if self.__options.jobs < 1:
+                # Leave room for the controller to raise the jobs when the
+                # commands wait for io
                 self.__options.jobs = 2 * cpu_core_num
-            else:
-                self.__options.jobs = cpu_core_num
-                if self.__options.jobs > 8:
-                    self.__options.jobs = 8
         if self.__options.jobs != user_jobs_num:
-            console.info('tunes the parallel jobs number(-j N) to be %d' % (
-                self.__options.jobs))
+            console.info('tunes the parallel jobs number(-j N) to be at '
+                         'most %d' % self.__options.jobs)
+
+        # The links run in a separate pool sized from the available memory
+        if getattr(self.__options, 'link_jobs', 0) <= 0:
+            link_memory = load_link_memory(
+                    os.path.join(self.__build_path, LINK_MEMORY_FILE))
+            self.__options.link_jobs = estimate_link_jobs(self.__options.jobs,
+                                                          link_memory)
+            console.info('tunes the parallel link jobs number to be %d' % (
+                self.__options.link_jobs))
         return self.__options.jobs
@@ -77,6 +77,7 @@ import console
 import configparse
 
 from blade import Blade
+from blade_util import cpu_count
 from blade_util import get_cwd
 from blade_util import lock_file
 from blade_util import unlock_file
@@ -261,6 +262,10 @@ def _main(blade_path):
                             options,
                             command)
 
+        # Tune the jobs num, which is used by the ninja pools
+        if command in ['build', 'run', 'test']:
+            options.jobs = blade.blade.tune_parallel_jobs_num()
+
         # Build the targets
         blade.blade.generate()
 
@@ -268,10 +273,6 @@ def _main(blade_path):
         sys.stdout.flush()
         sys.stderr.flush()
 
-        # Tune the jobs num
-        if command in ['build', 'run', 'test']:
-            options.jobs = blade.blade.tune_parallel_jobs_num()
-
         # Switch case due to different sub command
         action = {
                  'build': build,
@@ -286,7 +287,8 @@ def _main(blade_path):
                 command == 'clean' or command == 'query'):
             try:
                 if locked_scons:
-                    os.remove(os.path.join(blade_root_dir, 'SConstruct'))
+                    if getattr(options, 'backend', 'scons') == 'scons':
+                        os.remove(os.path.join(blade_root_dir, 'SConstruct'))
                     unlock_file(lock_file_fd.fileno())
                 lock_file_fd.close()
             except OSError:
@@ -294,16 +296,43 @@ def _main(blade_path):
     return 0
 
 
+def _ninja_file():
+    return os.path.join(blade.blade.get_build_path(), 'build.ninja')
+
+
 def _build(options):
     if options.scons_only:
         return 0
 
-    scons_options = '--duplicate=soft-copy --cache-show'
-    scons_options += ' -j %s' % options.jobs
-    if options.keep_going:
-        scons_options += ' -k'
+    if options.backend == 'native':
+        ret = blade.blade.execute_build_actions()
+        if ret:
+            console.error('building failure')
+        return ret
 
-    p = subprocess.Popen('scons %s' % scons_options, shell=True)
+    if options.backend == 'ninja':
+        cmd = 'ninja -f %s -j %s' % (_ninja_file(),
+                                     options.jobs + options.link_jobs)
+        if getattr(options, 'adaptive_jobs', False):
+            # Ninja couldn't be controlled at runtime, but it stops starting
+            # new commands when the machine is overloaded
+            cmd += ' -l %d' % cpu_count()
+        if options.keep_going:
+            cmd += ' -k 0'
+        if options.verbose:
+            cmd += ' -v'
+    else:
+        cmd = 'scons --duplicate=soft-copy --cache-show'
+        cmd += ' -j %s link_jobs=%s' % (options.jobs + options.link_jobs,
+                                        options.link_jobs)
+        if getattr(options, 'adaptive_jobs', False):
+            cmd += ' adaptive_jobs=1'
+            if options.distcc_jobs is not None:
+                cmd += ' distcc_jobs=%d' % options.distcc_jobs
+        if options.keep_going:
+            cmd += ' -k'
+
+    p = subprocess.Popen(cmd, shell=True)
     try:
         p.wait()
         if p.returncode:
@@ -335,8 +364,15 @@ def test(options):
 def clean(options):
     console.info('cleaning...(hint: please specify --generate-dynamic to '
                  'clean your so)')
-    p = subprocess.Popen('scons --duplicate=soft-copy -c -s --cache-show',
-                         shell=True)
+    if options.backend == 'native':
+        ret = blade.blade.clean_build_actions()
+        console.info('cleaning done.')
+        return ret
+    if options.backend == 'ninja':
+        cmd = 'ninja -f %s -t clean' % _ninja_file()
+    else:
+        cmd = 'scons --duplicate=soft-copy -c -s --cache-show'
+    p = subprocess.Popen(cmd, shell=True)
     p.wait()
     console.info('cleaning done.')
     return p.returncode
@@ -15,18 +15,30 @@
 import os
 import subprocess
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 import configparse
+import console
+from blade_util import get_program_stamp
 from blade_util import var_to_list
+from toolchain_cache import ToolchainCache
 
 
 class SconsPlatform(object):
-    """The scons platform class that it handles and gets the platform info. """
-    def __init__(self):
+    """The scons platform class that it handles and gets the platform info.
+
+    The platform info is probed on demand when it is firstly used, and
+    cached in the toolchain cache.
+
+    """
+    def __init__(self, toolchain_cache=None):
         """Init. """
-        self.gcc_version = self._get_gcc_version('gcc')
-        self.python_inc = self._get_python_include()
-        self.php_inc_list = self._get_php_include()
-        self.java_inc_list = self._get_java_include()
+        if toolchain_cache is None:
+            toolchain_cache = ToolchainCache()
+        self.toolchain_cache = toolchain_cache
 
     @staticmethod
     def _get_gcc_version(compiler):
@@ -106,55 +118,135 @@ class SconsPlatform(object):
 
     def get_gcc_version(self):
         """Returns gcc version. """
-        return self.gcc_version
+        return self.toolchain_cache.get(
+                'gcc_version', 'gcc', lambda: self._get_gcc_version('gcc'))
 
     def get_python_include(self):
         """Returns python include. """
-        return self.python_inc
+        return self.toolchain_cache.get(
+                'python_include', 'python-config', self._get_python_include)
 
     def get_php_include(self):
         """Returns a list of php include. """
-        return self.php_inc_list
+        return self.toolchain_cache.get(
+                'php_include', 'php-config', self._get_php_include)
 
     def get_java_include(self):
         """Returns a list of java include. """
-        return self.java_inc_list
+        if os.environ.get('JAVA_HOME', ''):
+            return self._get_java_include()
+        return self.toolchain_cache.get(
+                'java_include', 'java', self._get_java_include)
 
 
 class CcFlagsManager(object):
     """The CcFlagsManager class.
 
-    This class manages the compile warning flags.
+    This class manages the compile warning flags.  Whether the compiler
+    supports a flag is probed by running it, the results are cached in
+    the build dir so that they needn't be probed again.
 
     """
-    def __init__(self, options):
+    # The -x options to probe the flags of each type
+    _flag_type_options = {
+            'cpp': [],
+            'c': ['-xc'],
+            'cxx': ['-xc++'],
+    }
+
+    def __init__(self, options, build_dir=None, gcc_version=''):
         self.options = options
-        self.cpp_str = ''
+        self.gcc_version = gcc_version
+        self.cpp_str = 'cpp'
+        self.cpp_stamp = None
+        self.flags_cache = None
+        self.flags_cache_file = None
+        if build_dir:
+            self.flags_cache_file = os.path.join(build_dir, '.blade.flags_cache')
+
+    def _load_flags_cache(self):
+        """Load the cached probing results of the flags. """
+        self.flags_cache = {}
+        if not self.flags_cache_file or not os.path.exists(self.flags_cache_file):
+            return
+        try:
+            f = open(self.flags_cache_file, 'rb')
+            try:
+                self.flags_cache = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            console.warning('error loading flags cache %s, ignored' %
+                            self.flags_cache_file)
+
+    def _save_flags_cache(self):
+        """Save the probing results of the flags. """
+        if not self.flags_cache_file:
+            return
+        cache_dir = os.path.dirname(self.flags_cache_file)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        temp_file = '%s.tmp' % self.flags_cache_file
+        f = open(temp_file, 'wb')
+        try:
+            pickle.dump(self.flags_cache, f, 2)
+        finally:
+            f.close()
+        os.rename(temp_file, self.flags_cache_file)
+
+    def _probe_flags(self, flag_types):
+        """Probe the (flag_type, flag) pairs which are not in the cache.
+
+        The compiler is run for all of the flags in parallel, and the
+        results are keyed by the compiler and its mtime as well.
+
+        """
+        if self.flags_cache is None:
+            self._load_flags_cache()
+        if self.cpp_stamp is None:
+            self.cpp_stamp = get_program_stamp(self.cpp_str.split()[0])
+        probes = []
+        devnull = open(os.devnull, 'r+')
+        try:
+            for flag_type, flag in flag_types:
+                key = (self.cpp_str, self.cpp_stamp, flag_type, flag)
+                if key in self.flags_cache:
+                    continue
+                self.flags_cache[key] = None
+                cmd = (self.cpp_str.split() +
+                       self._flag_type_options[flag_type] + [flag, '-'])
+                try:
+                    p = subprocess.Popen(cmd,
+                                         stdin=devnull,
+                                         stdout=devnull,
+                                         stderr=devnull)
+                except OSError:
+                    p = None
+                probes.append((key, p))
+            for key, p in probes:
+                self.flags_cache[key] = p is not None and p.wait() == 0
+        finally:
+            devnull.close()
+        if probes:
+            self._save_flags_cache()
 
     def _filter_out_invalid_flags(self, flag_list, flag_type='cpp'):
         """filter the unsupported compliation flags. """
-        flag_type_list = ['cpp', 'c', 'cxx']
         flag_list_var = var_to_list(flag_list)
-        if not flag_type in flag_type_list:
+        if not flag_type in self._flag_type_options:
             return flag_list
 
-        option = ''
-        if flag_type == 'c':
-            option = '-xc'
-        elif flag_type == 'cxx':
-            option = '-xc++'
-
+        self._probe_flags([(flag_type, flag) for flag in flag_list_var])
         ret_flag_list = []
         for flag in flag_list_var:
-            cmd_str = 'echo "" | %s %s %s >/dev/null 2>&1' % (
-                      self.cpp_str, option, flag)
-            if subprocess.call(cmd_str, shell=True) == 0:
+            if self.flags_cache[(self.cpp_str, self.cpp_stamp, flag_type, flag)]:
                 ret_flag_list.append(flag)
         return ret_flag_list
 
     def set_cpp_str(self, cpp_str):
         """set up the cpp_str. """
         self.cpp_str = cpp_str
+        self.cpp_stamp = None
 
     def get_flags_except_warning(self):
         """Get the flags that are not warning flags. """
@@ -164,6 +256,15 @@ class CcFlagsManager(object):
             flags_except_warning += ['-ggdb3', '-fstack-protector']
         elif self.options.profile == 'release':
             flags_except_warning += ['-g', '-DNDEBUG']
+        if getattr(self.options, 'split_debug', False):
+            # The debug information is written into the .dwo files, instead
+            # of being copied into the objects and then the binaries
+            split_debug_flags = ['-gsplit-dwarf']
+            if getattr(self.options, 'dwp', False):
+                # The dwp of binutils can't package the DWARF 5 units
+                split_debug_flags.append('-gdwarf-4')
+            flags_except_warning += self._filter_out_invalid_flags(
+                    split_debug_flags)
         flags_except_warning += [
                 '-D_FILE_OFFSET_BITS=64',
                 '_D__STDC_CONSTANT_MACROS',
@@ -176,7 +277,7 @@ class CcFlagsManager(object):
             linkflags.append('-pg')
 
         if getattr(self.options, 'gcov', False):
-            if SconsPlatform().gcc_version > '4.1':
+            if self.gcc_version > '4.1':
                 flags_except_warning.append('--coverage')
                 linkflags.append('--coverage')
             else:
@@ -196,6 +297,10 @@ class CcFlagsManager(object):
         cxxflags = cc_config['cxx_warnings']
         cflags = cc_config['c_warnings']
 
+        # Probe all of the flags at once
+        self._probe_flags([('cpp', flag) for flag in cppflags] +
+                          [('cxx', flag) for flag in cxxflags] +
+                          [('c', flag) for flag in cflags])
         filtered_cppflags = self._filter_out_invalid_flags(cppflags, 'cpp')
         filtered_cxxflags = self._filter_out_invalid_flags(cxxflags, 'cxx')
         filtered_cflags = self._filter_out_invalid_flags(cflags, 'c')
@@ -14,8 +14,9 @@
 """
 
 import fcntl
+import mmap
 import os
-import subprocess
+import time
 
 import console
 
@@ -40,6 +41,63 @@ def md5sum(obj):
     return md5sum_str(obj)
 
 
+# __file__ may be relative and the working dir may change later
+_BLADE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def md5sum_file(file_name):
+    """caculate md5sum of the file content. """
+    m = md5.md5()
+    f = open(file_name, 'rb')
+    try:
+        while True:
+            data = f.read(65536)
+            if not data:
+                break
+            m.update(data)
+    finally:
+        f.close()
+    return m.hexdigest()
+
+
+_blade_digest = None
+
+
+def get_blade_digest():
+    """Return the md5sum of blade itself.
+
+    Unlike the stamp, it is the same on all machines running the same
+    blade, so it could be used in the keys shared by the remote cache.
+
+    """
+    global _blade_digest
+    if _blade_digest is None:
+        blade_dir = _BLADE_DIR
+        if os.path.isfile(blade_dir):
+            _blade_digest = md5sum_file(blade_dir)
+        else:
+            _blade_digest = md5sum_str('\n'.join([
+                    '%s %s' % (f, md5sum_file(os.path.join(blade_dir, f)))
+                    for f in sorted(os.listdir(blade_dir))
+                    if f.endswith('.py')]))
+    return _blade_digest
+
+
+def get_blade_stamp():
+    """Return a string which changes whenever blade itself is updated.
+
+    Blade may be run from a zip ball or from the source directory, use
+    the mtime of the zip ball or the newest python source respectively.
+
+    """
+    blade_dir = _BLADE_DIR
+    if os.path.isfile(blade_dir):
+        return str(os.path.getmtime(blade_dir))
+    mtimes = [os.path.getmtime(os.path.join(blade_dir, f))
+              for f in os.listdir(blade_dir) if f.endswith('.py')]
+    return str(max(mtimes))
+
+
 def lock_file(fd, flags):
     """lock file. """
     try:
@@ -104,11 +162,20 @@ def get_cwd():
 
     os.getcwd() doesn't work because it will follow symbol link.
     os.environ.get('PWD') doesn't work because it won't reflect os.chdir().
-    So in practice we simply use system('pwd') to get current working directory.
+    So in practice we use PWD if it is still the current working directory,
+    which is the same as what the 'pwd' command of shell does.
 
     """
-    p = subprocess.Popen(['pwd'], stdout=subprocess.PIPE, shell=True)
-    return p.communicate()[0].strip()
+    cwd = os.getcwd()
+    pwd = os.environ.get('PWD')
+    if (pwd and os.path.isabs(pwd) and
+        '.' not in pwd.split('/') and '..' not in pwd.split('/')):
+        try:
+            if os.path.samefile(pwd, cwd):
+                return pwd
+        except OSError:
+            pass
+    return cwd
 
 
 def environ_add_path(env, key, path):
@@ -126,3 +193,116 @@ def cpu_count():
         return multiprocessing.cpu_count()
     except ImportError:
         return int(os.sysconf('SC_NPROCESSORS_ONLN'))
+
+
+def get_available_memory():
+    """Return the available memory in bytes, or None if it is unknown. """
+    try:
+        f = open('/proc/meminfo')
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+    except IOError:
+        return None
+    meminfo = {}
+    for line in lines:
+        fields = line.split()
+        if len(fields) >= 2 and fields[1].isdigit():
+            meminfo[fields[0].rstrip(':')] = int(fields[1]) * 1024
+    if 'MemAvailable' in meminfo:
+        return meminfo['MemAvailable']
+    # Estimate it on the old kernels
+    if 'MemFree' in meminfo:
+        return (meminfo['MemFree'] + meminfo.get('Buffers', 0) +
+                meminfo.get('Cached', 0))
+    return None
+
+
+def which(program):
+    """Return the full path of the executable program, or None. """
+    if os.path.dirname(program):
+        candidates = [program]
+    else:
+        candidates = [os.path.join(path, program) for path in
+                      os.environ.get('PATH', '').split(os.pathsep)]
+    for path in candidates:
+        if os.path.isfile(path) and os.access(path, os.X_OK):
+            return path
+    return None
+
+
+def get_program_stamp(program):
+    """Return a string which changes when the program is changed. """
+    path = which(program)
+    if not path:
+        return ''
+    path = os.path.realpath(path)
+    return '%s:%s' % (path, os.path.getmtime(path))
+
+
+# The md5sums of the programs, keyed by the real path, with their mtimes
+# and sizes, see get_program_digest
+_program_digests = {}
+
+
+def get_program_digest(program):
+    """Return the md5sum of the program, or None if it is not found.
+
+    Unlike the stamp, it is the same on all machines with the same
+    program, so it could be used in the keys shared by the remote cache.
+
+    """
+    path = which(program)
+    if not path:
+        return None
+    path = os.path.realpath(path)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    stat = (st.st_mtime, st.st_size)
+    cached = _program_digests.get(path)
+    if cached and cached[0] == stat:
+        return cached[1]
+    try:
+        digest = md5sum_file(path)
+    except IOError:
+        return None
+    _program_digests[path] = (stat, digest)
+    return digest
+
+
+# The build time in the version information is a fixed size array with
+# this placeholder, which is replaced with the real build time after
+# linking, see stamp_build_time
+BUILD_TIME_SIZE = 64
+BUILD_TIME_PLACEHOLDER = '@BLADE_BUILD_TIME@'
+
+
+def stamp_build_time(path, build_time=None):
+    """Stamp the build time into the linked binary in place.
+
+    Returns False if there is no build time placeholder in the binary.
+
+    """
+    if build_time is None:
+        build_time = time.asctime()
+    placeholder = BUILD_TIME_PLACEHOLDER.ljust(BUILD_TIME_SIZE, '\0')
+    f = open(path, 'r+b')
+    try:
+        size = os.fstat(f.fileno()).st_size
+        if size < BUILD_TIME_SIZE:
+            return False
+        m = mmap.mmap(f.fileno(), size)
+        try:
+            offset = m.find(placeholder)
+            if offset == -1:
+                return False
+            m[offset:offset + BUILD_TIME_SIZE] = (
+                    build_time[:BUILD_TIME_SIZE - 1].ljust(BUILD_TIME_SIZE, '\0'))
+        finally:
+            m.close()
+    finally:
+        f.close()
+    return True
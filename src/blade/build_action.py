@@ -0,0 +1,82 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the build action module which defines the backend neutral
+ intermediate representation of the build rules.  Targets are lowered
+ to build actions, then the actions are translated into the build
+ script of a certain backend, such as build.ninja.
+
+"""
+
+
+from blade_util import var_to_list
+
+
+# The rules which could be used by build actions, and the variables
+# each of them accepts.  They are implemented by the backends.
+#
+#   cc, cxx         : cppflags, includes, warning
+#   pch             : cppflags, includes, warning
+#   as              : asflags
+#   ar              :
+#   link, solink    : linkflags, whole_archives, libs, syslibs
+#   proto_cc        :
+#   thrift_cc       :
+#   resource_header :
+#   resource_file   :
+#   lex             : lexflags
+#   yacc            : yaccflags
+#   command         : cmd
+#   copy            :
+#   phony           :
+BUILD_RULES = frozenset([
+        'cc', 'cxx', 'pch', 'as', 'ar', 'link', 'solink',
+        'proto_cc', 'thrift_cc', 'resource_header', 'resource_file',
+        'lex', 'yacc', 'command', 'copy', 'phony'])
+
+
+# The phony output which is always out of date, so the actions depending
+# on it are always run.
+ALWAYS_BUILD = '__always__'
+
+
+class BuildAction(object):
+    """A build action which generates the outputs from the inputs.
+
+    The implicit deps are the files needed by the action but not passed
+    in its command line, the order only deps are only required to be
+    built before running the action.  The variables are passed to the
+    rule, their values are strings, lists of strings or booleans.
+
+    """
+    __slots__ = ('rule',
+                 'outputs',
+                 'inputs',
+                 'implicit_deps',
+                 'order_only_deps',
+                 'variables')
+
+    def __init__(self,
+                 rule,
+                 outputs,
+                 inputs,
+                 implicit_deps=None,
+                 order_only_deps=None,
+                 variables=None):
+        """Init method. """
+        assert rule in BUILD_RULES, rule
+        self.rule = rule
+        self.outputs = var_to_list(outputs)
+        self.inputs = var_to_list(inputs)
+        self.implicit_deps = var_to_list(implicit_deps)
+        self.order_only_deps = var_to_list(order_only_deps)
+        self.variables = variables or {}
+
+
+def target_alias(key):
+    """Return the name of the phony action which builds the whole target. """
+    return '%s:%s' % key
@@ -12,33 +12,39 @@
 
 
 import glob
-import math
+import heapq
 import os
 import subprocess
+import threading
 import time
 
 import console
+from toolchain_cache import ToolchainCache
 
 
 class BuildEnvironment(object):
-    """Managers ccache, distcc, dccc. """
-    def __init__(self, blade_root_dir, distcc_hosts_list=None):
+    """Managers ccache, distcc, dccc.
+
+    Whether ccache and distcc are installed is checked when it is firstly
+    used, and cached in the toolchain cache.
+
+    """
+    def __init__(self, blade_root_dir, distcc_hosts_list=None,
+                 toolchain_cache=None):
+        if toolchain_cache is None:
+            toolchain_cache = ToolchainCache()
+        self.toolchain_cache = toolchain_cache
+
         # ccache
         self.blade_root_dir = blade_root_dir
-        self.ccache_installed = self._check_ccache_install()
+        self.__ccache_installed = None
 
         # distcc
-        self.distcc_env_prepared = False
-        self.distcc_installed = self._check_distcc_install()
+        self.__distcc_installed = None
         if distcc_hosts_list:
             self.distcc_host_list = distcc_hosts_list
         else:
             self.distcc_host_list = os.environ.get('DISTCC_HOSTS', '')
-        if self.distcc_installed and self.distcc_host_list:
-            self.distcc_env_prepared = True
-        if self.distcc_installed and not self.distcc_host_list:
-            console.warning('DISTCC_HOSTS not set but you have '
-                            'distcc installed, will just build locally')
         self.distcc_log_file = os.environ.get('DISTCC_LOG', '')
         if self.distcc_log_file:
             console.info('distcc log: %s' % self.distcc_log_file)
@@ -59,6 +65,47 @@ class BuildEnvironment(object):
 
         self.rules_buf = []
 
+    def _get_ccache_installed(self):
+        if self.__ccache_installed is None:
+            self.__ccache_installed = self.toolchain_cache.get(
+                    'ccache_installed', 'ccache', self._check_ccache_install)
+            if self.__ccache_installed:
+                console.info('ccache found')
+        return self.__ccache_installed
+
+    ccache_installed = property(_get_ccache_installed)
+
+    def _get_ccache_supports_split_dwarf(self):
+        return bool(self.ccache_installed and self.toolchain_cache.get(
+                'ccache_supports_split_dwarf', 'ccache',
+                self._check_ccache_supports_split_dwarf))
+
+    ccache_supports_split_dwarf = property(_get_ccache_supports_split_dwarf)
+
+    def _get_ar_modifiers(self):
+        return self.toolchain_cache.get('ar_modifiers', 'ar',
+                                        self._check_ar_modifiers)
+
+    ar_modifiers = property(_get_ar_modifiers)
+
+    def _get_distcc_installed(self):
+        if self.__distcc_installed is None:
+            self.__distcc_installed = self.toolchain_cache.get(
+                    'distcc_installed', 'distcc', self._check_distcc_install)
+            if self.__distcc_installed:
+                console.info('distcc found')
+                if not self.distcc_host_list:
+                    console.warning('DISTCC_HOSTS not set but you have '
+                                    'distcc installed, will just build locally')
+        return self.__distcc_installed
+
+    distcc_installed = property(_get_distcc_installed)
+
+    def _get_distcc_env_prepared(self):
+        return bool(self.distcc_installed and self.distcc_host_list)
+
+    distcc_env_prepared = property(_get_distcc_env_prepared)
+
     @staticmethod
     def _check_ccache_install():
         """Check ccache is installed or not. """
@@ -73,12 +120,45 @@ class BuildEnvironment(object):
             if p.returncode == 0:
                 version_line = stdout.splitlines(True)[0]
                 if version_line and version_line.find('ccache version') != -1:
-                    console.info('ccache found')
                     return True
         except OSError:
             pass
         return False
 
+    @staticmethod
+    def _check_ccache_supports_split_dwarf():
+        """Check ccache caches the .dwo files, which is since 3.2. """
+        try:
+            p = subprocess.Popen(
+                ['ccache', '-V'],
+                env=os.environ,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                universal_newlines=True)
+            (stdout, stderr) = p.communicate()
+            if p.returncode == 0:
+                version = stdout.split('ccache version', 1)[1].split()[0]
+                version = [int(v) for v in version.split('.')[:2]]
+                return version >= [3, 2]
+        except (OSError, IndexError, ValueError):
+            pass
+        return False
+
+    @staticmethod
+    def _check_ar_modifiers():
+        """Return the optional modifiers D and T which ar supports. """
+        try:
+            p = subprocess.Popen(
+                ['ar', '--help'],
+                env=os.environ,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                universal_newlines=True)
+            (stdout, stderr) = p.communicate()
+            return ''.join([m for m in 'DT' if '[%s]' % m in stdout])
+        except OSError:
+            return ''
+
     @staticmethod
     def _check_distcc_install():
         """Check distcc is installed or not. """
@@ -93,8 +173,8 @@ class BuildEnvironment(object):
         if p.returncode == 0:
             version_line = stdout.splitlines(True)[0]
             if version_line and version_line.find('distcc') != -1:
-                console.info('distcc found')
                 return True
+        return False
 
     @staticmethod
     def _check_dccc_install():
@@ -132,63 +212,206 @@ class ScacheManager(object):
     """Scons cache manager.
 
     Scons cache manager, which should be output to scons script.
-    It will periodically check the cache folder and purge the files
-    with smallest weight. The weight for each file is caculated as
-    file_size * exp(-age * log(2) / half_time).
+    It keeps an index of the files in the cache dir, with their sizes
+    and the last time they were pushed into or retrieved from the cache,
+    and evicts the least recently used files when the total size exceeds
+    the limit.
 
-    We should pay attention that this progress will impact large builds
-    and we should not reduce the progress interval(the evaluating nodes).
+    The index is an append-only log in the cache dir, each line records
+    an update of a file, or the removal of it, so it is updated
+    incrementally and could be shared by several building processes.
+    It is compacted when it becomes too long.  The cache dir is only
+    scanned once to build the index if it doesn't exist.
+
+    The eviction runs in a background thread, and each round of it is
+    bounded by max_evict_time in seconds.
 
     """
-    def __init__(self, cache_path=None, cache_limit=0,
-                 cache_life=6 * 60 * 60):
+    # The number of files evicted at most in each batch
+    _EVICT_BATCH_SIZE = 1000
+
+    def __init__(self, cache_path=None, cache_limit=0, max_evict_time=1.0):
         self.cache_path = cache_path
         self.cache_limit = cache_limit
-        self.cache_life = cache_life
-        self.exponent_scale = math.log(2) / cache_life
+        # Evict files until the total size is below the low water mark
+        self.cache_low_water = cache_limit * 0.9
+        self.max_evict_time = max_evict_time
+        self.index_path = None
+        if cache_path:
+            self.index_path = os.path.join(cache_path, '.blade_cache_index')
+        self.entries = {}
+        self.total_size = 0
+        self.index_records = 0
+        self.index_file = None
+        self.lock = threading.Lock()
+        self.evict_thread = None
         self.purge_cnt = 0
 
-    def __call__(self, node, *args, **kwargs):
-        self.purge(self.get_file_list())
-
-    def cache_remove(self, file_item):
-        if not file_item:
-            return
-        if not os.path.exists(file_item):
+    def _entry_path(self, cache_file):
+        """Return the path of the cache file relative to the cache dir. """
+        return cache_file[len(self.cache_path):].lstrip('/')
+
+    def _update_entry(self, path, atime, size):
+        entry = self.entries.get(path)
+        if entry:
+            self.total_size -= entry[1]
+        self.entries[path] = (atime, size)
+        self.total_size += size
+
+    def _remove_entry(self, path):
+        entry = self.entries.pop(path, None)
+        if entry:
+            self.total_size -= entry[1]
+
+    def _scan_cache_dir(self):
+        """Build the index by scanning the cache dir. """
+        for path in glob.glob(os.path.join(self.cache_path, '*', '*')):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            self._update_entry(self._entry_path(path),
+                               int(st.st_mtime), st.st_size)
+
+    def _load_index(self):
+        """Replay the index log. """
+        f = open(self.index_path)
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    # Incomplete record
+                    break
+                self.index_records += 1
+                fields = line[:-1].split(' ', 2)
+                try:
+                    if fields[0] == '-':
+                        self._remove_entry(fields[1])
+                    else:
+                        self._update_entry(fields[2], int(fields[0]),
+                                           int(fields[1]))
+                except (IndexError, ValueError):
+                    continue
+        finally:
+            f.close()
+
+    def _write_index(self):
+        """Write all of the entries into a new index log. """
+        temp_path = '%s.tmp%d' % (self.index_path, os.getpid())
+        f = open(temp_path, 'w')
+        try:
+            for path, (atime, size) in self.entries.iteritems():
+                f.write('%d %d %s\n' % (atime, size, path))
+        finally:
+            f.close()
+        os.rename(temp_path, self.index_path)
+        self.index_records = len(self.entries)
+
+    def _append_index(self, record):
+        if not self.index_file:
             return
-        os.remove(file_item)
+        self.index_file.write(record)
+        self.index_file.flush()
+        self.index_records += 1
 
-    def purge(self, file_list):
-        self.purge_cnt += 1
-        if not file_list:
+    def open(self):
+        """Load the index and prepare to record the updates. """
+        if not self.index_path:
             return
-        map(self.cache_remove, file_list)
-        console.info('scons cache purged')
-
-    def get_file_list(self):
-        if not self.cache_path:
-            return []
-
-        file_stat_list = [(x, os.stat(x)[6:8])
-                for x in glob.glob(os.path.join(self.cache_path, '*', '*'))]
-        if not file_stat_list:
-            return []
-
-        current_time = time.time()
-        file_stat_list = [(x[0], x[1][0],
-            x[1][0] * math.exp(self.exponent_scale * (x[1][1] - current_time)))
-            for x in file_stat_list]
-
-        file_stat_list.sort(key=lambda x: x[2], reverse=True)
-
-        total_sz, start_index = 0, None
-        for i, x in enumerate(file_stat_list):
-            total_sz += x[1]
-            if total_sz >= self.cache_limit:
-                start_index = i
-                break
-
-        if not start_index:
-            return []
+        if not os.path.isdir(self.cache_path):
+            os.makedirs(self.cache_path)
+        if os.path.exists(self.index_path):
+            self._load_index()
+            if self.index_records > 2 * len(self.entries) + 1000:
+                self._write_index()
         else:
-            return [x[0] for x in file_stat_list[start_index:]]
+            self._scan_cache_dir()
+            self._write_index()
+        self.index_file = open(self.index_path, 'a')
+        self._start_evict()
+
+    def record(self, cache_file):
+        """Record the file which is pushed into or retrieved from the cache.
+
+        It may be called from multiple threads.
+
+        """
+        if not self.index_file or not cache_file:
+            return
+        path = self._entry_path(cache_file)
+        atime = int(time.time())
+        self.lock.acquire()
+        try:
+            # Under the lock, the file may be being evicted
+            try:
+                size = os.path.getsize(cache_file)
+            except OSError:
+                return
+            self._update_entry(path, atime, size)
+            self._append_index('%d %d %s\n' % (atime, size, path))
+            self._start_evict()
+        finally:
+            self.lock.release()
+
+    def _start_evict(self):
+        """Start evicting in background if the cache exceeds the limit. """
+        if self.total_size <= self.cache_limit:
+            return
+        if self.evict_thread and self.evict_thread.isAlive():
+            return
+        self.evict_thread = threading.Thread(target=self.evict)
+        self.evict_thread.setDaemon(True)
+        self.evict_thread.start()
+
+    def evict(self):
+        """Remove the least recently used files in the time limit. """
+        start_time = time.time()
+        removed_count = 0
+        while time.time() - start_time < self.max_evict_time:
+            self.lock.acquire()
+            try:
+                if self.total_size <= self.cache_low_water:
+                    break
+                victims = heapq.nsmallest(
+                        self._EVICT_BATCH_SIZE,
+                        [(entry[0], path) for path, entry in
+                         self.entries.iteritems()])
+                for atime, path in victims:
+                    self._remove_entry(path)
+                    self._append_index('- %s\n' % path)
+                    if self.total_size <= self.cache_low_water:
+                        break
+            finally:
+                self.lock.release()
+            removed_count += self._remove_victims(victims)
+        if removed_count:
+            self.purge_cnt += 1
+            console.info('scons cache purged')
+
+    def _remove_victims(self, victims):
+        """Remove the evicted files, return the number of them. """
+        removed_count = 0
+        for atime, path in victims:
+            self.lock.acquire()
+            try:
+                # Skip the files recorded again after they were selected
+                if path not in self.entries:
+                    try:
+                        os.remove(os.path.join(self.cache_path, path))
+                        removed_count += 1
+                    except OSError:
+                        pass
+            finally:
+                self.lock.release()
+        return removed_count
+
+    def close(self):
+        """Wait for the running eviction and close the index. """
+        if self.evict_thread:
+            self.evict_thread.join(self.max_evict_time + 1)
+        if self.index_file:
+            self.lock.acquire()
+            try:
+                self.index_file.close()
+                self.index_file = None
+            finally:
+                self.lock.release()
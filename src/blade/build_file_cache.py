@@ -0,0 +1,122 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the build file cache module which saves the targets described
+ by each BUILD file on disk, so that an unchanged BUILD file needn't be
+ executed again in the next run.
+
+"""
+
+
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import configparse
+import console
+from blade_util import get_blade_stamp
+from blade_util import md5sum_file
+from blade_util import md5sum_str
+
+
+class BuildFileCache(object):
+    """The on-disk cache of the targets loaded from BUILD files.
+
+    Each entry is keyed by the path of the BUILD file, and records the
+    md5sum of the BUILD file content together with the pickled targets
+    registered by executing it, and the md5sums of the other files read
+    by the targets when they are created.  The whole cache is invalidated when the
+    config files, the build target attributes or blade itself changed.
+
+    """
+    def __init__(self, cache_file, build_target):
+        self.cache_file = cache_file
+        self.signature = self._signature(build_target)
+        self.entries = {}
+        self.dirty = False
+        self._load()
+
+    def _signature(self, build_target):
+        """Calculate the signature of things which affect all BUILD files. """
+        signature = [get_blade_stamp(),
+                     str(build_target.bits),
+                     build_target.arch,
+                     str(build_target.is_debug())]
+        for config_file in configparse.blade_config.parsed_files:
+            signature.append('%s:%s' % (config_file, md5sum_file(config_file)))
+        return md5sum_str('\n'.join(signature))
+
+    def _load(self):
+        """Load the cache file, discard it if it is out of date. """
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            f = open(self.cache_file, 'rb')
+            try:
+                signature, entries = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            console.warning('error loading build file cache %s, ignored' %
+                            self.cache_file)
+            return
+        if signature == self.signature:
+            self.entries = entries
+
+    def lookup(self, build_file, digest):
+        """Return the pickled targets of the BUILD file or None. """
+        entry = self.entries.get(build_file)
+        if not entry or entry[0] != digest:
+            return None
+        for path, input_digest in entry[2]:
+            try:
+                if md5sum_file(path) != input_digest:
+                    return None
+            except (IOError, OSError):
+                return None
+        return entry[1]
+
+    def update(self, build_file, digest, targets):
+        """Record the targets of the BUILD file with the md5sum digest. """
+        self.update_pickled(build_file, digest, pickle.dumps(targets, 2),
+                            targets)
+
+    def update_pickled(self, build_file, digest, pickled_targets, targets):
+        """Record the already pickled targets of the BUILD file. """
+        input_digests = []
+        for target in targets:
+            for path in target.get_load_input_files():
+                try:
+                    input_digests.append((path, md5sum_file(path)))
+                except (IOError, OSError):
+                    # Never reused, the target is created from nothing
+                    return
+        self.entries[build_file] = (digest, pickled_targets, input_digests)
+        self.dirty = True
+
+    def save(self):
+        """Write the cache back to disk if it is changed. """
+        for build_file in self.entries.keys():
+            if not os.path.exists(build_file):
+                del self.entries[build_file]
+                self.dirty = True
+        if not self.dirty:
+            return
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        temp_file = '%s.tmp' % self.cache_file
+        f = open(temp_file, 'wb')
+        try:
+            pickle.dump((self.signature, self.entries), f, 2)
+        finally:
+            f.close()
+        os.rename(temp_file, self.cache_file)
+        self.dirty = False
@@ -18,7 +18,10 @@ import configparse
 
 import console
 import build_rules
+from blade_util import md5sum_str
+from blade_util import relative_path
 from blade_util import var_to_list
+from build_action import BuildAction
 from target import Target
 
 
@@ -29,6 +32,8 @@ class CcTarget(Target):
     of cc_library, cc_binary etc.
 
     """
+    __slots__ = ('file_and_link',)
+
     def __init__(self,
                  name,
                  target_type,
@@ -99,12 +104,11 @@ class CcTarget(Target):
 
     def _clone_env(self):
         """Select env. """
-        env_name = self._env_name()
         warning = self.data.get('warning', '')
         if warning == 'yes':
-            self._write_rule('%s = env_with_error.Clone()' % env_name)
+            self._setup_env('env_with_error')
         else:
-            self._write_rule('%s = env_no_warning.Clone()' % env_name)
+            self._setup_env('env_no_warning')
 
     __cxx_keyword_list = frozenset([
         'and', 'and_eq', 'alignas', 'alignof', 'asm', 'auto',
@@ -193,25 +197,23 @@ class CcTarget(Target):
 
     def _setup_cc_flags(self):
         """_setup_cc_flags. """
-        env_name = self._env_name()
         flags_from_option, incs_list = self._get_cc_flags()
         if flags_from_option:
-            self._write_rule('%s.Append(CPPFLAGS=%s)' % (env_name, flags_from_option))
+            self._env_append('CPPFLAGS=%s' % flags_from_option)
         if incs_list:
-            self._write_rule('%s.Append(CPPPATH=%s)' % (env_name, incs_list))
+            self._env_append('CPPPATH=%s' % incs_list)
 
     def _setup_as_flags(self):
         """_setup_as_flags. """
-        env_name = self._env_name()
         as_flags = self._get_as_flags()
         if as_flags:
-            self._write_rule('%s.Append(ASFLAGS=%s)' % (env_name, as_flags))
+            self._env_append('ASFLAGS=%s' % as_flags)
 
     def _setup_extra_link_flags(self):
         """extra_linkflags. """
         extra_linkflags = self.data.get('extra_linkflags')
         if extra_linkflags:
-            self._write_rule('%s.Append(LINKFLAGS=%s)' % (self._env_name(), extra_linkflags))
+            self._env_append('LINKFLAGS=%s' % extra_linkflags)
 
     def _check_gcc_flag(self, gcc_flag_list):
         options = self.blade.get_options()
@@ -270,18 +272,7 @@ class CcTarget(Target):
 
         cpp_flags += self.data.get('extra_cppflags', [])
 
-        # Incs
-        incs = self.data.get('incs', [])
-        if not incs:
-            incs = self.data.get('export_incs', [])
-        new_incs_list = [os.path.join(self.path, inc) for inc in incs]
-        new_incs_list += self._export_incs_list()
-        # Remove duplicate items in incs list and keep the order
-        incs_list = []
-        for inc in new_incs_list:
-            new_inc = os.path.normpath(inc)
-            if new_inc not in incs_list:
-                incs_list.append(new_inc)
+        incs_list = self._get_incs_list()
 
         return (cpp_flags, incs_list)
 
@@ -312,24 +303,64 @@ class CcTarget(Target):
         target_type = build_targets[dep].type
         return ('library' in target_type or 'plugin' in target_type)
 
-    def _export_incs_list(self):
-        """_export_incs_list.
-        TODO
+    def _get_incs_list(self, transitive=None):
+        """Returns the include paths of the target, without duplication. """
+        incs = self.data.get('incs', [])
+        if not incs:
+            incs = self.data.get('export_incs', [])
+        new_incs_list = [os.path.join(self.path, inc) for inc in incs]
+        new_incs_list += self._export_incs_list(transitive)
+        # Remove duplicate items in incs list and keep the order
+        incs_list = []
+        incs_set = set()
+        for inc in new_incs_list:
+            new_inc = os.path.normpath(inc)
+            if new_inc not in incs_set:
+                incs_set.add(new_inc)
+                incs_list.append(new_inc)
+        return incs_list
+
+    def _export_incs_deps(self, deps, visited):
+        """Returns the deps whose export_incs are visible through deps.
+
+        They are the library deps, and the deps of the libraries with
+        transitive_export_incs recursively.
+
         """
-        deps = self.expanded_deps
-        inc_list = []
-        for lib in deps:
-            # lib is (path, libname) pair.
-            if not lib:
+        build_targets = self.blade.get_build_targets()
+        export_incs_deps = []
+        for dep in deps:
+            if dep in visited or dep[0] == '#':
                 continue
-
-            if not self._dep_is_library(lib):
+            if not self._dep_is_library(dep):
                 continue
+            visited.add(dep)
+            export_incs_deps.append(dep)
+            if build_targets[dep].data.get('transitive_export_incs'):
+                export_incs_deps += self._export_incs_deps(
+                        build_targets[dep].deps, visited)
+        return export_incs_deps
+
+    def _export_incs_list(self, transitive=None):
+        """_export_incs_list.
 
-            # system lib
-            if lib[0] == '#':
-                continue
+        Returns the export_incs of the direct deps, and of the deps
+        exported by them with transitive_export_incs.  The export_incs
+        of all deps are returned if transitive is True, which defaults to
+        transitive_export_incs in cc_config.
 
+        """
+        if transitive is None:
+            cc_config = configparse.blade_config.get_config('cc_config')
+            transitive = cc_config['transitive_export_incs']
+        if transitive:
+            deps = [dep for dep in self.expanded_deps
+                    if dep[0] != '#' and self._dep_is_library(dep)]
+        else:
+            deps = self._export_incs_deps(self.deps, set())
+        inc_list = []
+        for lib in deps:
+            # lib is (path, libname) pair.
             target = self.target_database[lib]
             for inc in target.data.get('export_incs', []):
                 path = os.path.normpath('%s/%s' % (lib[0], inc))
@@ -337,6 +368,11 @@ class CcTarget(Target):
 
         return inc_list
 
+    def get_include_paths_reduction(self):
+        """Returns the include paths numbers in direct and transitive modes. """
+        return (len(self._get_incs_list(False)),
+                len(self._get_incs_list(True)))
+
     def _static_deps_list(self):
         """_static_deps_list.
 
@@ -425,26 +461,28 @@ class CcTarget(Target):
             lib_str = 'LIBS=[%s]' % ','.join(lib_list)
         return lib_str
 
-    def _prebuilt_cc_library(self, dynamic=0):
-        """prebuilt cc library rules. """
+    def _prebuilt_static_library_needed(self):
+        """Whether the static prebuilt library is needed by the dependers. """
         build_targets = self.blade.get_build_targets()
-        prebuilt_target_file = ''
-        prebuilt_src_file = ''
-        prebuilt_symlink = ''
-        allow_only_dynamic = True
         need_static_lib_targets = ['cc_test',
                                    'cc_binary',
                                    'cc_benchmark',
                                    'cc_plugin',
                                    'swig_library']
-        for key in build_targets:
-            if (self.key in build_targets[key].expanded_deps and
-                build_targets[key].type in need_static_lib_targets):
-                allow_only_dynamic = False
+        for key in self.blade.get_all_dependers(self.key):
+            if build_targets[key].type in need_static_lib_targets:
+                return True
+        return False
+
+    def _prebuilt_cc_library(self, dynamic=0):
+        """prebuilt cc library rules. """
+        prebuilt_target_file = ''
+        prebuilt_src_file = ''
+        prebuilt_symlink = ''
 
         var_name = self._generate_variable_name(self.path,
                                                 self.name)
-        if not allow_only_dynamic:
+        if self._prebuilt_static_library_needed():
             self._write_rule(
                     'Command("%s", "%s", Copy("$TARGET", "$SOURCE"))' % (
                              self._prebuilt_cc_library_build_path(),
@@ -484,11 +522,15 @@ class CcTarget(Target):
 
         """
         var_name = self._generate_variable_name(self.path, self.name)
-        self._write_rule('%s = %s.Library("%s", %s)' % (
+        arflags = ''
+        if self._thin_archive():
+            arflags = ', ARFLAGS="$THIN_ARFLAGS"'
+        self._write_rule('%s = %s.Library("%s", %s%s)' % (
                 var_name,
                 self._env_name(),
                 self._target_file_path(),
-                self._objs_name()))
+                self._objs_name(),
+                arflags))
         self._write_rule('%s.Depends(%s, %s)' % (
                 self._env_name(),
                 var_name,
@@ -509,8 +551,7 @@ class CcTarget(Target):
 
         lib_str = self._get_dynamic_deps_lib_list()
         if self.srcs or self.expanded_deps:
-            self._write_rule('%s.Append(LINKFLAGS=["-Xlinker", "--no-undefined"])'
-                             % self._env_name())
+            self._env_append('LINKFLAGS=["-Xlinker", "--no-undefined"]')
             self._write_rule('%s = %s.SharedLibrary("%s", %s, %s)' % (
                     var_name,
                     self._env_name(),
@@ -544,28 +585,416 @@ class CcTarget(Target):
         self._setup_cc_flags()
         self._setup_as_flags()
 
+        pch_header = self._pch_header_path()
+        object_args = ''
+        if pch_header:
+            gch = '%s.gch' % pch_header
+            if self.blade.register_shared_object(gch):
+                self._write_rule('%s.PrecompiledHeader(target = "%s", '
+                                 'source = "%s")' % (
+                                 env_name, gch,
+                                 self._target_file_path(path, self.data['pch'])))
+            object_args = ', CXXFLAGS = %s["CXXFLAGS"] + %s' % (
+                    env_name, self._pch_flags(pch_header))
+
         objs = []
         sources = []
-        for src in self.srcs:
-            obj = '%s_%s_object' % (self._generate_variable_name(path, src),
-                                    self._regular_variable_name(self.name))
-            target_path = os.path.join(
-                    self.build_path, path, '%s.objs' % self.name, src)
+        signature = self._cc_objects_signature()
+        srcs, unity_chunks = self._unity_chunks(signature)
+        for src in srcs:
+            source = self._target_file_path(path, src)
+            sources.append(source)
+            target_path = self._cc_object_path(src, signature)
+            if target_path:
+                obj = '%s_%s_shared_object' % (
+                        self._generate_variable_name(path, src), signature)
+                objs.append(obj)
+                if not self.blade.register_shared_object(target_path):
+                    continue
+            else:
+                obj = '%s_%s_object' % (self._generate_variable_name(path, src),
+                                        self._regular_variable_name(self.name))
+                objs.append(obj)
+                target_path = os.path.join(
+                        self.build_path, path, '%s.objs' % self.name, src)
             self._write_rule(
                     '%s = %s.SharedObject(target = "%s" + top_env["OBJSUFFIX"]'
-                    ', source = "%s")' % (obj,
-                                          env_name,
-                                          target_path,
-                                          self._target_file_path(path, src)))
+                    ', source = "%s"%s)' % (obj,
+                                            env_name,
+                                            target_path,
+                                            source,
+                                            object_args))
             self._write_rule('%s.Depends(%s, "%s")' % (
                              env_name,
                              obj,
-                             self._target_file_path(path, src)))
-            sources.append(self._target_file_path(path, src))
+                             source))
+            if pch_header:
+                self._write_rule('%s.Depends(%s, "%s.gch")' % (
+                                 env_name, obj, pch_header))
+        for i, chunk in enumerate(unity_chunks):
+            sources.append(chunk)
+            obj = '%s_unity_%d_object' % (
+                    self._generate_variable_name(path, self.name), i)
             objs.append(obj)
+            self._write_rule(
+                    '%s = %s.SharedObject(target = "%s" + top_env["OBJSUFFIX"]'
+                    ', source = "%s"%s)' % (obj, env_name, chunk, chunk,
+                                            object_args))
+            if pch_header:
+                self._write_rule('%s.Depends(%s, "%s.gch")' % (
+                                 env_name, obj, pch_header))
         self._write_rule('%s = [%s]' % (objs_name, ','.join(objs)))
         return sources
 
+    def _cc_objects_signature(self):
+        """Returns the md5sum of all things affecting the objects.
+
+        It is None if the objects are never shared with other targets.
+
+        """
+        if self.type not in ('cc_binary', 'cc_test'):
+            return None
+        cppflags, incs_list = self._get_cc_flags()
+        return md5sum_str(repr((self.data.get('warning', ''),
+                                self.data.get('pch'),
+                                cppflags,
+                                incs_list,
+                                self._get_as_flags(),
+                                sorted(self._deps_generated_headers()))))
+
+    def _cc_object_path(self, src, signature):
+        """Returns the path of the object shared with other targets, or None.
+
+        The source in several cc_binary or cc_test targets in the same dir,
+        such as a test helper, is compiled only once for the targets with
+        the same signature, into a dir named by the signature.
+
+        """
+        if not signature or not self.blade.is_shared_source(self.path, src):
+            return None
+        return os.path.join(self.build_path, self.path,
+                            '.shared_objs', signature, src)
+
+    def _set_unity_build(self, unity_build, unity_excludes):
+        """Set the unity build attributes. """
+        unity_excludes = var_to_list(unity_excludes)
+        for src in unity_excludes:
+            if src not in self.srcs:
+                console.error_exit('//%s:%s: unity_excludes: %s is not in '
+                                   'srcs' % (self.path, self.name, src))
+        self.data['unity_build'] = unity_build
+        self.data['unity_excludes'] = unity_excludes
+
+    def _unity_chunks(self, signature):
+        """Returns the sources to compile separately and the unity chunks.
+
+        In the unity build mode, the c++ sources of the target are grouped
+        into chunks of unity_chunk_size sources in the order of srcs, each
+        chunk is a generated source including them, so the common headers
+        are parsed once per chunk.  A change of a source only rebuilds the
+        chunk including it.  The sources in unity_excludes, the c and asm
+        sources, the generated sources and the shared objects are compiled
+        separately.
+
+        """
+        unity_build = self.data.get('unity_build')
+        cc_config = configparse.blade_config.get_config('cc_config')
+        if unity_build is None:
+            unity_build = cc_config['unity_build']
+        if not unity_build:
+            return self.srcs, []
+
+        excludes = self.data.get('unity_excludes', [])
+        srcs = []
+        unity_srcs = []
+        for src in self.srcs:
+            if (src in excludes or
+                os.path.splitext(src)[1] in ('.c', '.s', '.S') or
+                not os.path.isfile(os.path.join(self.path, src)) or
+                self._cc_object_path(src, signature)):
+                srcs.append(src)
+            else:
+                unity_srcs.append(src)
+
+        chunk_size = max(cc_config['unity_chunk_size'], 1)
+        chunks = []
+        for i in range(0, len(unity_srcs), chunk_size):
+            chunk_srcs = unity_srcs[i:i + chunk_size]
+            if len(chunk_srcs) == 1:
+                srcs += chunk_srcs
+                continue
+            chunk = os.path.join(self.build_path, self.path,
+                                 '%s.unity' % self.name,
+                                 'chunk_%d.cpp' % len(chunks))
+            self._write_including_file(chunk, chunk_srcs)
+            chunks.append(chunk)
+        return srcs, chunks
+
+    def _write_including_file(self, path, srcs):
+        """Write the file including the srcs unless it is not changed. """
+        file_dir = os.path.dirname(path)
+        lines = ['// This file was automatically generated by blade\n']
+        for src in srcs:
+            lines.append('#include "%s"\n' % relative_path(
+                         os.path.join(self.path, src), file_dir))
+        content = ''.join(lines)
+        if os.path.isfile(path):
+            f = open(path)
+            try:
+                if f.read() == content:
+                    return
+            finally:
+                f.close()
+        elif not os.path.isdir(file_dir):
+            os.makedirs(file_dir)
+        f = open(path, 'w')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+
+    def _pch_header_path(self):
+        """Returns the path of the precompiled header to include, or None.
+
+        The pch header is precompiled into the .gch file of this path with
+        the compile flags of the target, once for all targets in the same
+        dir with the same flags.  The path is named by the flags, so the
+        header is precompiled again when the flags are changed.  A header
+        including the pch header is written to this path too, which is
+        used when preprocessing only, such as by ccache and distcc, or if
+        the .gch file is invalid.
+
+        """
+        pch = self.data.get('pch')
+        if not pch:
+            return None
+        cppflags, incs_list = self._get_cc_flags()
+        key = md5sum_str(repr((pch,
+                               self.data.get('warning', ''),
+                               cppflags,
+                               incs_list)))
+        pch_header = os.path.join(self.build_path, self.path, '.pch', key, pch)
+        self._write_including_file(pch_header, [pch])
+        return pch_header
+
+    def _pch_flags(self, pch_header):
+        """Returns the flags to compile the c++ sources with the pch. """
+        return ['-Winvalid-pch', '-include', pch_header]
+
+    def _library_file_path(self, path='', name='', dynamic=0):
+        """Returns the path of the static or dynamic library file. """
+        if not path:
+            path = self.path
+        if not name:
+            name = self.name
+        suffix = 'a'
+        if dynamic:
+            suffix = 'so'
+        return os.path.join(self.build_path, path, 'lib%s.%s' % (name, suffix))
+
+    def _version_object_path(self):
+        """Returns the path of the version object linked into binaries. """
+        return os.path.join(self.build_path, 'version.o')
+
+    def _deps_generated_headers(self):
+        """Returns the headers generated by the deps. """
+        build_targets = self.blade.get_build_targets()
+        headers = []
+        for dep in self.expanded_deps:
+            headers += build_targets[dep].get_generated_headers()
+        return headers
+
+    def _static_deps_files(self):
+        """_static_deps_files.
+
+        Returns
+        -----------
+        whole_archives: the libs to link all its symbols into target
+        libs: the libs to be statically linked into target
+        syslibs: the system libs
+
+        """
+        build_targets = self.blade.get_build_targets()
+        whole_archives = []
+        libs = []
+        syslibs = []
+        for dep in self.expanded_deps:
+            if not self._dep_is_library(dep):
+                continue
+
+            if dep[0] == '#':
+                syslibs.append(dep[1])
+            elif build_targets[dep].data.get('link_all_symbols'):
+                whole_archives.append(self._library_file_path(dep[0], dep[1]))
+            else:
+                libs.append(self._library_file_path(dep[0], dep[1]))
+
+        return (whole_archives, libs, syslibs)
+
+    def _dynamic_deps_files(self):
+        """_dynamic_deps_files.
+
+        Returns
+        -----------
+        libs: the libs to be dynamically linked into target
+        syslibs: the system libs
+
+        """
+        build_targets = self.blade.get_build_targets()
+        libs = []
+        syslibs = []
+        for dep in self.expanded_deps:
+            if not self._dep_is_library(dep):
+                continue
+
+            if (build_targets[dep].type == 'cc_library' and
+                not build_targets[dep].srcs):
+                continue
+            if dep[0] == '#':
+                syslibs.append(dep[1])
+            else:
+                libs.append(self._library_file_path(dep[0], dep[1], dynamic=1))
+
+        return (libs, syslibs)
+
+    def _cc_objects_actions(self, sources, objects, generated_headers=[]):
+        """_cc_objects_actions.
+
+        Returns the actions to compile the sources into the objects. The
+        headers generated by the deps must be generated before compiling.
+        The c++ sources are compiled with the precompiled header if the
+        pch is set.
+
+        """
+        cppflags, incs_list = self._get_cc_flags()
+        cc_variables = {'cppflags': cppflags,
+                        'includes': incs_list,
+                        'warning': self.data.get('warning', '') == 'yes'}
+        as_variables = {'asflags': self._get_as_flags()}
+        cxx_variables = cc_variables
+        order_only_deps = self._deps_generated_headers() + generated_headers
+
+        actions = []
+        pch_deps = []
+        pch_header = self._pch_header_path()
+        if pch_header:
+            gch = '%s.gch' % pch_header
+            if self.blade.register_shared_object(gch):
+                actions.append(BuildAction(
+                        'pch', gch, self._source_file_path(self.data['pch']),
+                        order_only_deps=order_only_deps,
+                        variables=cc_variables))
+            cxx_variables = cc_variables.copy()
+            cxx_variables['cppflags'] = cppflags + self._pch_flags(pch_header)
+            pch_deps = [gch]
+
+        for src, obj in zip(sources, objects):
+            implicit_deps = []
+            if src.endswith('.c') or src.endswith('.S'):
+                rule, variables = 'cc', cc_variables
+            elif src.endswith('.s'):
+                rule, variables = 'as', as_variables
+            else:
+                rule, variables = 'cxx', cxx_variables
+                implicit_deps = pch_deps
+            actions.append(BuildAction(rule, obj, src,
+                                       implicit_deps=implicit_deps,
+                                       order_only_deps=order_only_deps,
+                                       variables=variables))
+        return actions
+
+    def _cc_sources_objects_actions(self):
+        """Returns the objects and the actions to compile the srcs. """
+        signature = self._cc_objects_signature()
+        sources = []
+        objects = []
+        compiled_objects = []
+        srcs, unity_chunks = self._unity_chunks(signature)
+        for src in srcs:
+            shared_path = self._cc_object_path(src, signature)
+            if shared_path:
+                obj = '%s.o' % shared_path
+                objects.append(obj)
+                if not self.blade.register_shared_object(shared_path):
+                    continue
+            else:
+                obj = os.path.join(self.build_path, self.path,
+                                   '%s.objs' % self.name, '%s.o' % src)
+                objects.append(obj)
+            sources.append(self._source_file_path(src))
+            compiled_objects.append(obj)
+        for chunk in unity_chunks:
+            obj = '%s.o' % chunk
+            objects.append(obj)
+            sources.append(chunk)
+            compiled_objects.append(obj)
+        return objects, self._cc_objects_actions(sources, compiled_objects)
+
+    def _thin_archive(self):
+        """Whether the static library is created as a thin archive.
+
+        Thin archives only refer to the objects in the build dir, so they
+        are for the intermediate libraries, the libraries used out of the
+        build dir should set thin_archive=False.  --no-thin-archive
+        disables them for all libraries, otherwise the attribute of the
+        target overrides --thin-archive and cc_config.
+
+        """
+        option = getattr(self.blade.get_options(), 'thin_archive', None)
+        if option is False:
+            return False
+        if self.data.get('thin_archive') is not None:
+            return self.data['thin_archive']
+        if option is None:
+            cc_config = configparse.blade_config.get_config('cc_config')
+            option = cc_config['thin_archive']
+        return option
+
+    def _cc_library_actions(self, objects):
+        """Returns the actions to create the static library. """
+        variables = {}
+        if self._thin_archive():
+            variables['thin_archive'] = True
+        return [BuildAction('ar', self._library_file_path(), objects,
+                            implicit_deps=self._explict_dependency_files(),
+                            variables=variables)]
+
+    def _dynamic_cc_library_actions(self, objects):
+        """Returns the actions to link the dynamic library. """
+        if not self.srcs and not self.expanded_deps:
+            return []
+        libs, syslibs = self._dynamic_deps_files()
+        linkflags = (self.data.get('extra_linkflags', []) +
+                     ['-Xlinker', '--no-undefined'])
+        return [BuildAction('solink', self._library_file_path(dynamic=1), objects,
+                            implicit_deps=libs + self._explict_dependency_files(),
+                            variables={'linkflags': linkflags,
+                                       'whole_archives': [],
+                                       'libs': libs,
+                                       'syslibs': syslibs})]
+
+    def _prebuilt_cc_library_actions(self, dynamic=0):
+        """Returns the actions to copy the prebuilt libraries. """
+        actions = []
+        if self._prebuilt_static_library_needed():
+            actions.append(BuildAction(
+                    'copy',
+                    self._prebuilt_cc_library_build_path(),
+                    self._prebuilt_cc_library_src_path()))
+        self.file_and_link = None
+        if dynamic:
+            prebuilt_target_file = self._prebuilt_cc_library_build_path(
+                                            dynamic=1)
+            prebuilt_src_file = self._prebuilt_cc_library_src_path(
+                                            dynamic=1)
+            actions.append(BuildAction('copy',
+                                       prebuilt_target_file,
+                                       prebuilt_src_file))
+            prebuilt_symlink = os.path.basename(
+                    os.path.realpath(prebuilt_src_file))
+            self.file_and_link = (prebuilt_target_file, prebuilt_symlink)
+        return actions
+
 
 class CcLibrary(CcTarget):
     """A cc target subclass.
@@ -574,6 +1003,8 @@ class CcLibrary(CcTarget):
     rules including dynamic library rules accoring to user option.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -587,8 +1018,13 @@ class CcLibrary(CcTarget):
                  prebuilt,
                  link_all_symbols,
                  deprecated,
+                 transitive_export_incs,
                  extra_cppflags,
                  extra_linkflags,
+                 pch,
+                 unity_build,
+                 unity_excludes,
+                 thin_archive,
                  blade,
                  kwargs):
         """Init method.
@@ -616,6 +1052,10 @@ class CcLibrary(CcTarget):
         self.data['link_all_symbols'] = link_all_symbols
         self.data['always_optimize'] = always_optimize
         self.data['deprecated'] = deprecated
+        self.data['transitive_export_incs'] = transitive_export_incs
+        self.data['pch'] = pch
+        self.data['thin_archive'] = thin_archive
+        self._set_unity_build(unity_build, unity_excludes)
 
     def scons_rules(self):
         """scons_rules.
@@ -637,6 +1077,27 @@ class CcLibrary(CcTarget):
             if build_dynamic:
                 self._dynamic_cc_library()
 
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options.
+
+        """
+        self._check_deprecated_deps()
+
+        options = self.blade.get_options()
+        build_dynamic = (getattr(options, 'generate_dynamic', False) or
+                         self.data.get('build_dynamic'))
+
+        if self.type == 'prebuilt_cc_library':
+            return self._prebuilt_cc_library_actions(build_dynamic)
+
+        objects, actions = self._cc_sources_objects_actions()
+        actions += self._cc_library_actions(objects)
+        if build_dynamic:
+            actions += self._dynamic_cc_library_actions(objects)
+        return actions
+
 
 def cc_library(name,
                srcs=[],
@@ -651,8 +1112,13 @@ def cc_library(name,
                prebuilt=False,
                link_all_symbols=False,
                deprecated=False,
+               transitive_export_incs=False,
                extra_cppflags=[],
                extra_linkflags=[],
+               pch='',
+               unity_build=None,
+               unity_excludes=[],
+               thin_archive=None,
                **kwargs):
     """cc_library target. """
     target = CcLibrary(name,
@@ -667,8 +1133,13 @@ def cc_library(name,
                        prebuilt or pre_build,
                        link_all_symbols,
                        deprecated,
+                       transitive_export_incs,
                        extra_cppflags,
                        extra_linkflags,
+                       pch,
+                       unity_build,
+                       unity_excludes,
+                       thin_archive,
                        blade.blade,
                        kwargs)
     if pre_build:
@@ -688,6 +1159,8 @@ class CcBinary(CcTarget):
     rules according to user options.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -701,6 +1174,9 @@ class CcBinary(CcTarget):
                  extra_cppflags,
                  extra_linkflags,
                  export_dynamic,
+                 pch,
+                 unity_build,
+                 unity_excludes,
                  blade,
                  kwargs):
         """Init method.
@@ -724,6 +1200,8 @@ class CcBinary(CcTarget):
                           kwargs)
         self.data['dynamic_link'] = dynamic_link
         self.data['export_dynamic'] = export_dynamic
+        self.data['pch'] = pch
+        self._set_unity_build(unity_build, unity_excludes)
 
         cc_binary_config = configparse.blade_config.get_config('cc_binary_config')
         # add extra link library
@@ -749,12 +1227,10 @@ class CcBinary(CcTarget):
          lib_str,
          whole_link_flags) = self._get_static_deps_lib_list()
         if whole_link_flags:
-            self._write_rule(
-                    '%s.Append(LINKFLAGS=[%s])' % (env_name, whole_link_flags))
+            self._env_append('LINKFLAGS=[%s]' % whole_link_flags)
 
         if self.data.get('export_dynamic'):
-            self._write_rule(
-                '%s.Append(LINKFLAGS="-rdynamic")' % env_name)
+            self._env_append('LINKFLAGS="-rdynamic"')
 
         self._setup_extra_link_flags()
 
@@ -774,16 +1250,32 @@ class CcBinary(CcTarget):
             self._write_rule('%s.Depends(%s, [%s])' % (
                     env_name, var_name, ', '.join(link_all_symbols_lib_list)))
 
-        self._write_rule('%s.Append(LINKFLAGS=str(version_obj[0]))' % env_name)
+        self._env_append('LINKFLAGS=str(version_obj[0])')
         self._write_rule('%s.Requires(%s, version_obj)' % (
                          env_name, var_name))
+        self._write_rule('%s.AddPostAction(%s, stamp_build_time_action)' % (
+                         env_name, var_name))
+        self._dwp_rules(var_name)
+
+    def _dwp_needed(self):
+        """Whether to package the .dwo files of the binary with dwp. """
+        return (self.type == 'cc_binary' and
+                getattr(self.blade.get_options(), 'dwp', False))
+
+    def _dwp_rules(self, var_name):
+        """Package the .dwo files of the binary into the .dwp file. """
+        if self._dwp_needed():
+            self._write_rule('%s.Dwp("%s.dwp", %s)' % (
+                             self._env_name(),
+                             self._target_file_path(),
+                             var_name))
 
     def _dynamic_cc_binary(self):
         """_dynamic_cc_binary. """
         env_name = self._env_name()
         var_name = self._generate_variable_name(self.path, self.name)
         if self.data.get('export_dynamic'):
-            self._write_rule('%s.Append(LINKFLAGS="-rdynamic")' % env_name)
+            self._env_append('LINKFLAGS="-rdynamic"')
 
         self._setup_extra_link_flags()
 
@@ -798,9 +1290,12 @@ class CcBinary(CcTarget):
             env_name,
             var_name,
             self._objs_name()))
-        self._write_rule('%s.Append(LINKFLAGS=str(version_obj[0]))' % env_name)
+        self._env_append('LINKFLAGS=str(version_obj[0])')
         self._write_rule('%s.Requires(%s, version_obj)' % (
                          env_name, var_name))
+        self._write_rule('%s.AddPostAction(%s, stamp_build_time_action)' % (
+                         env_name, var_name))
+        self._dwp_rules(var_name)
 
         self._generate_target_explict_dependency(var_name)
 
@@ -819,6 +1314,49 @@ class CcBinary(CcTarget):
         else:
             self._cc_binary()
 
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options.
+
+        """
+        self._check_deprecated_deps()
+
+        objects, actions = self._cc_sources_objects_actions()
+
+        if self.data['dynamic_link']:
+            whole_archives = []
+            libs, syslibs = self._dynamic_deps_files()
+        else:
+            whole_archives, libs, syslibs = self._static_deps_files()
+
+        linkflags = []
+        if self.data.get('export_dynamic'):
+            linkflags.append('-rdynamic')
+        linkflags += self.data.get('extra_linkflags', [])
+        # Like scons, the binary is not relinked when only the version
+        # object is changed
+        linkflags.append(self._version_object_path())
+
+        actions.append(BuildAction(
+                'link',
+                self._target_file_path(),
+                objects,
+                implicit_deps=(whole_archives + libs +
+                               self._explict_dependency_files()),
+                order_only_deps=[self._version_object_path()],
+                variables={'linkflags': linkflags,
+                           'whole_archives': whole_archives,
+                           'libs': libs,
+                           'syslibs': syslibs}))
+        if self._dwp_needed():
+            binary = self._target_file_path()
+            actions.append(BuildAction(
+                    'command', '%s.dwp' % binary, binary,
+                    variables={'cmd': 'dwp -e %s -o %s.dwp' % (binary,
+                                                               binary)}))
+        return actions
+
 
 def cc_binary(name,
               srcs=[],
@@ -832,6 +1370,9 @@ def cc_binary(name,
               extra_cppflags=[],
               extra_linkflags=[],
               export_dynamic=False,
+              pch='',
+              unity_build=None,
+              unity_excludes=[],
               **kwargs):
     """cc_binary target. """
     cc_binary_target = CcBinary(name,
@@ -846,6 +1387,9 @@ def cc_binary(name,
                                 extra_cppflags,
                                 extra_linkflags,
                                 export_dynamic,
+                                pch,
+                                unity_build,
+                                unity_excludes,
                                 blade.blade,
                                 kwargs)
     blade.blade.register_target(cc_binary_target)
@@ -873,6 +1417,8 @@ class CcPlugin(CcTarget):
     rules according to user options.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -930,8 +1476,7 @@ class CcPlugin(CcTarget):
          lib_str,
          whole_link_flags) = self._get_static_deps_lib_list()
         if whole_link_flags:
-            self._write_rule(
-                    '%s.Append(LINKFLAGS=[%s])' % (env_name, whole_link_flags))
+            self._env_append('LINKFLAGS=[%s]' % whole_link_flags)
 
         if self.srcs or self.expanded_deps:
             self._write_rule('%s = %s.SharedLibrary("%s", %s, %s)' % (
@@ -947,6 +1492,31 @@ class CcPlugin(CcTarget):
 
         self._generate_target_explict_dependency(var_name)
 
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options.
+
+        """
+        self._check_deprecated_deps()
+
+        objects, actions = self._cc_sources_objects_actions()
+        if not self.srcs and not self.expanded_deps:
+            return actions
+
+        whole_archives, libs, syslibs = self._static_deps_files()
+        actions.append(BuildAction(
+                'solink',
+                self._library_file_path(dynamic=1),
+                objects,
+                implicit_deps=(whole_archives + libs +
+                               self._explict_dependency_files()),
+                variables={'linkflags': self.data.get('extra_linkflags', []),
+                           'whole_archives': whole_archives,
+                           'libs': libs,
+                           'syslibs': syslibs}))
+        return actions
+
 
 def cc_plugin(name,
               srcs=[],
@@ -1003,6 +1573,8 @@ class CcTest(CcBinary):
     rules according to user options.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -1021,6 +1593,9 @@ class CcTest(CcBinary):
                  exclusive,
                  heap_check,
                  heap_check_debug,
+                 pch,
+                 unity_build,
+                 unity_excludes,
                  blade,
                  kwargs):
         """Init method.
@@ -1045,6 +1620,9 @@ class CcTest(CcBinary):
                           extra_cppflags,
                           extra_linkflags,
                           export_dynamic,
+                          pch,
+                          unity_build,
+                          unity_excludes,
                           blade,
                           kwargs)
         self.type = 'cc_test'
@@ -1096,6 +1674,9 @@ def cc_test(name,
             exclusive=False,
             heap_check=None,
             heap_check_debug=False,
+            pch='',
+            unity_build=None,
+            unity_excludes=[],
             **kwargs):
     """cc_test target. """
     cc_test_target = CcTest(name,
@@ -1115,6 +1696,9 @@ def cc_test(name,
                             exclusive,
                             heap_check,
                             heap_check_debug,
+                            pch,
+                            unity_build,
+                            unity_excludes,
                             blade.blade,
                             kwargs)
     blade.blade.register_target(cc_test_target)
@@ -136,10 +136,16 @@ class CmdArguments(object):
         else:
             console.error_exit('--color can only be yes, no or auto.')
 
+    def _check_backend_options(self):
+        """check the backend options. """
+        if self.options.backend not in ('scons', 'ninja', 'native'):
+            console.error_exit('--backend can only be scons, ninja or native.')
+
     def _check_clean_options(self):
         """check the clean options. """
         self._check_plat_and_profile_options()
         self._check_color_options()
+        self._check_backend_options()
 
     def _check_query_options(self):
         """check query action options. """
@@ -151,6 +157,10 @@ class CmdArguments(object):
         """check the building options. """
         self._check_plat_and_profile_options()
         self._check_color_options()
+        self._check_backend_options()
+
+        if self.options.dwp and not self.options.split_debug:
+            console.error_exit('--dwp requires --split-debug')
 
         if self.options.cache_dir is None:
             self.options.cache_dir = os.environ.get('BLADE_CACHE_DIR')
@@ -206,6 +216,23 @@ class CmdArguments(object):
                             help=('Build profile: debug or release, '
                                   'default is release.'))
 
+        parser.add_argument('--split-debug',
+                            dest='split_debug',
+                            action='store_true',
+                            default=False,
+                            help=('Compile with -gsplit-dwarf, the debug '
+                                  'information is kept in the .dwo files '
+                                  'besides the objects instead of being '
+                                  'linked into the binaries.'))
+
+        parser.add_argument('--dwp',
+                            dest='dwp',
+                            action='store_true',
+                            default=False,
+                            help=('Package the .dwo files of each cc_binary '
+                                  'into a .dwp file with dwp, '
+                                  'requires --split-debug.'))
+
     def __add_generate_arguments(self, parser):
         """Add generate related arguments. """
         parser.add_argument(
@@ -213,6 +240,19 @@ class CmdArguments(object):
             action='store_true', default=False,
             help='Generate dynamic libraries.')
 
+        parser.add_argument(
+            '--thin-archive', dest='thin_archive',
+            action='store_true', default=None,
+            help='Create the static libraries as thin archives, which refer '
+                 'to the objects instead of copying them, default is the '
+                 'thin_archive of cc_config.')
+
+        parser.add_argument(
+            '--no-thin-archive', dest='thin_archive',
+            action='store_false',
+            help='Create the static libraries as full archives, which could '
+                 'be copied out of the build dir.')
+
         parser.add_argument(
             '--generate-java', dest='generate_java',
             action='store_true', default=False,
@@ -224,6 +264,35 @@ class CmdArguments(object):
             action='store_true', default=False,
             help='Generate php files for proto_library and swig_library.')
 
+        parser.add_argument(
+            '--report-incs', dest='report_incs',
+            action='store_true', default=False,
+            help='Report how many include paths of each cc target are '
+                 'saved by not propagating the export_incs transitively.')
+
+    def __add_load_arguments(self, parser):
+        """Add BUILD files loading related arguments. """
+        parser.add_argument(
+            '--no-build-cache', dest='build_cache',
+            action='store_false', default=True,
+            help='Do not use the cache of parsed BUILD files and generated '
+                 'build rules, execute all BUILD files and generate the '
+                 'rules again.')
+
+        parser.add_argument(
+            '--load-jobs', dest='load_jobs', type=int, default=1,
+            help='Specifies the number of processes to load the BUILD files '
+                 'of "..." targets simultaneously.')
+
+    def __add_backend_arguments(self, parser):
+        """Add backend argument. """
+        parser.add_argument(
+            '--backend', dest='backend', default='scons',
+            help='The build tool to run the generated build script: scons '
+                 'or ninja, or native to run the build actions in blade '
+                 'itself, default is scons. The ninja and native backends '
+                 'only support the c/c++ targets and gen_rule.')
+
     def __add_build_actions_arguments(self, parser):
         """Add build related action arguments. """
         parser.add_argument(
@@ -236,6 +305,13 @@ class CmdArguments(object):
             help=('Specifies the number of jobs (commands) to '
                   'run simultaneously.'))
 
+        parser.add_argument(
+            '--link-jobs', dest='link_jobs', type=int, default=0,
+            help=('Specifies the number of link commands to run '
+                  'simultaneously besides the jobs, default is estimated '
+                  'from the available memory and the memory used by '
+                  'the links last time.'))
+
         parser.add_argument(
             '-k', '--keep-going', dest='keep_going',
             action='store_true', default=False,
@@ -281,6 +357,7 @@ class CmdArguments(object):
     def _add_query_arguments(self, parser):
         """Add query arguments for parser. """
         self.__add_plat_profile_arguments(parser)
+        self.__add_load_arguments(parser)
         self.__add_color_arguments(parser)
         parser.add_argument(
             '--deps', dest='deps',
@@ -298,8 +375,10 @@ class CmdArguments(object):
     def _add_clean_arguments(self, parser):
         """Add clean arguments for parser. """
         self.__add_plat_profile_arguments(parser)
+        self.__add_load_arguments(parser)
         self.__add_generate_arguments(parser)
         self.__add_color_arguments(parser)
+        self.__add_backend_arguments(parser)
 
     def _add_test_arguments(self, parser):
         """Add test command arguments. """
@@ -330,7 +409,9 @@ class CmdArguments(object):
     def _add_build_arguments(self, parser):
         """Add building arguments for parser. """
         self.__add_plat_profile_arguments(parser)
+        self.__add_load_arguments(parser)
         self.__add_build_actions_arguments(parser)
+        self.__add_backend_arguments(parser)
         self.__add_color_arguments(parser)
         self.__add_cache_arguments(parser)
         self.__add_generate_arguments(parser)
@@ -0,0 +1,327 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the concurrency controller module which raises and lowers the
+ number of the commands running at the same time during building,
+ according to the load of the machine, the available memory and the
+ health of the distcc hosts, instead of a fixed number decided before
+ building starts.
+
+"""
+
+
+import os
+import socket
+import threading
+import time
+
+import console
+from blade_util import cpu_count
+from blade_util import get_available_memory
+
+
+# The file in the build dir logging the decisions of the controller
+CONCURRENCY_LOG_FILE = '.blade.concurrency_log'
+
+# The default port of distccd
+DISTCC_PORT = 3632
+
+# The default number of jobs a distcc host could run
+_DISTCC_LOCAL_LIMIT = 2
+_DISTCC_REMOTE_LIMIT = 4
+
+# A distcc host responding slower than this, in seconds, is counted as half
+_DISTCC_SLOW_LATENCY = 0.2
+
+# The timeout of probing a distcc host, in seconds
+_DISTCC_PROBE_TIMEOUT = 1.0
+
+# The interval of probing the distcc hosts during building, in seconds
+_DISTCC_PROBE_INTERVAL = 10.0
+
+# The jobs are reduced if the available memory is less than this, in bytes
+_LOW_MEMORY = 512 * 1024 * 1024
+
+
+def get_load():
+    """Return (load1, runnable) from /proc/loadavg, or None if unknown.
+
+    load1 is the load average of the last minute, runnable is the number
+    of the runnable processes right now, which reacts much faster.
+
+    """
+    try:
+        f = open('/proc/loadavg')
+        try:
+            fields = f.read().split()
+        finally:
+            f.close()
+        return float(fields[0]), int(fields[3].split('/')[0])
+    except (IOError, IndexError, ValueError):
+        pass
+    try:
+        load1 = os.getloadavg()[0]
+        return load1, int(load1)
+    except (AttributeError, OSError):
+        return None
+
+
+def _parse_distcc_host(spec):
+    """Parse a host in DISTCC_HOSTS, return (host, port, limit) or None.
+
+    The host is None for localhost, and the port is None for the ssh hosts,
+    which are not probed.
+
+    """
+    if not spec or spec[0] in '-+':
+        # Options such as --randomize, or zeroconf
+        return None
+    limit = 0
+    if '/' in spec:
+        (spec, limit_str) = spec.split('/', 1)
+        limit_str = limit_str.split(',')[0]
+        if limit_str.isdigit():
+            limit = int(limit_str)
+    spec = spec.split(',')[0]
+    if spec == 'localhost':
+        return None, None, limit or _DISTCC_LOCAL_LIMIT
+    if spec.startswith('@') or '@' in spec:
+        return spec, None, limit or _DISTCC_REMOTE_LIMIT
+    port = DISTCC_PORT
+    if ':' in spec:
+        (spec, port_str) = spec.split(':', 1)
+        if port_str.isdigit():
+            port = int(port_str)
+    return spec, port, limit or _DISTCC_REMOTE_LIMIT
+
+
+def _probe(host, port, timeout):
+    """Return the time in seconds connecting to the host, None on failure. """
+    start = time.time()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.settimeout(timeout)
+            sock.connect((host, port))
+        except (socket.error, socket.timeout):
+            return None
+    finally:
+        sock.close()
+    return time.time() - start
+
+
+def probe_distcc_hosts(hosts, timeout=_DISTCC_PROBE_TIMEOUT):
+    """Probe the distcc hosts at the same time.
+
+    Returns a list of (host, limit, latency), latency is None if the host
+    is down, and 0 for the hosts not probed.
+
+    """
+    results = []
+    threads = []
+    for spec in hosts:
+        parsed = _parse_distcc_host(spec)
+        if not parsed:
+            continue
+        (host, port, limit) = parsed
+        result = [host or 'localhost', limit, 0]
+        results.append(result)
+        if host and port:
+            def probe(result=result, host=host, port=port):
+                result[2] = _probe(host, port, timeout)
+            thread = threading.Thread(target=probe)
+            thread.setDaemon(True)
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join(timeout + 1)
+    return [tuple(result) for result in results]
+
+
+def estimate_distcc_jobs(host_status):
+    """Return the number of jobs the healthy distcc hosts could run. """
+    jobs = 0.0
+    for (host, limit, latency) in host_status:
+        if latency is None:
+            continue
+        if latency > _DISTCC_SLOW_LATENCY:
+            jobs += limit / 2.0
+        else:
+            jobs += limit
+    return int(jobs)
+
+
+class ConcurrencyController(object):
+    """Decides how many commands could run at the same time.
+
+    The limit starts from the number of the cpu cores, or the capacity of
+    the distcc hosts, and is adjusted at most once every interval seconds
+    while building:
+
+      - halved if the available memory is less than 512M,
+      - decreased by one if the runnable processes are more than 1.25
+        times the cores,
+      - increased by one if all the allowed commands are running and the
+        runnable processes are fewer than the cores,
+
+    but it is never more than max_jobs, nor the capacity of the distcc
+    hosts which are probed in background.  distcc_jobs is the capacity
+    probed before building if any, then the hosts are not probed again
+    at start.  The decisions are logged into
+    the log file, so the controller could be tuned.
+
+    """
+    def __init__(self, max_jobs, log_path=None, distcc_hosts=None,
+                 interval=2.0, distcc_jobs=None):
+        self.max_jobs = max(max_jobs, 1)
+        self.cpu_count = cpu_count()
+        self.interval = interval
+        self.running = 0
+        self.distcc_hosts = distcc_hosts or []
+        self.distcc_jobs = 0
+        if self.distcc_hosts:
+            if distcc_jobs is None:
+                self._probe_distcc_hosts()
+            else:
+                # The hosts were just probed before building
+                self.distcc_jobs = distcc_jobs
+            self.limit = self._cap(self.max_jobs)
+        else:
+            self.limit = self._cap(self.cpu_count)
+        self.min_limit = self.max_limit = self.limit
+        self.adjust_count = 0
+        self.runnable = None
+        self.last_adjust_time = time.time()
+        self.condition = threading.Condition()
+        self.log_file = None
+        if log_path:
+            try:
+                self.log_file = open(log_path, 'w')
+            except IOError:
+                pass
+        self._log('start', self.limit, 'max %d, %d cores' % (
+                  self.max_jobs, self.cpu_count))
+        if self.distcc_hosts:
+            thread = threading.Thread(target=self._probe_distcc_hosts_loop)
+            thread.setDaemon(True)
+            thread.start()
+
+    def _probe_distcc_hosts(self):
+        host_status = probe_distcc_hosts(self.distcc_hosts)
+        self.distcc_jobs = estimate_distcc_jobs(host_status)
+        return host_status
+
+    def _probe_distcc_hosts_loop(self):
+        while True:
+            time.sleep(_DISTCC_PROBE_INTERVAL)
+            jobs = self.distcc_jobs
+            host_status = self._probe_distcc_hosts()
+            if jobs != self.distcc_jobs:
+                down = [host for (host, limit, latency) in host_status
+                        if latency is None]
+                self._log('distcc', self.distcc_jobs,
+                          'hosts down: %s' % (' '.join(down) or 'none'))
+
+    def _cap(self, limit):
+        """Bound the limit by max_jobs and the capacity of distcc hosts. """
+        if self.distcc_hosts and self.distcc_jobs:
+            limit = min(limit, self.distcc_jobs)
+        return max(min(limit, self.max_jobs), 1)
+
+    def _log(self, event, limit, reason):
+        log_file = self.log_file
+        if not log_file:
+            return
+        load = get_load() or (0, 0)
+        available = get_available_memory() or 0
+        try:
+            log_file.write('%s %s limit=%d running=%d load1=%.2f '
+                           'runnable=%d available=%dM: %s\n' % (
+                           time.strftime('%H:%M:%S'), event, limit,
+                           self.running, load[0], load[1],
+                           available / (1024 * 1024), reason))
+            log_file.flush()
+        except (IOError, ValueError):
+            # Closed by the main thread when probing the distcc hosts
+            pass
+
+    def adjust(self):
+        """Adjust the limit if it is time, return the limit. """
+        now = time.time()
+        if now - self.last_adjust_time < self.interval:
+            return self.limit
+        self.last_adjust_time = now
+        limit = self.limit
+        reason = ''
+        available = get_available_memory()
+        load = get_load()
+        if load:
+            # Smooth the runnable processes, they change quickly
+            if self.runnable is None:
+                self.runnable = float(load[1])
+            else:
+                self.runnable = (self.runnable + load[1]) / 2.0
+        if available is not None and available < _LOW_MEMORY:
+            limit = max(limit / 2, 1)
+            reason = 'low memory'
+        elif self.runnable is not None:
+            if self.runnable > self.cpu_count * 1.25:
+                limit -= 1
+                reason = 'overloaded'
+            elif self.runnable < self.cpu_count and self.running >= limit:
+                limit += 1
+                reason = 'idle cpu'
+        limit = self._cap(limit)
+        if limit != self.limit:
+            self._log('adjust', limit, reason or 'distcc capacity')
+            self.limit = limit
+            self.adjust_count += 1
+            self.min_limit = min(self.min_limit, limit)
+            self.max_limit = max(self.max_limit, limit)
+        return self.limit
+
+    def acquire(self):
+        """Wait until the command could be started. """
+        self.condition.acquire()
+        try:
+            while self.running >= self.adjust():
+                # Check the load again even if no command finished
+                self.condition.wait(self.interval)
+            self.running += 1
+        finally:
+            self.condition.release()
+
+    def try_acquire(self):
+        """Start the command if it could be started now, return whether it is. """
+        self.condition.acquire()
+        try:
+            if self.running >= self.adjust():
+                return False
+            self.running += 1
+            return True
+        finally:
+            self.condition.release()
+
+    def release(self):
+        """The command is finished. """
+        self.condition.acquire()
+        try:
+            self.running -= 1
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def close(self):
+        """Close the log and report the range of the limit. """
+        if self.adjust_count:
+            console.info('adjusted the parallel jobs %d times, between %d '
+                         'and %d' % (self.adjust_count, self.min_limit,
+                                     self.max_limit))
+        if self.log_file:
+            self._log('stop', self.limit, '%d adjustments' % self.adjust_count)
+            self.log_file.close()
+            self.log_file = None
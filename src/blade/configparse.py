@@ -35,6 +35,8 @@ class BladeConfig(object):
     def __init__(self, current_source_dir):
         self.current_source_dir = current_source_dir
         self.current_file_name = ''
+        # The config files which are parsed, in the parsing order
+        self.parsed_files = []
         self.configs = {
             'cc_test_config': {
                 'dynamic_link': False,
@@ -58,6 +60,15 @@ class BladeConfig(object):
                 'enable_dccc': False,
             },
 
+            'remote_cache_config': {
+                'url': '',
+                'mode': 'readwrite',
+                'timeout': 5,
+                'max_connections': 4,
+                'failure_threshold': 3,
+                'retry_interval': 60,
+            },
+
             'java_config': {
                 'source_version': '',
                 'target_version': ''
@@ -91,6 +102,10 @@ class BladeConfig(object):
                 'benchmark_libs': [],
                 'benchmark_main_libs': [],
                 'linkflags': [],
+                'transitive_export_incs': False,
+                'unity_build': False,
+                'unity_chunk_size': 8,
+                'thin_archive': False,
             }
         }
 
@@ -99,6 +114,7 @@ class BladeConfig(object):
         try:
             self.current_file_name = filename
             if os.path.exists(filename):
+                self.parsed_files.append(filename)
                 execfile(filename)
         except:
             console.error_exit('Parse error in config file %s, exit...\n%s' %
@@ -182,6 +198,18 @@ def link_config(append=None, **kwargs):
     blade_config.update_config('link_config', append, kwargs)
 
 
+REMOTE_CACHE_MODES = frozenset(['readonly', 'readwrite'])
+
+
+def remote_cache_config(append=None, **kwargs):
+    """remote_cache_config section. """
+    mode = kwargs.get('mode')
+    if mode and mode not in REMOTE_CACHE_MODES:
+        console.error_exit('remote_cache_config: mode can only be in %s' %
+                list(REMOTE_CACHE_MODES))
+    blade_config.update_config('remote_cache_config', append, kwargs)
+
+
 def java_config(append=None, **kwargs):
     """java_config. """
     blade_config.update_config('java_config', append, kwargs)
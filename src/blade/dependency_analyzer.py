@@ -76,49 +76,74 @@ def _expand_deps(targets):
                 targets[dep].data['generate_java'] = True
 
 
-def _find_all_deps(target_id, targets, deps_map_cache, root_targets=None):
+def _find_all_deps(target_id, targets, deps_map_cache):
     """_find_all_deps.
 
     Return all targets depended by target_id directly and/or indirectly.
-    We need the parameter root_target_id to check loopy dependency.
+    The deps are expanded in depth first order with an explicit stack, the
+    targets on the stack form the current dependency path, which is used to
+    check and report loopy dependency.  The expanded deps of every visited
+    target are saved into deps_map_cache, so each target is expanded once.
 
     """
     new_deps_list = deps_map_cache.get(target_id)
     if new_deps_list is not None:
         return new_deps_list
 
-    if root_targets is None:
-        root_targets = set()
-
-    root_targets.add(target_id)
-    new_deps_list = []
-
-    for d in targets[target_id].expanded_deps:
-        # loop dependency
-        if d in root_targets:
-            err_msg = ''
-            for t in root_targets:
-                err_msg += '//%s:%s --> ' % (t[0], t[1])
-            console.error_exit('loop dependency found: //%s:%s --> [%s]' % (
-                       d[0], d[1], err_msg))
-        new_deps_piece = [d]
-        if d not in targets:
-            console.error_exit('Target %s:%s depends on %s:%s, '
-                               'but it is missing, exit...' % (
-                                   target_id[0], target_id[1],
-                                   d[0], d[1]))
-        new_deps_piece += _find_all_deps(d, targets, deps_map_cache, root_targets)
-        # Append new_deps_piece to new_deps_list, be aware of
-        # de-duplication:
-        for nd in new_deps_piece:
-            if nd in new_deps_list:
-                new_deps_list.remove(nd)
-            new_deps_list.append(nd)
-
-    deps_map_cache[target_id] = new_deps_list
-    root_targets.remove(target_id)
-
-    return new_deps_list
+    path = [target_id]
+    path_set = set(path)
+    deps_iters = [iter(targets[target_id].expanded_deps)]
+    while path:
+        current = path[-1]
+        for d in deps_iters[-1]:
+            if d in deps_map_cache:
+                continue
+            # loop dependency
+            if d in path_set:
+                loop_path = path[path.index(d):] + [d]
+                console.error_exit('loop dependency found: %s' % ' --> '.join(
+                        ['//%s:%s' % t for t in loop_path]))
+            if d not in targets:
+                console.error_exit('Target %s:%s depends on %s:%s, '
+                                   'but it is missing, exit...' % (
+                                       current[0], current[1],
+                                       d[0], d[1]))
+            path.append(d)
+            path_set.add(d)
+            deps_iters.append(iter(targets[d].expanded_deps))
+            break
+        else:
+            # All deps of current target are expanded
+            deps_map_cache[current] = _merge_deps(
+                    targets[current].expanded_deps, deps_map_cache)
+            path.pop()
+            path_set.remove(current)
+            deps_iters.pop()
+
+    return deps_map_cache[target_id]
+
+
+def _merge_deps(deps, deps_map_cache):
+    """Merge the deps and their expanded deps in link order.
+
+    It is equivalent to concatenating [d] + expanded deps of d for each d in
+    deps and keeping the last occurrence of every target, so a target is
+    always after all of the targets depend on it.  Scanning the pieces
+    backward and keeping the first occurrence makes it linear.
+
+    """
+    merged_deps = []
+    merged_set = set()
+    for d in reversed(deps):
+        for nd in reversed(deps_map_cache[d]):
+            if nd not in merged_set:
+                merged_set.add(nd)
+                merged_deps.append(nd)
+        if d not in merged_set:
+            merged_set.add(d)
+            merged_deps.append(d)
+    merged_deps.reverse()
+    return merged_deps
 
 
 def _topological_sort(pairlist):
@@ -0,0 +1,221 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the fast link module which links the programs and shared
+ libraries on tmpfs and then moves them into the build dir, the random
+ writes of the linker are much faster in memory.  Many links may run at
+ the same time, so the space of tmpfs is reserved for each of them before
+ it starts, the links which can't get enough space are run on disk as
+ usual instead of failing midway.
+
+"""
+
+
+import os
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import console
+
+
+# The file in the build dir saving the time of each link on disk
+FAST_LINK_HISTORY_FILE = '.blade.fast_link'
+
+# The ratio of tmpfs which is always kept free, it is shared memory
+_TMPFS_FREE_RATIO = 0.1
+
+# The size of the header of each member in the ar archive
+_AR_HEADER_SIZE = 60
+
+
+def find_tmpfs_dirs(mounts_path='/proc/mounts'):
+    """Return the mount points of the writable tmpfs. """
+    try:
+        f = open(mounts_path)
+        try:
+            lines = f.readlines()
+        finally:
+            f.close()
+    except IOError:
+        return []
+    dirs = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 4 or fields[2] != 'tmpfs':
+            continue
+        # The spaces in the path are escaped
+        path = fields[1].replace('\\040', ' ')
+        if 'ro' in fields[3].split(',') or path in dirs:
+            continue
+        if os.path.isdir(path) and os.access(path, os.W_OK | os.X_OK):
+            dirs.append(path)
+    return dirs
+
+
+def get_space(path):
+    """Return (available, total) bytes of the file system, or None. """
+    try:
+        st = os.statvfs(path)
+    except OSError:
+        return None
+    return st.f_bavail * st.f_frsize, st.f_blocks * st.f_frsize
+
+
+def _archive_size(path):
+    """Return the size of the archive, with the members of a thin one.
+
+    A thin archive only keeps the headers of its members, which record
+    the sizes of the objects, and the symbol and name tables.
+
+    """
+    f = open(path, 'rb')
+    try:
+        if f.read(8) != '!<thin>\n':
+            return os.path.getsize(path)
+        size = 0
+        while True:
+            header = f.read(_AR_HEADER_SIZE)
+            if len(header) < _AR_HEADER_SIZE:
+                return size
+            name = header[:16].rstrip()
+            member_size = int(header[48:58])
+            size += member_size
+            if name in ('/', '//', '/SYM64/'):
+                f.seek(member_size + member_size % 2, 1)
+    finally:
+        f.close()
+
+
+def estimate_link_size(output, inputs):
+    """Estimate the size of the output of the link.
+
+    It is hardly larger than the objects and static libraries linked into
+    it, nor much larger than the output of the last time.
+
+    """
+    size = 0
+    for path in inputs:
+        try:
+            if path.endswith('.a'):
+                size += _archive_size(path)
+            elif path.endswith('.o'):
+                size += os.path.getsize(path)
+        except (IOError, OSError, ValueError):
+            pass
+    try:
+        size = max(size, os.path.getsize(output) * 5 / 4)
+    except OSError:
+        pass
+    return size
+
+
+def load_link_time(path):
+    """Load the time of each link on disk, keyed by the output. """
+    try:
+        f = open(path, 'rb')
+        try:
+            return pickle.load(f)
+        finally:
+            f.close()
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+        return {}
+
+
+class FastLinker(object):
+    """Reserves the space of tmpfs for the links and accounts them.
+
+    A link runs on tmpfs only if the space available now, minus what the
+    running links reserved, holds its estimated output and still leaves
+    10% of tmpfs free.  The time of the links run on disk is saved in the
+    history file, so the time saved by the same links on tmpfs in later
+    builds can be reported.
+
+    """
+    def __init__(self, tmp_dir, history_path):
+        self.tmp_dir = tmp_dir
+        self.history_path = history_path
+        self.disk_link_time = load_link_time(history_path)
+        self.disk_link_time_changed = False
+        self.reserved = {}
+        self.tmpfs_links = 0
+        self.tmpfs_time = 0.0
+        self.disk_links = 0
+        self.compared_links = 0
+        self.saved_time = 0.0
+        self.lock = threading.Lock()
+
+    def reserve(self, output, size):
+        """Reserve the space for the link, return whether it is. """
+        self.lock.acquire()
+        try:
+            space = get_space(self.tmp_dir)
+            if not space:
+                return False
+            (available, total) = space
+            available -= sum(self.reserved.values())
+            if available - size < total * _TMPFS_FREE_RATIO:
+                return False
+            self.reserved[output] = size
+            return True
+        finally:
+            self.lock.release()
+
+    def release(self, output):
+        """The link on tmpfs is finished, release its space. """
+        self.lock.acquire()
+        try:
+            self.reserved.pop(output, None)
+        finally:
+            self.lock.release()
+
+    def account(self, output, seconds, on_tmpfs):
+        """Account the time of the link which succeeded. """
+        self.lock.acquire()
+        try:
+            if on_tmpfs:
+                self.tmpfs_links += 1
+                self.tmpfs_time += seconds
+                disk_time = self.disk_link_time.get(output)
+                if disk_time is not None:
+                    self.compared_links += 1
+                    self.saved_time += disk_time - seconds
+            else:
+                self.disk_links += 1
+                self.disk_link_time[output] = seconds
+                self.disk_link_time_changed = True
+        finally:
+            self.lock.release()
+
+    def close(self):
+        """Report the links and save the time of the links on disk. """
+        if self.tmpfs_links or self.disk_links:
+            console.info('linked %d on tmpfs %s in %.1fs, %d on disk for '
+                         'lack of space' % (self.tmpfs_links, self.tmp_dir,
+                                            self.tmpfs_time, self.disk_links))
+        if self.compared_links:
+            if self.saved_time > 0:
+                saved = 'saved about %.1fs' % self.saved_time
+            else:
+                saved = 'saved no time'
+            console.info('%s on tmpfs compared with linking %d of them on '
+                         'disk before' % (saved, self.compared_links))
+        if not self.disk_link_time_changed:
+            return
+        temp_path = '%s.tmp%d' % (self.history_path, os.getpid())
+        try:
+            f = open(temp_path, 'wb')
+            try:
+                pickle.dump(self.disk_link_time, f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            os.rename(temp_path, self.history_path)
+        except (IOError, OSError):
+            pass
@@ -18,6 +18,9 @@ import blade
 import build_rules
 import java_jar_target
 from blade_util import var_to_list
+from build_action import ALWAYS_BUILD
+from build_action import BuildAction
+from build_action import target_alias
 from target import Target
 
 
@@ -27,6 +30,8 @@ class GenRuleTarget(Target):
     This class is derived from Target.
 
     """
+    __slots__ = ('var_name',)
+
     def __init__(self,
                  name,
                  srcs,
@@ -75,8 +80,11 @@ class GenRuleTarget(Target):
         var_name = self._generate_variable_name(self.path, self.name)
 
         srcs_str = ''
+        action = 'MakeCachedAction("%s")'
         if not self.srcs:
+            # Run every time, the outputs are never reused from the cache
             srcs_str = 'time_value'
+            action = '"%s"'
         else:
             srcs_str = self._srcs_list(self.path, self.srcs)
         cmd = self.data['cmd']
@@ -85,12 +93,12 @@ class GenRuleTarget(Target):
         cmd = cmd.replace('$FIRST_SRC', '$SOURCE')
         cmd = cmd.replace('$FIRST_OUT', '$TARGET')
         cmd = cmd.replace('$BUILD_DIR', self.build_path)
-        self._write_rule('%s = %s.Command([%s], [%s], "%s")' % (
+        self._write_rule('%s = %s.Command([%s], [%s], %s)' % (
                 var_name,
                 env_name,
                 self._srcs_list(self.path, self.data['outs']),
                 srcs_str,
-                cmd))
+                action % cmd))
 
         self.var_name = var_name
         self._generate_target_explict_dependency(var_name)
@@ -121,6 +129,48 @@ class GenRuleTarget(Target):
                                                      var_name,
                                                      dep_var_name))
 
+    def get_outputs(self):
+        """Returns the files generated by the gen_rule. """
+        return [os.path.join(self.build_path, self.path, out)
+                for out in self.data['outs']]
+
+    def get_generated_headers(self):
+        """The outputs may be included by the cc targets depending on it. """
+        return self.get_outputs()
+
+    def build_actions(self):
+        """build_actions.
+
+        The variables in the command are replaced with the file paths,
+        the command depends on all targets in deps.
+
+        """
+        srcs = [self._source_file_path(src) for src in self.srcs]
+        outs = self.get_outputs()
+        first_src = ''
+        if srcs:
+            first_src = srcs[0]
+        cmd = self.data['cmd']
+        cmd = cmd.replace('$SRCS', ' '.join(srcs))
+        cmd = cmd.replace('$OUTS', ' '.join(outs))
+        cmd = cmd.replace('$FIRST_SRC', first_src)
+        cmd = cmd.replace('$FIRST_OUT', outs[0])
+        cmd = cmd.replace('$BUILD_DIR', self.build_path)
+        cmd = cmd.replace('$$', '$')
+
+        targets = self.blade.get_build_targets()
+        implicit_deps = []
+        for dep in self.expanded_deps:
+            if targets[dep].type != 'system_library':
+                implicit_deps.append(target_alias(dep))
+        if not srcs:
+            # Always run the command like scons does
+            implicit_deps.append(ALWAYS_BUILD)
+
+        return [BuildAction('command', outs, srcs,
+                            implicit_deps=implicit_deps,
+                            variables={'cmd': cmd})]
+
 
 def gen_rule(name,
              srcs=[],
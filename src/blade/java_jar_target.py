@@ -31,6 +31,14 @@ class JavaJarTarget(Target):
     rules.
 
     """
+    __slots__ = ('java_jar_cmd_list',
+                 'cmd_var_list',
+                 'java_jar_after_dep_source_list',
+                 'java_jar_dep_source_list',
+                 'java_classpath_list',
+                 'targets_dependency_map',
+                 'java_jar_dep_vars')
+
     def __init__(self,
                  name,
                  srcs,
@@ -347,6 +355,10 @@ class JavaJarTarget(Target):
                     self._prebuilt_java_jar_build_path(),
                     self._prebuilt_java_jar_src_path()))
 
+    def get_rules_input_files(self):
+        """The rules depend on whether the jar file is built already. """
+        return None
+
     def scons_rules(self):
         """scons_rules.
 
@@ -26,6 +26,8 @@ class JavaTarget(Target):
     rules.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  type,
@@ -88,6 +90,8 @@ class JavaTarget(Target):
 
 class JavaLibrary(JavaTarget):
     """JavaLibrary"""
+    __slots__ = ()
+
     def __init__(self, name, srcs, deps, prebuilt, **kwargs):
         type = 'java_library'
         if prebuilt:
@@ -97,6 +101,8 @@ class JavaLibrary(JavaTarget):
 
 class JavaBinary(JavaTarget):
     """JavaLibrary"""
+    __slots__ = ()
+
     def __init__(self, name, srcs, deps, **kwargs):
         type = 'java_binary'
         JavaTarget.__init__(self, name, type, srcs, deps, False, kwargs)
@@ -104,6 +110,8 @@ class JavaBinary(JavaTarget):
 
 class JavaTest(JavaBinary):
     """JavaLibrary"""
+    __slots__ = ()
+
     def __init__(self, name, srcs, deps, **kwargs):
         type = 'java_binary'
         JavaTarget.__init__(self, name, type, srcs, deps, False, kwargs)
@@ -13,6 +13,7 @@ import blade
 
 import console
 import build_rules
+from build_action import BuildAction
 from cc_targets import CcTarget
 
 
@@ -22,6 +23,8 @@ class LexYaccLibrary(CcTarget):
     This class is derived from SconsCCTarget and it generates lex yacc rules.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -117,6 +120,53 @@ class LexYaccLibrary(CcTarget):
             self.data.get('build_dynamic', False)):
             self._dynamic_cc_library()
 
+    def get_generated_headers(self):
+        """Returns the header generated by yacc. """
+        return ['%s.hh' % self._target_file_path(self.path, self.srcs[1])]
+
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options.
+
+        """
+        self._check_deprecated_deps()
+
+        lex_cc_file = '%s.cc' % self._target_file_path(self.path,
+                                                       self.srcs[0])
+        yacc_cc_file = '%s.cc' % self._target_file_path(self.path,
+                                                        self.srcs[1])
+        yacc_hh_file = '%s.hh' % self._target_file_path(self.path,
+                                                        self.srcs[1])
+
+        lex_flags = []
+        if self.data.get('recursive'):
+            lex_flags.append('-R')
+        prefix = self.data.get('prefix')
+        if prefix:
+            lex_flags.append('-P %s' % prefix)
+        yacc_flags = []
+        if prefix:
+            yacc_flags.append('-p %s' % prefix)
+
+        actions = [BuildAction('lex', lex_cc_file,
+                               self._source_file_path(self.srcs[0]),
+                               variables={'lexflags': lex_flags}),
+                   BuildAction('yacc', [yacc_cc_file, yacc_hh_file],
+                               self._source_file_path(self.srcs[1]),
+                               variables={'yaccflags': yacc_flags})]
+
+        sources = [lex_cc_file, yacc_cc_file]
+        objects = ['%s.o' % src for src in sources]
+        actions += self._cc_objects_actions(sources, objects, [yacc_hh_file])
+
+        actions += self._cc_library_actions(objects)
+        options = self.blade.get_options()
+        if (getattr(options, 'generate_dynamic', False) or
+            self.data.get('build_dynamic', False)):
+            actions += self._dynamic_cc_library_actions(objects)
+        return actions
+
 
 def lex_yacc_library(name,
                      srcs=[],
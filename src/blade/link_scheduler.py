@@ -0,0 +1,199 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the link scheduler module which limits the link actions in a
+ separate pool from the compiling ones.  Large links may take several
+ gigabytes of memory each, so they are only started when there is enough
+ memory for them, according to the peak memory they used last time,
+ while the compiling goes on at full width.
+
+"""
+
+
+import os
+import select
+import subprocess
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from blade_util import get_available_memory
+
+
+# The file in the build dir saving the peak memory used by each link
+LINK_MEMORY_FILE = '.blade.link_memory'
+
+# The memory assumed to be used by a link which was never run, in bytes
+DEFAULT_LINK_MEMORY = 1024 * 1024 * 1024
+
+# The ratio of the available memory which could be used by the links
+_LINK_MEMORY_RATIO = 0.75
+
+
+def load_link_memory(path):
+    """Load the peak memory used by each link, keyed by the output. """
+    try:
+        f = open(path, 'rb')
+        try:
+            return pickle.load(f)
+        finally:
+            f.close()
+    except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+        return {}
+
+
+def estimate_link_jobs(jobs, link_memory):
+    """Return the number of links could run at the same time.
+
+    It is the number of the largest links the available memory could
+    hold, but not more than jobs.
+
+    """
+    available = get_available_memory()
+    if not available:
+        return max(jobs / 2, 1)
+    per_link = max(link_memory.values() + [0]) or DEFAULT_LINK_MEMORY
+    link_jobs = int(available * _LINK_MEMORY_RATIO / per_link)
+    return min(max(link_jobs, 1), jobs)
+
+
+def run_command(cmdline, env=None):
+    """Run the command in shell, return its output and peak memory.
+
+    Returns (returncode, stdout, stderr, peak_rss), peak_rss is the peak
+    resident memory in bytes of the command and its children, 0 if it
+    is unknown.
+
+    """
+    p = subprocess.Popen(cmdline, env=env, shell=True,
+                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if not hasattr(os, 'wait4'):
+        (stdout, stderr) = p.communicate()
+        return p.returncode, stdout, stderr, 0
+
+    outputs = {p.stdout: [], p.stderr: []}
+    pipes = outputs.keys()
+    while pipes:
+        for pipe in select.select(pipes, [], [])[0]:
+            data = os.read(pipe.fileno(), 65536)
+            if data:
+                outputs[pipe].append(data)
+            else:
+                pipe.close()
+                pipes.remove(pipe)
+    (pid, status, rusage) = os.wait4(p.pid, 0)
+    if os.WIFSIGNALED(status):
+        p.returncode = -os.WTERMSIG(status)
+    else:
+        p.returncode = os.WEXITSTATUS(status)
+    # ru_maxrss is in kilobytes on linux
+    return (p.returncode, ''.join(outputs[p.stdout]),
+            ''.join(outputs[p.stderr]), rusage.ru_maxrss * 1024)
+
+
+class LinkScheduler(object):
+    """Decides when the link actions could be started.
+
+    At most link_jobs links run at the same time.  Besides the first one,
+    a link is started only if the memory used by the running links and it
+    is within the budget, which is a part of the available memory when
+    building starts, and the memory available now is enough for it.  The
+    memory used by a link is estimated with its peak memory last time,
+    which is saved in the history file.
+
+    The blocking acquire takes one of the link_jobs slots before waiting
+    for the memory, so at most link_jobs callers wait for the memory, the
+    others wait for a running link to finish.
+
+    """
+    def __init__(self, link_jobs, history_path):
+        self.link_jobs = link_jobs
+        self.history_path = history_path
+        self.link_memory = load_link_memory(history_path)
+        self.link_memory_changed = False
+        self.budget = (get_available_memory() or 0) * _LINK_MEMORY_RATIO
+        self.running = {}
+        self.waiting = 0
+        self.slots = threading.Semaphore(link_jobs)
+        self.condition = threading.Condition()
+
+    def _estimate(self, output):
+        return self.link_memory.get(output, DEFAULT_LINK_MEMORY)
+
+    def _can_start(self, output):
+        if not self.running:
+            return True
+        if len(self.running) >= self.link_jobs:
+            return False
+        memory = self._estimate(output)
+        if self.budget and sum(self.running.values()) + memory > self.budget:
+            return False
+        available = get_available_memory()
+        return not available or available >= memory
+
+    def try_acquire(self, output):
+        """Start the link if it could be started now, return whether it is. """
+        if not self.slots.acquire(False):
+            return False
+        self.condition.acquire()
+        try:
+            if not self._can_start(output):
+                self.slots.release()
+                return False
+            self.running[output] = self._estimate(output)
+            return True
+        finally:
+            self.condition.release()
+
+    def acquire(self, output):
+        """Wait until the link could be started. """
+        self.slots.acquire()
+        self.condition.acquire()
+        try:
+            self.waiting += 1
+            try:
+                while not self._can_start(output):
+                    # Check the available memory again even if no link
+                    # finished
+                    self.condition.wait(1.0)
+            finally:
+                self.waiting -= 1
+            self.running[output] = self._estimate(output)
+        finally:
+            self.condition.release()
+
+    def release(self, output, peak_rss=0):
+        """The link is finished, record its peak memory if it is known. """
+        self.condition.acquire()
+        try:
+            if output in self.running:
+                del self.running[output]
+                self.slots.release()
+            if peak_rss:
+                self.link_memory[output] = peak_rss
+                self.link_memory_changed = True
+            self.condition.notifyAll()
+        finally:
+            self.condition.release()
+
+    def close(self):
+        """Save the peak memory of the links. """
+        if not self.link_memory_changed:
+            return
+        temp_path = '%s.tmp%d' % (self.history_path, os.getpid())
+        try:
+            f = open(temp_path, 'wb')
+            try:
+                pickle.dump(self.link_memory, f, pickle.HIGHEST_PROTOCOL)
+            finally:
+                f.close()
+            os.rename(temp_path, self.history_path)
+        except (IOError, OSError):
+            pass
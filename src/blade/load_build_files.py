@@ -16,11 +16,22 @@
 
 
 import os
+import signal
+import sys
 import traceback
+from StringIO import StringIO
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 import build_rules
 import console
+from blade_util import md5sum_file
 from blade_util import relative_path
+from build_file_cache import BuildFileCache
+from target import Target
 
 
 # import these modules make build functions registered into build_rules
@@ -65,12 +76,9 @@ def _find_dir_depender(dir, blade):
     """_find_dir_depender to find which target depends on the dir.
 
     """
-    target_database = blade.get_target_database()
-    for key in target_database:
-        for dkey in target_database[key].expanded_deps:
-            if dkey[0] == dir:
-                return '//%s:%s' % (target_database[key].path,
-                                    target_database[key].name)
+    dependers = blade.get_dir_dependers(dir)
+    if dependers:
+        return '//%s:%s' % dependers[0]
     return None
 
 
@@ -102,7 +110,187 @@ WARN_IF_FAIL = 1
 ABORT_IF_FAIL = 2
 
 
-def _load_build_file(source_dir, action_if_fail, processed_source_dirs, blade):
+def _init_build_target(blade):
+    """Initialize the build_target at first time.
+
+    It is to be used for BUILD file loaded by execfile.
+
+    """
+    global build_target
+    if build_target is None:
+        build_target = TargetAttributes(blade.get_options())
+        build_rules.register_variable('build_target', build_target)
+
+
+def _exec_build_file(build_file):
+    """Execute the BUILD file to register its targets. """
+    try:
+        # The magic here is that a BUILD file is a Python script,
+        # which can be loaded and executed by execfile().
+        execfile(build_file, build_rules.get_all(), None)
+    except SystemExit:
+        console.error_exit('%s: fatal error, exit...' % build_file)
+    except:
+        console.error_exit('Parse error in %s, exit...\n%s' % (
+                build_file, traceback.format_exc()))
+
+
+def _collect_new_targets(first_new_key, blade):
+    """Return the targets registered since the first_new_key position.
+
+    The system libraries are shared by all BUILD files, so they are
+    excluded and registered again when restoring the targets depend
+    on them.
+
+    """
+    target_database = blade.get_target_database()
+    return [target_database[key]
+            for key in blade.get_registered_target_keys()[first_new_key:]
+            if key[0] != '#']
+
+
+def _restore_targets(pickled_targets, blade):
+    """Register the pickled targets into the target database.
+
+    Returns the restored targets.
+
+    """
+    targets = pickle.loads(pickled_targets)
+    for target in targets:
+        target.attach_blade(blade)
+        blade.register_target(target)
+    return targets
+
+
+def _load_build_file_with_cache(build_file, build_file_cache, blade):
+    """Load the targets from the cache, execute the BUILD file if missed. """
+    digest = md5sum_file(build_file)
+    cached_targets = build_file_cache.lookup(build_file, digest)
+    if cached_targets is not None:
+        _restore_targets(cached_targets, blade)
+        return
+
+    first_new_key = len(blade.get_registered_target_keys())
+    _exec_build_file(build_file)
+    build_file_cache.update(build_file, digest,
+                            _collect_new_targets(first_new_key, blade))
+
+
+def _load_preloaded_build_file(build_file, result, build_file_cache, blade):
+    """Register the targets loaded by the worker process. """
+    source_dir, digest, pickled_targets, stdout, stderr = result
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    targets = _restore_targets(pickled_targets, blade)
+    if build_file_cache:
+        build_file_cache.update_pickled(build_file, digest, pickled_targets,
+                                        targets)
+
+
+# The blade manager used by the worker processes of parallel loading,
+# which is inherited from the parent process by fork.
+_worker_blade = None
+
+
+def _init_load_worker():
+    """Initialize the worker process of parallel loading. """
+    # Let the parent process handle the KeyboardInterrupt
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Target.check_srcs_owner_on_init = False
+
+
+def _load_build_file_in_worker(source_dir):
+    """Execute the BUILD file in the source_dir in a worker process.
+
+    Returns a tuple of (source_dir, digest, pickled_targets, stdout, stderr).
+    The output is captured and replayed by the parent process in the order
+    of loading.  The pickled_targets is None if anything goes wrong, then
+    the parent process executes the BUILD file again to report the error
+    in the same way as loading serially.
+
+    """
+    blade = _worker_blade
+    build_file = os.path.join(source_dir, 'BUILD')
+    registered_target_keys = blade.get_registered_target_keys()
+    first_new_key = len(registered_target_keys)
+    digest = None
+    pickled_targets = None
+    old_stdout, old_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = StringIO(), StringIO()
+    try:
+        try:
+            digest = md5sum_file(build_file)
+            blade.set_current_source_path(source_dir)
+            execfile(build_file, build_rules.get_all(), None)
+            pickled_targets = pickle.dumps(
+                    _collect_new_targets(first_new_key, blade), 2)
+        except:
+            pass
+        stdout, stderr = sys.stdout.getvalue(), sys.stderr.getvalue()
+    finally:
+        sys.stdout, sys.stderr = old_stdout, old_stderr
+        # This process may load other BUILD files later, forget the
+        # targets to avoid false duplication errors.
+        target_database = blade.get_target_database()
+        for key in registered_target_keys[first_new_key:]:
+            del target_database[key]
+        del registered_target_keys[first_new_key:]
+    return source_dir, digest, pickled_targets, stdout, stderr
+
+
+def _parallel_load_build_files(source_dirs, jobs, blade):
+    """Execute the BUILD files in the source_dirs in a process pool.
+
+    Returns a dict maps source dir to the result of the worker.  The
+    results are registered by _load_build_file in the normal order, so
+    the target database and the error messages keep the same as
+    loading serially.
+
+    """
+    try:
+        import multiprocessing
+    except ImportError:
+        return {}
+
+    global _worker_blade
+    _worker_blade = blade
+    console.info('loading %d BUILD files with %d jobs...' % (
+                 len(source_dirs), jobs))
+    pool = multiprocessing.Pool(jobs, _init_load_worker)
+    try:
+        # Waiting with a timeout makes the KeyboardInterrupt deliverable
+        results = pool.map_async(_load_build_file_in_worker,
+                                 source_dirs, 1).get(0xFFFF)
+    except:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
+    _worker_blade = None
+    return dict([(result[0], result) for result in results])
+
+
+def _preload_build_files(source_dirs, jobs, build_file_cache, blade):
+    """Select the BUILD files to be loaded in parallel and load them. """
+    selected_dirs = []
+    selected_dir_set = set()
+    for source_dir, action_if_fail in source_dirs:
+        source_dir = os.path.normpath(source_dir)
+        build_file = os.path.join(source_dir, 'BUILD')
+        if source_dir in selected_dir_set or not os.path.isfile(build_file):
+            continue
+        if build_file_cache and build_file_cache.lookup(
+                build_file, md5sum_file(build_file)) is not None:
+            continue
+        selected_dirs.append(source_dir)
+        selected_dir_set.add(source_dir)
+    if len(selected_dirs) < 2:
+        return {}
+    return _parallel_load_build_files(selected_dirs, jobs, blade)
+
+
+def _load_build_file(source_dir, action_if_fail, processed_source_dirs, blade,
+                     build_file_cache=None, preloaded_build_files=None):
     """_load_build_file to load the BUILD and place the targets into database.
 
     Invoked by _load_targets.  Load and execute the BUILD
@@ -112,15 +300,13 @@ def _load_build_file(source_dir, action_if_fail, processed_source_dirs, blade):
     does NOT exsit, take action corresponding to action_if_fail.  The
     parameters processed_source_dirs refers to a set defined in the
     caller and used to avoid duplicated execution of BUILD files.
+    If build_file_cache is given, the targets of unchanged BUILD files
+    are restored from it instead of executing the BUILD files.  The
+    preloaded_build_files contains the results of BUILD files already
+    executed in parallel.
 
     """
-
-    # Initialize the build_target at first time, to be used for BUILD file
-    # loaded by execfile
-    global build_target
-    if build_target is None:
-        build_target = TargetAttributes(blade.get_options())
-        build_rules.register_variable('build_target', build_target)
+    _init_build_target(blade)
 
     source_dir = os.path.normpath(source_dir)
     # TODO(yiwang): the character '#' is a magic value.
@@ -135,15 +321,16 @@ def _load_build_file(source_dir, action_if_fail, processed_source_dirs, blade):
     blade.set_current_source_path(source_dir)
     build_file = os.path.join(source_dir, 'BUILD')
     if os.path.exists(build_file):
-        try:
-            # The magic here is that a BUILD file is a Python script,
-            # which can be loaded and executed by execfile().
-            execfile(build_file, build_rules.get_all(), None)
-        except SystemExit:
-            console.error_exit('%s: fatal error, exit...' % build_file)
-        except:
-            console.error_exit('Parse error in %s, exit...\n%s' % (
-                    build_file, traceback.format_exc()))
+        preloaded = None
+        if preloaded_build_files:
+            preloaded = preloaded_build_files.pop(source_dir, None)
+        if preloaded and preloaded[2] is not None:
+            _load_preloaded_build_file(build_file, preloaded,
+                                       build_file_cache, blade)
+        elif build_file_cache:
+            _load_build_file_with_cache(build_file, build_file_cache, blade)
+        else:
+            _exec_build_file(build_file)
     else:
         if action_if_fail == ABORT_IF_FAIL:
             _report_not_exist(source_dir, build_file, blade)
@@ -155,11 +342,9 @@ def _find_depender(dkey, blade):
     """_find_depender to find which target depends on the target with dkey.
 
     """
-    target_database = blade.get_target_database()
-    for key in target_database:
-        if dkey in target_database[key].expanded_deps:
-            return '//%s:%s' % (target_database[key].path,
-                                target_database[key].name)
+    dependers = blade.get_direct_dependers(dkey)
+    if dependers:
+        return '//%s:%s' % dependers[0]
     return None
 
 
@@ -173,6 +358,13 @@ def load_targets(target_ids, working_dir, blade_root_dir, blade):
     """
     target_database = blade.get_target_database()
 
+    build_file_cache = None
+    if getattr(blade.get_options(), 'build_cache', False):
+        _init_build_target(blade)
+        build_file_cache = BuildFileCache(
+                os.path.join(blade.get_build_path(), '.blade.build_cache'),
+                build_target)
+
     # targets specified in command line
     cited_targets = set()
     # cited_targets and all its dependencies
@@ -213,6 +405,13 @@ def load_targets(target_ids, working_dir, blade_root_dir, blade):
 
     direct_targets = list(cited_targets)
 
+    preloaded_build_files = None
+    load_jobs = getattr(blade.get_options(), 'load_jobs', 1)
+    if load_jobs > 1:
+        _init_build_target(blade)
+        preloaded_build_files = _preload_build_files(
+                source_dirs, load_jobs, build_file_cache, blade)
+
     # Load BUILD files in paths, and add all loaded targets into
     # cited_targets.  Together with above step, we can ensure that all
     # targets mentioned in the command line are now in cited_targets.
@@ -220,7 +419,9 @@ def load_targets(target_ids, working_dir, blade_root_dir, blade):
         _load_build_file(source_dir,
                          action_if_fail,
                          processed_source_dirs,
-                         blade)
+                         blade,
+                         build_file_cache,
+                         preloaded_build_files)
 
     for key in target_database:
         cited_targets.add(key)
@@ -239,7 +440,8 @@ def load_targets(target_ids, working_dir, blade_root_dir, blade):
         _load_build_file(source_dir,
                          ABORT_IF_FAIL,
                          processed_source_dirs,
-                         blade)
+                         blade,
+                         build_file_cache)
 
         if target_id not in target_database:
             console.error_exit('%s: target //%s:%s does not exists' % (
@@ -250,6 +452,9 @@ def load_targets(target_ids, working_dir, blade_root_dir, blade):
             if key not in related_targets:
                 cited_targets.add(key)
 
+    if build_file_cache:
+        build_file_cache.save()
+
     # Iterating to get svn root dirs
     for path, name in related_targets:
         root_dir = path.split('/')[0].strip()
@@ -0,0 +1,397 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the native executor module which runs the build actions in
+ blade itself instead of scons or ninja.  The actions form a DAG, the
+ ready ones are run in a pool of worker threads, each of them runs the
+ command in a subprocess.
+
+"""
+
+
+import os
+import Queue
+import subprocess
+import sys
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import console
+from blade_util import md5sum_file
+from blade_util import md5sum_str
+from link_scheduler import LINK_MEMORY_FILE
+from link_scheduler import LinkScheduler
+from link_scheduler import run_command
+
+
+class _Job(object):
+    """A build action to be run by the executor. """
+    __slots__ = ('outputs',
+                 'inputs',
+                 'implicit_deps',
+                 'order_only_deps',
+                 'command',
+                 'description',
+                 'depfile',
+                 'always_build',
+                 'pool',
+                 'dependents',
+                 'pending')
+
+    def __init__(self, outputs, inputs, implicit_deps, order_only_deps,
+                 command, description, depfile, always_build, pool):
+        self.outputs = outputs
+        self.inputs = inputs
+        self.implicit_deps = implicit_deps
+        self.order_only_deps = order_only_deps
+        self.command = command
+        self.description = description
+        self.depfile = depfile
+        self.always_build = always_build
+        self.pool = pool
+        self.dependents = []
+        self.pending = 0
+
+    def is_phony(self):
+        return self.command is None
+
+
+def _parse_depfile(path):
+    """Return the prerequisites in the makefile style depfile. """
+    f = open(path)
+    try:
+        content = f.read()
+    finally:
+        f.close()
+    content = content.replace('\\\n', ' ')
+    colon = content.find(': ')
+    if colon == -1:
+        return []
+    deps = []
+    for dep in content[colon + 2:].replace('\\ ', '\0').split():
+        deps.append(dep.replace('\0', ' '))
+    return deps
+
+
+class NativeExecutor(object):
+    """Runs the build actions in parallel.
+
+    An action is up to date if all of its outputs exist, and its command
+    line and the md5sums of its inputs, including the headers listed in
+    its depfile, are the same as the last time it succeeded.  These are
+    saved in the .blade.native_db file in the build dir, as well as the
+    md5sums of the files keyed by their modification time and size, so
+    the unchanged files needn't be read again.
+
+    Since the content instead of the time stamp is compared, the actions
+    depending on a regenerated but unchanged file are not run again.  The
+    md5sum of a phony action is computed from the md5sums of its inputs.
+
+    """
+    _DB_VERSION = 1
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        self.db_path = os.path.join(build_dir, '.blade.native_db')
+        self.jobs = []
+        self.producers = {}
+        self.file_digests = {}
+        self.action_records = {}
+        self.phony_digests = {}
+
+    def add_action(self, outputs, inputs, implicit_deps=None,
+                   order_only_deps=None, command=None, description='',
+                   depfile='', always_build=False, pool=''):
+        """Add an action, it is a phony one if the command is None.
+
+        pool is 'link' for the link actions.
+
+        """
+        job = _Job(outputs, inputs, implicit_deps or [], order_only_deps or [],
+                   command, description or command, depfile, always_build,
+                   pool)
+        for output in outputs:
+            if output in self.producers:
+                console.error_exit('multiple actions generate %s' % output)
+            self.producers[output] = job
+        self.jobs.append(job)
+
+    def get_commands(self):
+        """Return the commands of the actions, in the adding order. """
+        return [job.command for job in self.jobs if not job.is_phony()]
+
+    def _load_db(self):
+        if not os.path.exists(self.db_path):
+            return
+        try:
+            f = open(self.db_path, 'rb')
+            try:
+                (version, self.file_digests,
+                 self.action_records) = pickle.load(f)
+            finally:
+                f.close()
+        except (IOError, EOFError, ValueError, pickle.UnpicklingError):
+            version = None
+        if version != self._DB_VERSION:
+            self.file_digests = {}
+            self.action_records = {}
+
+    def _save_db(self):
+        temp_path = '%s.tmp' % self.db_path
+        f = open(temp_path, 'wb')
+        try:
+            pickle.dump((self._DB_VERSION, self.file_digests,
+                         self.action_records), f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.rename(temp_path, self.db_path)
+
+    def _file_digest(self, path):
+        """Return the md5sum of the file, or None if it doesn't exist. """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime, st.st_size)
+        entry = self.file_digests.get(path)
+        if entry and entry[0] == stamp:
+            return entry[1]
+        digest = md5sum_file(path)
+        self.file_digests[path] = (stamp, digest)
+        return digest
+
+    def _digest(self, path):
+        """Return the md5sum of the file or the phony action. """
+        job = self.producers.get(path)
+        if not job or not job.is_phony():
+            return self._file_digest(path)
+        digest = self.phony_digests.get(path)
+        if digest is None:
+            digests = [str(self._digest(p))
+                       for p in job.inputs + job.implicit_deps]
+            digest = md5sum_str(' '.join(digests))
+            self.phony_digests[path] = digest
+        return digest
+
+    def _input_digests(self, job, deps):
+        digests = []
+        for path in job.inputs + job.implicit_deps + deps:
+            digests.append((path, self._digest(path)))
+        return digests
+
+    def _is_up_to_date(self, job):
+        if job.always_build:
+            return False
+        for output in job.outputs:
+            if not os.path.exists(output):
+                return False
+        record = self.action_records.get(job.outputs[0])
+        if not record:
+            return False
+        (command_digest, digests, deps) = record
+        if command_digest != md5sum_str(job.command):
+            return False
+        return digests == self._input_digests(job, deps)
+
+    def _record(self, job):
+        """Record the action which succeeded. """
+        deps = []
+        if job.depfile and os.path.exists(job.depfile):
+            deps = [d for d in _parse_depfile(job.depfile)
+                    if d not in job.inputs]
+            os.remove(job.depfile)
+        self.action_records[job.outputs[0]] = (
+                md5sum_str(job.command), self._input_digests(job, deps), deps)
+
+    def _build_graph(self):
+        """Link the jobs by their deps, return the jobs ready to run. """
+        ready = []
+        for job in self.jobs:
+            for path in job.inputs + job.implicit_deps + job.order_only_deps:
+                producer = self.producers.get(path)
+                if producer:
+                    job.pending += 1
+                    producer.dependents.append(job)
+                elif not os.path.exists(path):
+                    console.error_exit("'%s', needed by '%s', is missing and "
+                                       "no action generates it" % (
+                                       path, job.outputs[0]))
+            if not job.pending:
+                ready.append(job)
+        return ready
+
+    @staticmethod
+    def _run_worker(job_queue, result_queue):
+        while True:
+            job = job_queue.get()
+            if job is None:
+                return
+            peak_rss = 0
+            try:
+                if job.pool == 'link':
+                    (returncode, stdout, stderr,
+                     peak_rss) = run_command(job.command)
+                    output = stdout + stderr
+                else:
+                    p = subprocess.Popen(job.command, shell=True,
+                                         stdout=subprocess.PIPE,
+                                         stderr=subprocess.STDOUT)
+                    output = p.communicate()[0]
+                    returncode = p.returncode
+            except OSError, e:
+                output = '%s\n' % e
+                returncode = 1
+            result_queue.put((job, returncode, output, peak_rss))
+
+    def _prepare_outputs(self, job):
+        for output in job.outputs:
+            dir = os.path.dirname(output)
+            if dir and not os.path.isdir(dir):
+                os.makedirs(dir)
+
+    def execute(self, jobs_num, keep_going=False, verbose=False, link_jobs=0,
+                concurrency_controller=None):
+        """Run the actions which are not up to date, return the exit code.
+
+        The link actions run in a separate pool of link_jobs if it is not 0,
+        see LinkScheduler.  The other actions are at most jobs_num, and are
+        limited by the concurrency_controller if it is given.
+
+        """
+        self._load_db()
+        ready = self._build_graph()
+        total = len([job for job in self.jobs if not job.is_phony()])
+        jobs_num = max(jobs_num, 1)
+        link_scheduler = None
+        if link_jobs > 0:
+            link_scheduler = LinkScheduler(
+                    link_jobs, os.path.join(self.build_dir, LINK_MEMORY_FILE))
+        job_queue = Queue.Queue()
+        result_queue = Queue.Queue()
+        workers = []
+        for i in range(jobs_num + max(link_jobs, 0)):
+            worker = threading.Thread(target=self._run_worker,
+                                      args=(job_queue, result_queue))
+            worker.setDaemon(True)
+            worker.start()
+            workers.append(worker)
+
+        waiting_jobs = []
+        waiting_links = []
+        finished = 0
+        failed = 0
+        running_jobs = 0
+        running_links = 0
+        done_jobs = 0
+        stopped = False
+        try:
+            while True:
+                while ready:
+                    job = ready.pop()
+                    if job.is_phony() or self._is_up_to_date(job):
+                        if not job.is_phony():
+                            finished += 1
+                        done_jobs += 1
+                        self._finish(job, ready)
+                    elif link_scheduler and job.pool == 'link':
+                        waiting_links.append(job)
+                    else:
+                        waiting_jobs.append(job)
+                while (not stopped and waiting_jobs and
+                       running_jobs < jobs_num and
+                       (not concurrency_controller or
+                        concurrency_controller.try_acquire())):
+                    job = waiting_jobs.pop(0)
+                    self._prepare_outputs(job)
+                    running_jobs += 1
+                    job_queue.put(job)
+                for job in waiting_links[:]:
+                    if stopped or not link_scheduler.try_acquire(job.outputs[0]):
+                        continue
+                    waiting_links.remove(job)
+                    self._prepare_outputs(job)
+                    running_links += 1
+                    job_queue.put(job)
+                if not running_jobs and not running_links:
+                    break
+                try:
+                    if concurrency_controller and waiting_jobs:
+                        # The controller may allow more actions meanwhile
+                        result = result_queue.get(
+                                True, concurrency_controller.interval)
+                    else:
+                        result = result_queue.get()
+                except Queue.Empty:
+                    continue
+                (job, returncode, output, peak_rss) = result
+                if link_scheduler and job.pool == 'link':
+                    running_links -= 1
+                    link_scheduler.release(job.outputs[0], peak_rss)
+                else:
+                    running_jobs -= 1
+                    if concurrency_controller:
+                        concurrency_controller.release()
+                finished += 1
+                if verbose:
+                    description = job.command
+                else:
+                    description = job.description
+                sys.stdout.write('[%d/%d] %s\n%s' % (
+                                 finished, total, description, output))
+                sys.stdout.flush()
+                if returncode:
+                    failed += 1
+                    console.error('FAILED: %s' % ' '.join(job.outputs))
+                    if verbose:
+                        console.error(job.command)
+                    if not keep_going:
+                        stopped = True
+                    continue
+                self._record(job)
+                done_jobs += 1
+                self._finish(job, ready)
+        finally:
+            for worker in workers:
+                job_queue.put(None)
+            self._save_db()
+            if link_scheduler:
+                link_scheduler.close()
+            if concurrency_controller:
+                concurrency_controller.close()
+
+        if failed:
+            return 1
+        if done_jobs < len(self.jobs):
+            console.error('dependency cycle among the actions')
+            return 1
+        return 0
+
+    def _finish(self, job, ready):
+        for dependent in job.dependents:
+            dependent.pending -= 1
+            if not dependent.pending:
+                ready.append(dependent)
+
+    def clean(self):
+        """Remove the outputs of all actions. """
+        for job in self.jobs:
+            if job.is_phony():
+                continue
+            for output in job.outputs:
+                try:
+                    os.remove(output)
+                except OSError:
+                    pass
+        try:
+            os.remove(self.db_path)
+        except OSError:
+            pass
+        return 0
@@ -15,6 +15,7 @@ import console
 import configparse
 import build_rules
 from blade_util import var_to_list
+from build_action import BuildAction
 from cc_targets import CcTarget
 
 
@@ -24,6 +25,8 @@ class ProtoLibrary(CcTarget):
     This class is derived from SconsCcTarget.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -56,6 +59,9 @@ class ProtoLibrary(CcTarget):
         if len(protobuf_lib) > 0:
             self._add_hardcode_library(protobuf_lib)
 
+        # The generated headers include the headers of protobuf
+        self.data['transitive_export_incs'] = True
+
         # Link all the symbols by default
         self.data['link_all_symbols'] = True
         self.data['deprecated'] = deprecated
@@ -97,6 +103,10 @@ class ProtoLibrary(CcTarget):
         proto_name = src[:-6]
         return self._target_file_path(path, '%s_pb2.py' % proto_name)
 
+    def get_rules_input_files(self):
+        """The proto files are read to get the java package name. """
+        return [os.path.join(self.path, src) for src in self.srcs]
+
     def _get_java_package_name(self, src):
         """Get the java package name from proto file if it is specified. """
         package_name_java = 'java_package'
@@ -194,22 +204,22 @@ class ProtoLibrary(CcTarget):
         # Build java source according to its option
         env_name = self._env_name()
 
-        self.options = self.blade.get_options()
-        self.direct_targets = self.blade.get_direct_targets()
+        options = self.blade.get_options()
+        direct_targets = self.blade.get_direct_targets()
 
-        if (getattr(self.options, 'generate_java', False) or
+        if (getattr(options, 'generate_java', False) or
             self.data.get('generate_java') or
-            self.key in self.direct_targets):
+            self.key in direct_targets):
             self._proto_java_rules()
 
-        if (getattr(self.options, 'generate_php', False) and
+        if (getattr(options, 'generate_php', False) and
             (self.data.get('generate_php') or
-             self.key in self.direct_targets)):
+             self.key in direct_targets)):
             self._proto_php_rules()
 
-        if (getattr(self.options, 'generate_python', False) or
+        if (getattr(options, 'generate_python', False) or
             self.data.get('generate_python') or
-            self.key in self.direct_targets):
+            self.key in direct_targets):
             self._proto_python_rules()
 
         self._setup_cc_flags()
@@ -244,6 +254,38 @@ class ProtoLibrary(CcTarget):
             self.data.get('build_dynamic', False)):
             self._dynamic_cc_library()
 
+    def get_generated_headers(self):
+        """Returns the generated pb.h files. """
+        return [self._proto_gen_files(self.path, src)[1] for src in self.srcs]
+
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options. Only the
+        cc files are generated.
+
+        """
+        self._check_deprecated_deps()
+
+        actions = []
+        sources = []
+        for src in self.srcs:
+            (proto_src, proto_hdr) = self._proto_gen_files(self.path, src)
+            actions.append(BuildAction('proto_cc',
+                                       [proto_src, proto_hdr],
+                                       os.path.join(self.path, src)))
+            sources.append(proto_src)
+        objects = ['%s.o' % src for src in sources]
+        actions += self._cc_objects_actions(sources, objects,
+                                            self.get_generated_headers())
+
+        actions += self._cc_library_actions(objects)
+        options = self.blade.get_options()
+        if (getattr(options, 'generate_dynamic', False) or
+            self.data.get('build_dynamic', False)):
+            actions += self._dynamic_cc_library_actions(objects)
+        return actions
+
 
 def proto_library(name,
                   srcs=[],
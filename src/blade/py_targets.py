@@ -27,6 +27,8 @@ class PythonBinaryTarget(Target):
     This class is derived from SconsTarget and generates python egg package.
 
     """
+    __slots__ = ('targets',)
+
     def __init__(self,
                  name,
                  srcs,
@@ -49,6 +51,11 @@ class PythonBinaryTarget(Target):
         if prebuilt:
             self.type = 'prebuilt_py_binary'
 
+    def get_rules_input_files(self):
+        """The existence of the python package files is checked. """
+        return [os.path.join(self.path, 'setup.py'),
+                os.path.join(self.path, self.name, '__init__.py')]
+
     def scons_rules(self):
         """scons_rules.
 
@@ -0,0 +1,226 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the remote cache module which shares the cache files between
+ machines through a http server, such as the remote-cache-server shipped
+ with blade.  The files are downloaded with GET and uploaded with PUT,
+ addressed by their kind and names, that is, <url>/<kind>/<name>.
+
+"""
+
+
+import httplib
+import os
+import Queue
+import socket
+import threading
+import time
+import urlparse
+
+import console
+
+
+class RemoteCache(object):
+    """The client of the remote cache server.
+
+    At most max_connections requests are sent to the server at the same
+    time, the connections are kept alive and reused.  The files are
+    uploaded in background threads, so the building is not blocked.
+
+    The remote cache works as a circuit breaker: after failure_threshold
+    requests failed or timed out in a row, it stops sending requests to
+    the server for retry_interval seconds, so a slow or down server only
+    costs little building time.
+
+    """
+    def __init__(self, url, read_only=False, timeout=5.0, max_connections=4,
+                 failure_threshold=3, retry_interval=60):
+        (scheme, netloc, path, query, fragment) = urlparse.urlsplit(url)
+        if scheme == 'https':
+            self.connection_class = httplib.HTTPSConnection
+        else:
+            self.connection_class = httplib.HTTPConnection
+        self.netloc = netloc
+        self.path = path.rstrip('/')
+        self.read_only = read_only
+        self.timeout = timeout
+        self.max_connections = max(max_connections, 1)
+        self.failure_threshold = failure_threshold
+        self.retry_interval = retry_interval
+
+        self.semaphore = threading.Semaphore(self.max_connections)
+        self.lock = threading.Lock()
+        self.idle_connections = []
+        self.failures = 0
+        self.disabled_until = 0
+        self.upload_queue = Queue.Queue()
+        self.upload_threads = []
+        self.hit_count = 0
+        self.miss_count = 0
+        self.upload_count = 0
+
+    def _count(self, name):
+        """Increase the counter, which is updated by several threads. """
+        self.lock.acquire()
+        try:
+            setattr(self, name, getattr(self, name) + 1)
+        finally:
+            self.lock.release()
+
+    def _url_path(self, kind, name):
+        return '%s/%s/%s' % (self.path, kind, name)
+
+    def _is_available(self):
+        """Whether the circuit is closed, that is, requests could be sent. """
+        return time.time() >= self.disabled_until
+
+    def _record_result(self, ok):
+        self.lock.acquire()
+        try:
+            if ok:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self._is_available():
+                    console.warning('remote cache %s is not available, '
+                                    'disabled for %s seconds' % (
+                                    self.netloc, self.retry_interval))
+                self.disabled_until = time.time() + self.retry_interval
+        finally:
+            self.lock.release()
+
+    def _get_connection(self, reuse):
+        """Return a connection and whether it is reused from the pool. """
+        if reuse:
+            self.lock.acquire()
+            try:
+                if self.idle_connections:
+                    return self.idle_connections.pop(), True
+            finally:
+                self.lock.release()
+        # The timeout also applies to connecting, a blackholed server
+        # would block the thread for minutes otherwise
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+        connection.connect()
+        return connection, False
+
+    def _release_connection(self, connection):
+        self.lock.acquire()
+        try:
+            if len(self.idle_connections) < self.max_connections:
+                self.idle_connections.append(connection)
+                return
+        finally:
+            self.lock.release()
+        connection.close()
+
+    def _send(self, method, path, body, reuse):
+        connection = None
+        try:
+            connection, reused = self._get_connection(reuse)
+            headers = {}
+            if body is not None:
+                headers['Content-Length'] = str(len(body))
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (socket.error, httplib.HTTPException):
+            if connection:
+                connection.close()
+                if reused:
+                    # The idle connection may be closed by the server
+                    return self._send(method, path, body, False)
+            return None
+        if response.will_close:
+            connection.close()
+        else:
+            self._release_connection(connection)
+        return response.status, data
+
+    def _request(self, method, path, body=None):
+        """Send the request, return (status, data), or None on failure. """
+        if not self._is_available():
+            return None
+        self.semaphore.acquire()
+        try:
+            result = self._send(method, path, body, True)
+        finally:
+            self.semaphore.release()
+        self._record_result(result is not None and result[0] < 500)
+        return result
+
+    def get(self, kind, name, path):
+        """Download the file into path, return True on hit. """
+        result = self._request('GET', self._url_path(kind, name))
+        if not result or result[0] != 200:
+            self._count('miss_count')
+            return False
+        temp = '%s.tmp%d.%d' % (path, os.getpid(), id(threading.currentThread()))
+        try:
+            dir = os.path.dirname(path)
+            if not os.path.isdir(dir):
+                os.makedirs(dir)
+            f = open(temp, 'wb')
+            try:
+                f.write(result[1])
+            finally:
+                f.close()
+            os.rename(temp, path)
+        except (IOError, OSError):
+            return False
+        self._count('hit_count')
+        return True
+
+    def put(self, kind, name, path):
+        """Upload the file in background if the cache is writable. """
+        if self.read_only or not self._is_available():
+            return
+        self.upload_queue.put((kind, name, path))
+        self.lock.acquire()
+        try:
+            # Leave some connections for downloading
+            if len(self.upload_threads) < max(self.max_connections / 2, 1):
+                thread = threading.Thread(target=self._upload)
+                thread.setDaemon(True)
+                thread.start()
+                self.upload_threads.append(thread)
+        finally:
+            self.lock.release()
+
+    def _upload(self):
+        while True:
+            item = self.upload_queue.get()
+            if item is None:
+                return
+            (kind, name, path) = item
+            try:
+                f = open(path, 'rb')
+                try:
+                    body = f.read()
+                finally:
+                    f.close()
+            except IOError:
+                # Evicted from the local cache
+                continue
+            result = self._request('PUT', self._url_path(kind, name), body)
+            if result and result[0] < 300:
+                self._count('upload_count')
+
+    def close(self):
+        """Wait for the uploading to finish, but not longer than timeout. """
+        for thread in self.upload_threads:
+            self.upload_queue.put(None)
+        deadline = time.time() + self.timeout
+        for thread in self.upload_threads:
+            thread.join(max(deadline - time.time(), 0))
+        for connection in self.idle_connections:
+            connection.close()
+        self.idle_connections = []
+        if self.hit_count or self.upload_count:
+            console.info('remote cache: %d hits, %d misses, %d uploads' % (
+                         self.hit_count, self.miss_count, self.upload_count))
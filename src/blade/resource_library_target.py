@@ -14,6 +14,7 @@ import blade
 import build_rules
 import java_jar_target
 import py_targets
+from build_action import BuildAction
 from cc_targets import CcTarget
 
 
@@ -24,6 +25,8 @@ class ResourceLibrary(CcTarget):
     to generate resource library rules.
 
     """
+    __slots__ = ()
+
     def __init__(self,
                  name,
                  srcs,
@@ -83,6 +86,45 @@ class ResourceLibrary(CcTarget):
             self.data.get('build_dynamic')):
             self._dynamic_cc_library()
 
+    def get_generated_headers(self):
+        """Returns the generated resource header. """
+        res_name = self._regular_variable_name(self.name)
+        return [os.path.join(self.build_path, self.path, res_name + '.h')]
+
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options.
+
+        """
+        self._check_deprecated_deps()
+
+        out_dir = os.path.join(self.build_path, self.path)
+        src_list = [os.path.join(self.path, src) for src in self.srcs]
+        actions = [BuildAction('resource_header',
+                               self.get_generated_headers(),
+                               src_list)]
+
+        sources = []
+        objects = []
+        for src_path in src_list:
+            src_base = os.path.basename(src_path)
+            src_base_name = '%s.c' % self._regular_variable_name(src_base)
+            new_src_path = os.path.join(out_dir, src_base_name)
+            actions.append(BuildAction('resource_file', new_src_path, src_path))
+            sources.append(new_src_path)
+            objects.append(os.path.join(
+                    out_dir, '%s.objs' % self.name,
+                    '%s.o' % self._regular_variable_name(src_base_name)))
+        actions += self._cc_objects_actions(sources, objects)
+
+        actions += self._cc_library_actions(objects)
+        options = self.blade.get_options()
+        if (getattr(options, 'generate_dynamic', False) or
+            self.data.get('build_dynamic')):
+            actions += self._dynamic_cc_library_actions(objects)
+        return actions
+
     def _resource_library_rules_objects(self):
         """Generate resource library object rules.  """
         env_name = self._env_name()
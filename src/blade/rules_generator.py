@@ -11,20 +11,68 @@
 """
  This is the scons rules genearator module which invokes all
  the builder objects or scons objects to generate scons rules.
+ It can also generate build.ninja from the build actions of the
+ targets for the ninja backend.
 
 """
 
 
 import os
+import re
 import socket
 import subprocess
 import string
-import time
+import sys
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 import configparse
 import console
 
 from blade_platform import CcFlagsManager
+from blade_util import BUILD_TIME_PLACEHOLDER
+from blade_util import BUILD_TIME_SIZE
+from blade_util import get_blade_stamp
+from blade_util import get_program_stamp
+from blade_util import md5sum_file
+from blade_util import md5sum_str
+from build_action import ALWAYS_BUILD
+from build_action import BuildAction
+from build_action import target_alias
+from concurrency_controller import CONCURRENCY_LOG_FILE
+from fast_link import FAST_LINK_HISTORY_FILE
+from link_scheduler import LINK_MEMORY_FILE
+from native_executor import NativeExecutor
+
+
+# The options which don't affect the generated rules
+_OPTIONS_NOT_AFFECT_RULES = frozenset([
+        'adaptive_jobs',
+        'build_cache',
+        'depended',
+        'deps',
+        'distcc_jobs',
+        'fulltest',
+        'jobs',
+        'keep_going',
+        'link_jobs',
+        'load_jobs',
+        'output_to_dot',
+        'report_incs',
+        'runargs',
+        'scons_only',
+        'show_details',
+        'test_jobs',
+        'testargs'])
+
+
+# The environment variables read when generating the rules
+_ENV_VARS_AFFECT_RULES = [
+        'TOOLCHAIN_DIR', 'CPP', 'CC', 'CXX', 'LD',
+        'DISTCC_HOSTS', 'MASTER_HOSTS', 'DISTLD_HOSTS']
 
 
 def _incs_list_to_string(incs):
@@ -34,6 +82,27 @@ def _incs_list_to_string(incs):
     return ' '.join(['-I ' + path for path in incs])
 
 
+def _get_toolchain():
+    """Return the (cpp, cc, cxx, ld) commands specified by environment. """
+    toolchain_dir = os.environ.get('TOOLCHAIN_DIR', '')
+    if toolchain_dir and not toolchain_dir.endswith('/'):
+        toolchain_dir += '/'
+    cpp_str = toolchain_dir + os.environ.get('CPP', 'cpp')
+    cc_str = toolchain_dir + os.environ.get('CC', 'gcc')
+    cxx_str = toolchain_dir + os.environ.get('CXX', 'g++')
+    ld_str = toolchain_dir + os.environ.get('LD', 'g++')
+    return cpp_str, cc_str, cxx_str, ld_str
+
+
+def _link_blade_bin(build_dir):
+    """Make the blade-bin symbolic link to the build dir. """
+    try:
+        os.remove('blade-bin')
+    except os.error:
+        pass
+    os.symlink(os.path.abspath(build_dir), 'blade-bin')
+
+
 class SconsFileHeaderGenerator(object):
     """SconsFileHeaderGenerator class"""
     def __init__(self, options, build_dir, gcc_version,
@@ -45,7 +114,7 @@ class SconsFileHeaderGenerator(object):
         self.gcc_version = gcc_version
         self.python_inc = python_inc
         self.build_environment = build_environment
-        self.ccflags_manager = CcFlagsManager(options)
+        self.ccflags_manager = CcFlagsManager(options, build_dir, gcc_version)
         self.env_list = ['env_with_error', 'env_no_warning']
 
         self.svn_roots = svn_roots
@@ -56,6 +125,7 @@ env_version = Environment(ENV = os.environ)
 env_version.Append(SHCXXCOMSTR = '%s$updateinfo%s' % (colors('cyan'), colors('end')))
 env_version.Append(CPPFLAGS = '-m$m')
 version_obj = env_version.SharedObject('$filename')
+stamp_build_time_action = MakeAction(stamp_build_time, None)
 """)
         self.blade_config = configparse.blade_config
         self.distcc_enabled = self.blade_config.get_config(
@@ -103,19 +173,16 @@ version_obj = env_version.SharedObject('$filename')
             else:
                 self.svn_info_map[root_dir] = std_out.replace('\n', '\\n\\\n')
 
-    def generate_version_file(self):
-        """Generate version information files. """
+    def write_version_file(self):
+        """Write the version information source file. """
         self._get_version_info()
         svn_info_len = len(self.svn_info_map)
 
-        if not os.path.exists(self.build_dir):
-            os.mkdir(self.build_dir)
-        version_cpp = open('%s/version.cpp' % self.build_dir, 'w')
-
-        print >>version_cpp, '/* This file was generated by blade */'
-        print >>version_cpp, 'extern "C" {'
-        print >>version_cpp, 'namespace binary_version {'
-        print >>version_cpp, 'extern const int kSvnInfoCount = %d;' % svn_info_len
+        lines = []
+        lines.append('/* This file was generated by blade */')
+        lines.append('extern "C" {')
+        lines.append('namespace binary_version {')
+        lines.append('extern const int kSvnInfoCount = %d;' % svn_info_len)
 
         svn_info_array = '{'
         for idx in range(svn_info_len):
@@ -126,19 +193,40 @@ version_obj = env_version.SharedObject('$filename')
                 svn_info_array += ','
         svn_info_array += '}'
 
-        print >>version_cpp, 'extern const char* const kSvnInfo[%d] = %s;' % (
-                svn_info_len, svn_info_array)
-        print >>version_cpp, 'extern const char kBuildType[] = "%s";' % self.options.profile
-        print >>version_cpp, 'extern const char kBuildTime[] = "%s";' % time.asctime()
-        print >>version_cpp, 'extern const char kBuilderName[] = "%s";' % os.getenv('USER')
-        print >>version_cpp, (
-                'extern const char kHostName[] = "%s";' % socket.gethostname())
+        lines.append('extern const char* const kSvnInfo[%d] = %s;' % (
+                svn_info_len, svn_info_array))
+        lines.append('extern const char kBuildType[] = "%s";' % self.options.profile)
+        # The build time is stamped into each binary after linking, so the
+        # content of this file is stable and the binaries needn't be relinked
+        lines.append('extern const char kBuildTime[%d] = "%s";' % (
+                BUILD_TIME_SIZE, BUILD_TIME_PLACEHOLDER))
+        lines.append('extern const char kBuilderName[] = "%s";' % os.getenv('USER'))
+        lines.append('extern const char kHostName[] = "%s";' % socket.gethostname())
         compiler = 'GCC %s' % self.gcc_version
-        print >>version_cpp, 'extern const char kCompiler[] = "%s";' % compiler
-        print >>version_cpp, '}}'
+        lines.append('extern const char kCompiler[] = "%s";' % compiler)
+        lines.append('}}')
+        content = '\n'.join(lines) + '\n'
 
-        version_cpp.close()
+        # Only write the file when it is changed to avoid recompiling it
+        if not os.path.exists(self.build_dir):
+            os.mkdir(self.build_dir)
+        version_cpp_path = '%s/version.cpp' % self.build_dir
+        if os.path.exists(version_cpp_path):
+            version_cpp = open(version_cpp_path)
+            try:
+                if version_cpp.read() == content:
+                    return
+            finally:
+                version_cpp.close()
+        version_cpp = open(version_cpp_path, 'w')
+        try:
+            version_cpp.write(content)
+        finally:
+            version_cpp.close()
 
+    def generate_version_file(self):
+        """Generate version information files. """
+        self.write_version_file()
         self._add_rule('VariantDir("%s", ".", duplicate=0)' % self.build_dir)
         self._add_rule(self.version_cpp_compile_template.substitute(
             updateinfo='Updating version information',
@@ -165,15 +253,25 @@ import blade_util
 import console
 import scons_helper
 
+from action_cache import ActionCache
 from build_environment import ScacheManager
 from console import colors
+from remote_cache import RemoteCache
 from scons_helper import MakeAction
+from scons_helper import MakeCachedAction
 from scons_helper import create_fast_link_builders
 from scons_helper import echospawn
 from scons_helper import error_colorize
 from scons_helper import generate_python_binary
 from scons_helper import generate_resource_file
 from scons_helper import generate_resource_header
+from scons_helper import intern_env
+from scons_helper import setup_action_cache
+from scons_helper import setup_concurrency_controller
+from scons_helper import setup_link_scheduler
+from scons_helper import setup_scache_manager
+from scons_helper import setup_split_dwarf
+from scons_helper import stamp_build_time
 """)
 
         if getattr(self.options, 'verbose', False):
@@ -237,9 +335,6 @@ link_program_message = '%sLinking Program %s$TARGET%s%s' % \
 link_library_message = '%sCreating Static Library %s$TARGET%s%s' % \
     (colors('green'), colors('purple'), colors('green'), colors('end'))
 
-ranlib_library_message = '%sRanlib Library %s$TARGET%s%s' % \
-    (colors('green'), colors('purple'), colors('green'), colors('end')) \
-
 link_shared_library_message = '%sLinking Shared Library %s$TARGET%s%s' % \
     (colors('green'), colors('purple'), colors('green'), colors('end'))
 
@@ -249,6 +344,12 @@ compile_java_jar_message = '%sGenerating java jar %s$TARGET%s%s' % \
 compile_python_binary_message = '%sGenerating python binary %s$TARGET%s%s' % \
     (colors('cyan'), colors('purple'), colors('cyan'), colors('end'))
 
+compile_pch_message = '%sPrecompiling %s$SOURCE%s%s' % \
+    (colors('cyan'), colors('purple'), colors('cyan'), colors('end'))
+
+package_dwp_message = '%sPackaging debug information %s$TARGET%s%s' % \
+    (colors('cyan'), colors('purple'), colors('cyan'), colors('end'))
+
 compile_yacc_message = '%sYacc %s$SOURCE%s to $TARGET%s' % \
     (colors('cyan'), colors('purple'), colors('cyan'), colors('end'))
 
@@ -272,7 +373,6 @@ top_env.Append(
     SHCCCOMSTR = compile_source_message,
     SHCXXCOMSTR = compile_source_message,
     ARCOMSTR = link_library_message,
-    RANLIBCOMSTR = ranlib_library_message,
     SHLINKCOMSTR = link_shared_library_message,
     LINKCOMSTR = link_program_message,
     JAVACCOMSTR = compile_source_message
@@ -285,7 +385,9 @@ top_env.Append(
         if link_config['link_on_tmp']:
             if (not enable_dccc) or (
                     enable_dccc and not self.build_environment.dccc_env_prepared):
-                self._add_rule('create_fast_link_builders(top_env)')
+                self._add_rule('create_fast_link_builders(top_env, "%s")' %
+                               os.path.join(self.build_dir,
+                                            FAST_LINK_HISTORY_FILE))
 
     def generate_builders(self):
         """Generates common builders. """
@@ -301,14 +403,17 @@ top_env.Append(
         protoc_php_plugin = proto_config['protoc_php_plugin']
         # Genreates common builders now
         builder_list = []
-        self._add_rule('time_value = Value("%s")' % time.asctime())
+        # Evaluated when scons runs, to keep the generated rules stable
+        self._add_rule('time_value = Value(time.asctime())')
         self._add_rule(
-            'proto_bld = Builder(action = MakeAction("%s --proto_path=. -I. %s'
+            'proto_bld = Builder(action = MakeCachedAction("%s --proto_path=. -I. %s'
             ' -I=`dirname $SOURCE` --cpp_out=%s $SOURCE", '
             'compile_proto_cc_message))' % (
                     protoc_bin, protobuf_incs_str, self.build_dir))
         builder_list.append('BUILDERS = {"Proto" : proto_bld}')
 
+        # The java and python code generators write more files than the
+        # declared outputs, so they are not put into the action cache
         self._add_rule(
             'proto_java_bld = Builder(action = MakeAction("%s --proto_path=. '
             '--proto_path=%s --java_out=%s/`dirname $SOURCE` $SOURCE", '
@@ -317,7 +422,7 @@ top_env.Append(
         builder_list.append('BUILDERS = {"ProtoJava" : proto_java_bld}')
 
         self._add_rule(
-            'proto_php_bld = Builder(action = MakeAction("%s '
+            'proto_php_bld = Builder(action = MakeCachedAction("%s '
             '--proto_path=. --plugin=protoc-gen-php=%s '
             '-I. %s -I%s -I=`dirname $SOURCE` '
             '--php_out=%s/`dirname $SOURCE` '
@@ -327,7 +432,7 @@ top_env.Append(
         builder_list.append('BUILDERS = {"ProtoPhp" : proto_php_bld}')
 
         self._add_rule(
-            'proto_python_bld = Builder(action = MakeAction("%s '
+            'proto_python_bld = Builder(action = MakeCachedAction("%s '
             '--proto_path=. '
             '-I. %s -I=`dirname $SOURCE` '
             '--python_out=%s '
@@ -345,7 +450,7 @@ top_env.Append(
 
         # Genreates common builders now
         self._add_rule(
-            'thrift_bld = Builder(action = MakeAction("%s '
+            'thrift_bld = Builder(action = MakeCachedAction("%s '
             '--gen cpp:include_prefix -I . %s -I `dirname $SOURCE` -out %s/`dirname $SOURCE` '
             '$SOURCE", compile_thrift_cc_message))' % (
                     thrift_bin, thrift_incs_str, self.build_dir))
@@ -370,36 +475,106 @@ top_env.Append(
 blade_jar_bld = Builder(action = MakeAction('jar cf $TARGET -C `dirname $SOURCE` .',
     compile_java_jar_message))
 
-yacc_bld = Builder(action = MakeAction('bison $YACCFLAGS -d -o $TARGET $SOURCE',
+yacc_bld = Builder(action = MakeCachedAction('bison $YACCFLAGS -d -o $TARGET $SOURCE',
     compile_yacc_message))
 
-resource_header_bld = Builder(action = MakeAction(generate_resource_header,
+resource_header_bld = Builder(action = MakeCachedAction(generate_resource_header,
     compile_resource_header_message))
 
-resource_file_bld = Builder(action = MakeAction(generate_resource_file,
+resource_file_bld = Builder(action = MakeCachedAction(generate_resource_file,
     compile_resource_message))
 
-python_binary_bld = Builder(action = MakeAction(generate_python_binary,
+python_binary_bld = Builder(action = MakeCachedAction(generate_python_binary,
     compile_python_binary_message))
+
+pch_bld = Builder(action = MakeAction(
+    '$SHCXX -x c++-header -o $TARGET -c $SHCXXFLAGS $SHCCFLAGS $_CCCOMCOM $SOURCE',
+    compile_pch_message))
+
+dwp_bld = Builder(action = MakeAction('dwp -e $SOURCE -o $TARGET',
+    package_dwp_message))
 """)
         builder_list.append('BUILDERS = {"BladeJar" : blade_jar_bld}')
         builder_list.append('BUILDERS = {"Yacc" : yacc_bld}')
         builder_list.append('BUILDERS = {"ResourceHeader" : resource_header_bld}')
         builder_list.append('BUILDERS = {"ResourceFile" : resource_file_bld}')
         builder_list.append('BUILDERS = {"PythonBinary" : python_binary_bld}')
+        builder_list.append('BUILDERS = {"PrecompiledHeader" : pch_bld}')
+        builder_list.append('BUILDERS = {"Dwp" : dwp_bld}')
 
         for builder in builder_list:
             self._add_rule('top_env.Append(%s)' % builder)
 
-    def generate_compliation_flags(self):
-        """Generates compliation flags. """
-        toolchain_dir = os.environ.get('TOOLCHAIN_DIR', '')
-        if toolchain_dir and not toolchain_dir.endswith('/'):
-            toolchain_dir += '/'
-        cpp_str = toolchain_dir + os.environ.get('CPP', 'cpp')
-        cc_str = toolchain_dir + os.environ.get('CC', 'gcc')
-        cxx_str = toolchain_dir + os.environ.get('CXX', 'g++')
-        ld_str = toolchain_dir + os.environ.get('LD', 'g++')
+        if getattr(self.options, 'split_debug', False):
+            self._add_rule('setup_split_dwarf(top_env)')
+
+    def _build_with_distcc(self):
+        """Whether to compile with distcc. """
+        return self.distcc_enabled and self.build_environment.distcc_env_prepared
+
+    def _build_with_ccache(self):
+        """Whether to compile with ccache.
+
+        The old ccache doesn't know the .dwo files written with
+        -gsplit-dwarf, the objects it retrieves would miss them.
+
+        """
+        build_environment = self.build_environment
+        if not build_environment.ccache_installed:
+            return False
+        if (getattr(self.options, 'split_debug', False) and
+            not build_environment.ccache_supports_split_dwarf):
+            console.warning('ccache is disabled because it is too old to '
+                            'support --split-debug, 3.2 is required')
+            return False
+        return True
+
+    def _get_pch_preprocess_flags(self):
+        """Return the flags to keep the pch in the preprocessed sources.
+
+        ccache preprocesses the sources to look up the cache, the .gch file
+        is still used to compile them with -fpch-preprocess.  distcc
+        compiles the preprocessed sources on the hosts which don't have the
+        .gch files, so the headers are expanded into the sources instead.
+
+        """
+        if self._build_with_ccache() and not self._build_with_distcc():
+            return ['-fpch-preprocess']
+        return []
+
+    def _get_arflags(self, thin_archive=False):
+        """Return the flags of ar to create the static libraries.
+
+        The index is created by ar itself instead of a separate ranlib,
+        and the timestamps and uids are zeroed if ar supports it, so the
+        libraries are the same if the objects are not changed.  The flags
+        of the thin archives are the same as the others if ar can't make
+        them.
+
+        """
+        ar_modifiers = self.build_environment.ar_modifiers
+        arflags = 'rcs'
+        if thin_archive:
+            if 'T' in ar_modifiers:
+                arflags += 'T'
+            elif self._thin_archive_enabled():
+                console.warning('thin archive is disabled because ar '
+                                'does not support it')
+        if 'D' in ar_modifiers:
+            arflags += 'D'
+        return arflags
+
+    def _thin_archive_enabled(self):
+        """Whether the libraries are thin archives unless they opt out. """
+        thin_archive = getattr(self.options, 'thin_archive', None)
+        if thin_archive is None:
+            cc_config = configparse.blade_config.get_config('cc_config')
+            thin_archive = cc_config['thin_archive']
+        return thin_archive
+
+    def _get_build_tools(self):
+        """Return the (cpp, cc, cxx, ld) commands to build with. """
+        cpp_str, cc_str, cxx_str, ld_str = _get_toolchain()
         console.info('CPP=%s' % cpp_str)
         console.info('CC=%s' % cc_str)
         console.info('CXX=%s' % cxx_str)
@@ -409,8 +584,7 @@ python_binary_bld = Builder(action = MakeAction(generate_python_binary,
 
         # To modify CC, CXX, LD according to the building environment and
         # project configuration
-        build_with_distcc = (self.distcc_enabled and
-                             self.build_environment.distcc_env_prepared)
+        build_with_distcc = self._build_with_distcc()
         cc_str = self._append_prefix_to_building_var(
                          prefix='distcc',
                          building_var=cc_str,
@@ -421,7 +595,7 @@ python_binary_bld = Builder(action = MakeAction(generate_python_binary,
                          building_var=cxx_str,
                          condition=build_with_distcc)
 
-        build_with_ccache = self.build_environment.ccache_installed
+        build_with_ccache = self._build_with_ccache()
         cc_str = self._append_prefix_to_building_var(
                          prefix='ccache',
                          building_var=cc_str,
@@ -439,6 +613,13 @@ python_binary_bld = Builder(action = MakeAction(generate_python_binary,
                         building_var=ld_str,
                         condition=build_with_dccc)
 
+        return cpp_str, cc_str, cxx_str, ld_str
+
+    def generate_compliation_flags(self):
+        """Generates compliation flags. """
+        cpp_str, cc_str, cxx_str, ld_str = self._get_build_tools()
+        build_with_distcc = self._build_with_distcc()
+
         cc_env_str = 'CC="%s", CXX="%s"' % (cc_str, cxx_str)
         ld_env_str = 'LINK="%s"' % ld_str
 
@@ -459,8 +640,19 @@ python_binary_bld = Builder(action = MakeAction(generate_python_binary,
                         extra_incs_str, self.build_dir, self.python_inc,
                         cc_config['cppflags'] + cppflags_except_warning,
                         cc_config['cflags'],
-                        cc_config['cxxflags'],
+                        cc_config['cxxflags'] + self._get_pch_preprocess_flags(),
                         ld_env_str, linkflags))
+        self._add_rule('top_env.Replace(ARFLAGS="%s", THIN_ARFLAGS="%s", '
+                       'RANLIBCOM="", RANLIBCOMSTR="")' % (
+                       self._get_arflags(), self._get_arflags(True)))
+        self._add_rule('setup_link_scheduler("%s", "%s")' % (
+                       os.path.join(self.build_dir, LINK_MEMORY_FILE), ld_str))
+        distcc_hosts = ''
+        if build_with_distcc:
+            distcc_hosts = self.build_environment.distcc_host_list
+        self._add_rule('setup_concurrency_controller("%s", "%s")' % (
+                       os.path.join(self.build_dir, CONCURRENCY_LOG_FILE),
+                       distcc_hosts))
 
         self._setup_cache()
 
@@ -482,28 +674,56 @@ python_binary_bld = Builder(action = MakeAction(generate_python_binary,
             warnings, c_warnings, cxx_warnings))
 
     def _setup_cache(self):
-        if self.build_environment.ccache_installed:
-            self.build_environment.setup_ccache_env()
+        cache_dir = os.path.expanduser('~/.bladescache')
+        cache_size = 4 * 1024 * 1024 * 1024
+        if hasattr(self.options, 'cache_dir'):
+            cache_dir = self.options.cache_dir
         else:
-            cache_dir = os.path.expanduser('~/.bladescache')
-            cache_size = 4 * 1024 * 1024 * 1024
-            if hasattr(self.options, 'cache_dir'):
-                if not self.options.cache_dir:
-                    return
-                cache_dir = self.options.cache_dir
-            else:
-                console.info('using default cache dir: %s' % cache_dir)
+            console.info('using default cache dir: %s' % cache_dir)
 
-            if hasattr(self.options, 'cache_size') and (self.options.cache_size != -1):
-                cache_size = self.options.cache_size
+        if hasattr(self.options, 'cache_size') and (self.options.cache_size != -1):
+            cache_size = self.options.cache_size
 
+        scons_cache = False
+        if self._build_with_ccache():
+            self.build_environment.setup_ccache_env()
+        elif cache_dir:
             self._add_rule('CacheDir("%s")' % cache_dir)
-            self._add_rule('scache_manager = ScacheManager("%s", cache_limit=%d)' % (
-                        cache_dir, cache_size))
-            self._add_rule('Progress(scache_manager, interval=100)')
-
-            self._add_rule('console.info("using cache directory %s")' % cache_dir)
-            self._add_rule('console.info("scache size %d")' % cache_size)
+            scons_cache = True
+
+        remote_cache_config = configparse.blade_config.get_config(
+                'remote_cache_config')
+        if not cache_dir:
+            if remote_cache_config['url']:
+                console.warning('remote cache is disabled because '
+                                'the cache dir is not set')
+            return
+
+        self._add_rule('scache_manager = ScacheManager("%s", cache_limit=%d)' % (
+                    cache_dir, cache_size))
+        self._setup_remote_cache(remote_cache_config)
+        self._add_rule('setup_scache_manager(scache_manager, %s, remote_cache)' %
+                       scons_cache)
+        if not scons_cache:
+            # The generated files are cached by scons if it manages the cache
+            self._add_rule('setup_action_cache(ActionCache("%s", scache_manager, '
+                           'remote_cache))' % cache_dir)
+
+        self._add_rule('console.info("using cache directory %s")' % cache_dir)
+        self._add_rule('console.info("scache size %d")' % cache_size)
+
+    def _setup_remote_cache(self, config):
+        """Generates the remote cache client, or None if it is not set. """
+        if not config['url']:
+            self._add_rule('remote_cache = None')
+            return
+        self._add_rule(
+            'remote_cache = RemoteCache("%s", read_only=%s, timeout=%s, '
+            'max_connections=%d, failure_threshold=%d, retry_interval=%s)' % (
+                    config['url'], config['mode'] == 'readonly',
+                    config['timeout'], config['max_connections'],
+                    config['failure_threshold'], config['retry_interval']))
+        self._add_rule('console.info("using remote cache %s")' % config['url'])
 
     def generate(self, blade_path):
         """Generates all rules. """
@@ -516,8 +736,85 @@ python_binary_bld = Builder(action = MakeAction(generate_python_binary,
         return self.rules_buf
 
 
+def _group_targets_into_fragments(keys, build_targets):
+    """Group the targets into SConscript fragments by their directories.
+
+    The directories depending on each other are merged into one fragment,
+    the fragments are returned as lists of target keys, sorted so that
+    the deps of each fragment always go before it.  The order of targets
+    in each fragment is the same as in keys.
+
+    """
+    dirs = []
+    dir_deps = {}
+    for key in keys:
+        if key[0] not in dir_deps:
+            dirs.append(key[0])
+            dir_deps[key[0]] = []
+    for key in keys:
+        deps = dir_deps[key[0]]
+        for dkey in build_targets[key].expanded_deps:
+            if (dkey[0] != key[0] and dkey[0] in dir_deps and
+                dkey[0] not in deps):
+                deps.append(dkey[0])
+
+    # Tarjan's strongly connected components algorithm, the components are
+    # found in the reverse topological order, that is, deps first
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    component_of_dir = {}
+    component_count = 0
+    for root in dirs:
+        if root in index:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index[node] = lowlink[node] = len(index)
+                stack.append(node)
+                on_stack.add(node)
+            deps = dir_deps[node]
+            while i < len(deps):
+                dep = deps[i]
+                i += 1
+                if dep not in index:
+                    work.append((node, i))
+                    work.append((dep, 0))
+                    break
+                elif dep in on_stack:
+                    lowlink[node] = min(lowlink[node], index[dep])
+            else:
+                if lowlink[node] == index[node]:
+                    while True:
+                        member = stack.pop()
+                        on_stack.remove(member)
+                        component_of_dir[member] = component_count
+                        if member == node:
+                            break
+                    component_count += 1
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+
+    fragments = [[] for i in range(component_count)]
+    for key in keys:
+        fragments[component_of_dir[key[0]]].append(key)
+    return fragments
+
+
 class SconsRulesGenerator(object):
-    """The main class to generate scons rules and outputs rules to SConstruct. """
+    """The main class to generate scons rules and outputs rules to SConstruct.
+
+    The rules of targets are written into one SConscript fragment for each
+    source directory under the build dir, and the SConstruct only contains
+    the common header and includes the fragments.  With the build cache
+    enabled, only the fragments whose targets or transitive inputs are
+    changed are regenerated, others are reused as they are.
+
+    """
     def __init__(self, scons_path, blade_path, blade):
         """Init method. """
         self.scons_path = scons_path
@@ -530,6 +827,7 @@ class SconsRulesGenerator(object):
         gcc_version = self.scons_platform.get_gcc_version()
         python_inc = self.scons_platform.get_python_include()
 
+        self.build_dir = build_dir
         self.scons_file_header_generator = SconsFileHeaderGenerator(
                 options,
                 build_dir,
@@ -537,19 +835,600 @@ class SconsRulesGenerator(object):
                 python_inc,
                 self.blade.build_environment,
                 self.blade.svn_root_dirs)
+        # The generated header is saved here to be reused if nothing is
+        # changed in the next building
+        self.saved_scons_path = os.path.join(build_dir, '.blade.sconstruct')
+        # The digests of the fragments and the states of their targets after
+        # generating the rules, see _generate_fragments
+        self.fragments_index_path = os.path.join(build_dir,
+                                                 '.blade.sconscripts')
+        self.target_fingerprints = {}
+        _link_blade_bin(build_dir)
+
+    def _fingerprint(self):
+        """Calculate the fingerprint of all things the header depends on.
+
+        They are the configs, the command line options, the toolchain and
+        blade itself, which also affect the rules of all targets.
+
+        """
+        blade = self.blade
+        build_environment = blade.build_environment
+        items = [get_blade_stamp(),
+                 self.blade_path,
+                 blade.get_root_dir(),
+                 console.color_enabled,
+                 self.scons_platform.get_gcc_version(),
+                 self.scons_platform.get_python_include(),
+                 build_environment.ccache_installed,
+                 build_environment.distcc_env_prepared,
+                 build_environment.dccc_env_prepared]
+        for config_file in configparse.blade_config.parsed_files:
+            items.append((config_file, md5sum_file(config_file)))
+        options = vars(blade.get_options())
+        for name in sorted(options.keys()):
+            if name not in _OPTIONS_NOT_AFFECT_RULES:
+                items.append((name, options[name]))
+        for name in _ENV_VARS_AFFECT_RULES:
+            items.append((name, os.environ.get(name)))
+        for program in _get_toolchain():
+            items.append(get_program_stamp(program.split()[0]))
+        return md5sum_str('\n'.join([repr(item) for item in items]))
+
+    def _target_fingerprint(self, key):
+        """Calculate the fingerprint of the target with its input files.
+
+        Returns None if the rules of the target can't be reused.
+
+        """
+        if key in self.target_fingerprints:
+            return self.target_fingerprints[key]
+        target = self.blade.get_build_targets()[key]
+        fingerprint = None
+        input_files = target.get_rules_input_files()
+        if input_files is not None:
+            items = [(key, target.type, target.srcs, target.deps,
+                      target.expanded_deps, sorted(target.data.items()))]
+            for input_file in [os.path.join(target.path, 'BUILD')] + input_files:
+                if os.path.isfile(input_file):
+                    items.append((input_file, md5sum_file(input_file)))
+                else:
+                    items.append((input_file, None))
+            fingerprint = md5sum_str('\n'.join([repr(item) for item in items]))
+        self.target_fingerprints[key] = fingerprint
+        return fingerprint
+
+    def _fragment_digest(self, fingerprint, keys):
+        """Calculate the digest of all things the fragment depends on.
+
+        They are the targets in the fragment, their transitive deps, the
+        types of their dependers and the common fingerprint.  Returns None
+        if the fragment can't be reused.
+
+        """
+        blade = self.blade
+        build_targets = blade.get_build_targets()
+        related_keys = set(keys)
+        depender_keys = set()
+        for key in keys:
+            related_keys.update(build_targets[key].expanded_deps)
+            depender_keys.update(blade.get_all_dependers(key))
+        items = [fingerprint]
+        for key in sorted(related_keys):
+            target_fingerprint = self._target_fingerprint(key)
+            if target_fingerprint is None:
+                return None
+            items.append(target_fingerprint)
+        for key in sorted(depender_keys):
+            items.append((key, build_targets[key].type))
+        return md5sum_str('\n'.join([repr(item) for item in items]))
+
+    def _fragment_path(self, keys):
+        """Return the path of the SConscript fragment of the targets. """
+        return os.path.normpath(os.path.join(self.build_dir,
+                                             min([key[0] for key in keys]),
+                                             'SConscript'))
+
+    def _load_fragments_index(self):
+        """Return the saved index of fragments or an empty one. """
         try:
-            os.remove('blade-bin')
-        except os.error:
-            pass
-        os.symlink(os.path.abspath(build_dir), 'blade-bin')
+            f = open(self.fragments_index_path, 'rb')
+        except IOError:
+            return {}
+        try:
+            try:
+                return pickle.load(f)
+            except Exception:
+                console.warning('error loading %s, ignored' %
+                                self.fragments_index_path)
+                return {}
+        finally:
+            f.close()
+
+    def _save_fragments_index(self, fragments_index):
+        """Save the index of fragments. """
+        temp_path = '%s.tmp' % self.fragments_index_path
+        f = open(temp_path, 'wb')
+        try:
+            pickle.dump(fragments_index, f, 2)
+        finally:
+            f.close()
+        os.rename(temp_path, self.fragments_index_path)
+
+    def _write_fragment(self, fragment_path, rules_buf):
+        """Write the fragment unless it is not changed. """
+        try:
+            f = open(fragment_path)
+            try:
+                if f.readlines() == rules_buf:
+                    return
+            finally:
+                f.close()
+        except IOError:
+            fragment_dir = os.path.dirname(fragment_path)
+            if not os.path.isdir(fragment_dir):
+                os.makedirs(fragment_dir)
+        f = open(fragment_path, 'w')
+        try:
+            f.writelines(rules_buf)
+        finally:
+            f.close()
+
+    def _generate_fragments(self, fingerprint):
+        """Generate the SConscript fragments and return their paths.
+
+        A fragment is reused if its digest is the same as the saved one,
+        the states of its targets after generating the rules are restored
+        from the index as well, because they are used by other targets
+        and the blade commands after building, such as run and test.
+
+        """
+        blade = self.blade
+        target_database = blade.get_target_database()
+        fragments = _group_targets_into_fragments(blade.get_rules_targets_keys(),
+                                                  blade.get_build_targets())
+        saved_fragments_index = {}
+        if fingerprint:
+            saved_fragments_index = self._load_fragments_index()
+        fragments_index = {}
+        fragment_paths = []
+        regenerated_count = 0
+        for keys in fragments:
+            fragment_path = self._fragment_path(keys)
+            fragment_paths.append(fragment_path)
+            digest = None
+            if fingerprint:
+                digest = self._fragment_digest(fingerprint, keys)
+            saved = saved_fragments_index.get(fragment_path)
+            if (digest and saved and saved[0] == digest and
+                os.path.isfile(fragment_path)):
+                for key, state in saved[1].iteritems():
+                    target_database[key].__setstate__(state)
+                fragments_index[fragment_path] = saved
+                continue
+            regenerated_count += 1
+            rules_buf = blade.gen_targets_rules(keys)
+            self._write_fragment(fragment_path, rules_buf)
+            if digest:
+                states = {}
+                for key in keys:
+                    state = target_database[key].__getstate__()
+                    state['scons_rule_buf'] = []
+                    states[key] = state
+                fragments_index[fragment_path] = (digest, states)
+
+        if fingerprint:
+            console.info('%d of %d SConscript files regenerated' % (
+                         regenerated_count, len(fragments)))
+            if fragments_index != saved_fragments_index:
+                self._save_fragments_index(fragments_index)
+        return fragment_paths
+
+    def _load_saved_scons_header(self, fingerprint):
+        """Return the saved header if the fingerprint matches, or None. """
+        try:
+            f = open(self.saved_scons_path)
+        except IOError:
+            return None
+        try:
+            if f.readline() != '# fingerprint: %s\n' % fingerprint:
+                return None
+            return f.readlines()
+        finally:
+            f.close()
+
+    def _save_scons_header(self, fingerprint, rules_buf):
+        """Save the generated header with the fingerprint. """
+        temp_path = '%s.tmp' % self.saved_scons_path
+        f = open(temp_path, 'w')
+        try:
+            f.write('# fingerprint: %s\n' % fingerprint)
+            f.writelines(rules_buf)
+        finally:
+            f.close()
+        os.rename(temp_path, self.saved_scons_path)
 
     def generate_scons_script(self):
-        """Generates SConstruct script. """
-        rules_buf = self.scons_file_header_generator.generate(self.blade_path)
-        rules_buf += self.blade.gen_targets_rules()
+        """Generates SConstruct script.
+
+        The header and the fragments are reused if all things they depend
+        on are the same as the saved ones, unless the build cache is
+        disabled.
+
+        """
+        fingerprint = None
+        if getattr(self.blade.get_options(), 'build_cache', False):
+            fingerprint = self._fingerprint()
+        rules_buf = None
+        if fingerprint:
+            rules_buf = self._load_saved_scons_header(fingerprint)
+        if rules_buf is not None:
+            # The version information should always be updated
+            self.scons_file_header_generator.write_version_file()
+        else:
+            rules_buf = self.scons_file_header_generator.generate(self.blade_path)
+            if fingerprint:
+                self._save_scons_header(fingerprint, rules_buf)
+
+        for fragment_path in self._generate_fragments(fingerprint):
+            rules_buf.append('execfile("%s")\n' % fragment_path)
 
         # Write to SConstruct
         self.scons_file_fd = open(self.scons_path, 'w')
         self.scons_file_fd.writelines(rules_buf)
         self.scons_file_fd.close()
         return rules_buf
+
+
+def _ninja_escape(value):
+    """Escape the variable value for ninja. """
+    return value.replace('$', '$$')
+
+
+def _ninja_escape_path(path):
+    """Escape the path in build statement for ninja. """
+    return path.replace('$', '$$').replace(' ', '$ ').replace(':', '$:')
+
+
+# The ninja rules implementing the rules of build actions
+_NINJA_RULES = r"""
+rule cc
+  command = $cc -o $out -MMD -MF $out.d -c $cflags -fPIC $cppflags $warnings $target_cppflags $includes $target_includes $in
+  depfile = $out.d
+  deps = gcc
+  description = Compiling $in
+  pool = compile_pool
+
+rule cxx
+  command = $cxx -o $out -MMD -MF $out.d -c $cxxflags -fPIC $cppflags $warnings $target_cppflags $includes $target_includes $in
+  depfile = $out.d
+  deps = gcc
+  description = Compiling $in
+  pool = compile_pool
+
+rule pch
+  command = $cxx -o $out -MMD -MF $out.d -x c++-header -c $cxxflags -fPIC $cppflags $warnings $target_cppflags $includes $target_includes $in
+  depfile = $out.d
+  deps = gcc
+  description = Precompiling $in
+  pool = compile_pool
+
+rule as
+  command = as $asflags -o $out $in
+  description = Assembling $in
+  pool = compile_pool
+
+rule ar
+  command = rm -f $out && ar $arflags $out $in
+  description = Creating Static Library $out
+
+rule link
+  command = $ld -o $out $linkflags $target_linkflags $in $whole_archives $libs $syslibs && $stamp_build_time $out
+  description = Linking Program $out
+  pool = link_pool
+
+rule solink
+  command = $ld -o $out -shared $linkflags $target_linkflags $in $whole_archives $libs $syslibs
+  description = Linking Shared Library $out
+  pool = link_pool
+
+rule proto_cc
+  command = $protoc --proto_path=. -I. $protobuf_incs -I=`dirname $in` --cpp_out=$builddir $in
+  description = Compiling $in to cc source
+
+rule thrift_cc
+  command = $thrift --gen cpp:include_prefix -I . $thrift_incs -I `dirname $in` -out $builddir/`dirname $in` $in
+  description = Compiling $in to cc source
+
+rule resource_header
+  command = (echo '// This file was automatically generated by blade'; printf '#ifdef __cplusplus\nextern "C" {\n#endif\n\n'; for f in $in; do echo "extern const char RESOURCE_`echo $$f | tr ',/.+-' '_'`[`wc -c < $$f`];"; done; printf '\n#ifdef __cplusplus\n}\n#endif\n\n') > $out
+  description = Generating resource header $out
+
+rule resource_file
+  command = xxd -i $in | sed "s/unsigned char /const char RESOURCE_/g" > $out
+  description = Compiling $in as resource file
+
+rule lex
+  command = flex $lexflags -t $in > $out
+  description = Lex $in to $out
+
+rule yacc
+  command = bison $yaccflags -d -o $yacc_out $in
+  description = Yacc $in to $out
+
+rule command
+  command = $cmd
+  description = Generating $out
+
+rule copy
+  command = cp -f $in $out
+  description = Copying $in to $out
+"""
+
+
+class NinjaFileHeaderGenerator(SconsFileHeaderGenerator):
+    """Generates the variables and rules at the head of build.ninja. """
+    def __init__(self, *args):
+        SconsFileHeaderGenerator.__init__(self, *args)
+        # The escaped values of the top level variables
+        self.variables = {}
+        self.version_action = None
+        self.version_variables = []
+
+    def _add_variable(self, name, value):
+        """Add a top level variable. """
+        if isinstance(value, list):
+            value = ' '.join(value)
+        self.variables[name] = _ninja_escape(value)
+        self._add_rule('%s = %s' % (name, self.variables[name]))
+
+    def generate_variables(self):
+        """Generates the toolchain and compliation flags variables. """
+        cpp_str, cc_str, cxx_str, ld_str = self._get_build_tools()
+        self._add_variable('cc', cc_str)
+        self._add_variable('cxx', cxx_str)
+        self._add_variable('ld', ld_str)
+
+        cc_config = configparse.blade_config.get_config('cc_config')
+        (cppflags_except_warning, linkflags) = self.ccflags_manager.get_flags_except_warning()
+        self._add_variable('cppflags', cc_config['cppflags'] + cppflags_except_warning)
+        self._add_variable('cflags', cc_config['cflags'])
+        self._add_variable('cxxflags', cc_config['cxxflags'] +
+                           self._get_pch_preprocess_flags())
+        self._add_variable('linkflags', linkflags + cc_config['linkflags'])
+        self._add_variable('arflags', self._get_arflags())
+        self._add_variable('thin_arflags', self._get_arflags(True))
+        self._add_variable('includes', _incs_list_to_string(
+                cc_config['extra_incs'] + [self.build_dir, self.python_inc]))
+
+        (warnings, cxx_warnings, c_warnings) = self.ccflags_manager.get_warning_flags()
+        self._add_variable('cpp_warnings', warnings)
+        self._add_variable('c_warnings', c_warnings)
+        self._add_variable('cxx_warnings', cxx_warnings)
+
+        proto_config = configparse.blade_config.get_config('proto_library_config')
+        self._add_variable('protoc', proto_config['protoc'])
+        self._add_variable('protobuf_incs',
+                           _incs_list_to_string(proto_config['protobuf_incs']))
+
+        thrift_config = configparse.blade_config.get_config('thrift_config')
+        thrift_bin = thrift_config['thrift']
+        if thrift_bin.startswith('//'):
+            thrift_bin = thrift_bin.replace('//', self.build_dir + '/')
+            thrift_bin = thrift_bin.replace(':', '/')
+        self._add_variable('thrift', thrift_bin)
+        self._add_variable('thrift_incs',
+                           _incs_list_to_string(thrift_config['thrift_incs']))
+
+    def generate(self, blade_path):
+        """Generates the header of build.ninja. """
+        self._add_rule('# This file was generated by blade')
+        self._add_rule('ninja_required_version = 1.3')
+        self._add_variable('builddir', self.build_dir)
+        self.generate_variables()
+        self._add_variable('stamp_build_time',
+                           '%s -c "import sys; sys.path.insert(0, \'%s\'); '
+                           'import blade_util; '
+                           'blade_util.stamp_build_time(sys.argv[1])"' % (
+                           sys.executable, blade_path))
+        # The links run in a separate pool, depth 0 means unlimited
+        self._add_rule('pool compile_pool\n  depth = %d' %
+                       getattr(self.options, 'jobs', 0))
+        self._add_rule('pool link_pool\n  depth = %d' %
+                       getattr(self.options, 'link_jobs', 0))
+        self._add_rule(_NINJA_RULES)
+
+        self.write_version_file()
+        version_cpp = os.path.join(self.build_dir, 'version.cpp')
+        self.version_action = BuildAction('cxx', '%s.o' % version_cpp[:-4],
+                                          version_cpp)
+        # Override the top level flags, which are not needed by version.cpp
+        self.version_variables = [('cppflags', '-m%s' % self.options.m),
+                                  ('cxxflags', ''),
+                                  ('includes', '')]
+        self._add_rule('build %s.o: cxx %s' % (version_cpp[:-4], version_cpp))
+        for name, value in self.version_variables:
+            self._add_rule(('  %s = %s' % (name, value)).rstrip())
+        return self.rules_buf
+
+
+class NinjaRulesGenerator(object):
+    """Generates build.ninja from the build actions of targets. """
+    def __init__(self, ninja_path, blade_path, blade):
+        """Init method. """
+        self.ninja_path = ninja_path
+        self.blade_path = blade_path
+        self.blade = blade
+        scons_platform = self.blade.get_scons_platform()
+
+        build_dir = self.blade.get_build_path()
+        self.ninja_file_header_generator = NinjaFileHeaderGenerator(
+                self.blade.get_options(),
+                build_dir,
+                scons_platform.get_gcc_version(),
+                scons_platform.get_python_include(),
+                self.blade.build_environment,
+                self.blade.svn_root_dirs)
+        _link_blade_bin(build_dir)
+
+    def _build_variables(self, action):
+        """Returns the variables of the build statement of the action. """
+        variables = []
+        for name, value in sorted(action.variables.items()):
+            if name == 'warning':
+                if value:
+                    # The pch is a c++ header
+                    language = {'cc': 'c', 'pch': 'cxx'}.get(action.rule,
+                                                            action.rule)
+                    warnings = '$cpp_warnings $%s_warnings' % language
+                    variables.append(('warnings', warnings))
+                continue
+            if name == 'thin_archive':
+                if value:
+                    variables.append(('arflags', '$thin_arflags'))
+                continue
+            if name == 'includes':
+                value = _incs_list_to_string(value)
+            elif name == 'whole_archives':
+                if value:
+                    value = (['-Wl,--whole-archive'] + value +
+                             ['-Wl,--no-whole-archive'])
+            elif name == 'syslibs':
+                value = ['-l%s' % lib for lib in value]
+            if name in ('cppflags', 'includes', 'linkflags'):
+                name = 'target_%s' % name
+            if isinstance(value, list):
+                value = ' '.join(value)
+            if value:
+                variables.append((name, _ninja_escape(value)))
+        if action.rule == 'yacc':
+            variables.append(('yacc_out', _ninja_escape(action.outputs[0])))
+        return variables
+
+    def _build_statement(self, action):
+        """Returns the lines of the build statement of the action. """
+        line = 'build %s: %s' % (
+                ' '.join([_ninja_escape_path(f) for f in action.outputs]),
+                action.rule)
+        if action.inputs:
+            line += ' ' + ' '.join([_ninja_escape_path(f) for f in action.inputs])
+        if action.implicit_deps:
+            line += ' | ' + ' '.join([_ninja_escape_path(f)
+                                      for f in action.implicit_deps])
+        if action.order_only_deps:
+            line += ' || ' + ' '.join([_ninja_escape_path(f)
+                                       for f in action.order_only_deps])
+        lines = ['%s\n' % line]
+        for name, value in self._build_variables(action):
+            lines.append('  %s = %s\n' % (name, value))
+        return lines
+
+    def generate_ninja_script(self):
+        """Generates build.ninja. """
+        rules_buf = self.ninja_file_header_generator.generate(self.blade_path)
+        rules_buf.append('build %s: phony\n' % ALWAYS_BUILD)
+        for key, actions in self.blade.gen_targets_build_actions():
+            rules_buf.append('\n')
+            outputs = []
+            for action in actions:
+                rules_buf += self._build_statement(action)
+                outputs += action.outputs
+            rules_buf += self._build_statement(
+                    BuildAction('phony', target_alias(key), outputs))
+
+        ninja_file = open(self.ninja_path, 'w')
+        try:
+            ninja_file.writelines(rules_buf)
+        finally:
+            ninja_file.close()
+        return rules_buf
+
+
+# The variable references in ninja, such as $in, ${out} and the escaped
+# characters $$, $: and "$ "
+_NINJA_VARIABLE_PATTERN = re.compile(r'\$(\$|:| |\{(\w+)\}|(\w+))')
+
+
+def _ninja_expand(value, lookup):
+    """Expand the variable references in the ninja value. """
+    def replace(match):
+        name = match.group(2) or match.group(3)
+        if name:
+            return lookup(name)
+        return match.group(1)
+    return _NINJA_VARIABLE_PATTERN.sub(replace, value)
+
+
+def _parse_ninja_rules(text):
+    """Parse the ninja rules into a dict of their variables. """
+    rules = {}
+    rule = None
+    for line in text.splitlines():
+        if line.startswith('rule '):
+            rule = {}
+            rules[line[len('rule '):].strip()] = rule
+        elif line.startswith('  ') and rule is not None:
+            (name, value) = line.strip().split(' =', 1)
+            rule[name] = value.strip()
+    return rules
+
+
+class NativeRulesGenerator(NinjaRulesGenerator):
+    """Generates the actions run by the native executor.
+
+    The commands of the actions are expanded from the ninja rules and
+    variables, so they are the same as the ninja backend.
+
+    """
+    def __init__(self, blade_path, blade):
+        """Init method. """
+        NinjaRulesGenerator.__init__(self, None, blade_path, blade)
+        self.rules = _parse_ninja_rules(_NINJA_RULES)
+
+    def _top_variable(self, name):
+        value = self.ninja_file_header_generator.variables.get(name, '')
+        return _ninja_expand(value, self._top_variable)
+
+    def _add_action(self, executor, action, variables):
+        """Add the action with its commands expanded into the executor. """
+        always_build = ALWAYS_BUILD in action.implicit_deps
+        implicit_deps = [d for d in action.implicit_deps if d != ALWAYS_BUILD]
+        if action.rule == 'phony':
+            executor.add_action(action.outputs, action.inputs, implicit_deps,
+                                action.order_only_deps)
+            return
+
+        scope = {'in': ' '.join(action.inputs),
+                 'out': ' '.join(action.outputs)}
+        for name, value in variables:
+            scope[name] = _ninja_expand(value, self._top_variable)
+
+        def lookup(name):
+            if name in scope:
+                return scope[name]
+            return self._top_variable(name)
+
+        rule = self.rules[action.rule]
+        executor.add_action(
+                action.outputs, action.inputs, implicit_deps,
+                action.order_only_deps,
+                command=_ninja_expand(rule['command'], lookup),
+                description=_ninja_expand(rule.get('description', ''), lookup),
+                depfile=_ninja_expand(rule.get('depfile', ''), lookup),
+                always_build=always_build,
+                pool=rule.get('pool', '').replace('_pool', ''))
+
+    def generate_executor(self):
+        """Returns the native executor of the actions of all targets. """
+        header_generator = self.ninja_file_header_generator
+        rules_buf = header_generator.generate(self.blade_path)
+        executor = NativeExecutor(self.blade.get_build_path())
+        self._add_action(executor, header_generator.version_action,
+                         header_generator.version_variables)
+        for key, actions in self.blade.gen_targets_build_actions():
+            outputs = []
+            for action in actions:
+                self._add_action(executor, action, self._build_variables(action))
+                outputs += action.outputs
+            executor.add_action([target_alias(key)], outputs)
+        return executor
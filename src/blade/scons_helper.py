@@ -15,6 +15,7 @@
 """
 
 
+import atexit
 import os
 import shutil
 import signal
@@ -22,13 +23,23 @@ import string
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 
 import SCons
 import SCons.Action
 import SCons.Builder
+import SCons.CacheDir
+import SCons.Defaults
+import SCons.Node
 import SCons.Scanner
 import SCons.Scanner.Prog
 
+import blade_util
+import fast_link
+from concurrency_controller import ConcurrencyController
+from link_scheduler import LinkScheduler
+from link_scheduler import run_command
 import console
 
 
@@ -36,8 +47,25 @@ import console
 option_verbose = False
 
 
-# linking tmp dir
-linking_tmp_dir = ''
+# The fast linker reserving the space of tmpfs for the links, it is not
+# None if create_fast_link_builders succeeds
+fast_linker = None
+
+
+# The action cache used by the actions made by MakeCachedAction
+action_cache = None
+
+
+# The environments shared by the targets, keyed by their configurations
+_interned_envs = {}
+
+
+# The scheduler of the link commands, and the semaphore or the concurrency
+# controller limiting the other commands, they are not limited unless
+# setup_link_scheduler or setup_concurrency_controller is called
+link_scheduler = None
+compile_limiter = None
+linker_program = ''
 
 
 def generate_python_binary(target, source, env):
@@ -189,6 +217,108 @@ def generate_resource_file(target, source, env):
     return p.returncode
 
 
+def setup_scache_manager(scache_manager, scons_cache=True, remote_cache=None):
+    """Record the files pushed into or retrieved from the cache dir.
+
+    scons_cache is False if the CacheDir of scons is not used, the cache
+    dir is then used by the action cache only.  The scons cache files are
+    also downloaded from and uploaded to the remote cache if it is set.
+
+    """
+    if remote_cache:
+        atexit.register(remote_cache.close)
+    if not scons_cache:
+        scache_manager.open()
+        atexit.register(scache_manager.close)
+        return
+
+    scons_cache_dir = SCons.CacheDir.CacheDir
+
+    class BladeCacheDir(scons_cache_dir):
+        def retrieve(self, node):
+            if remote_cache and SCons.Action.execute_actions:
+                cache_file = self.cachepath(node)[1]
+                if cache_file and not os.path.exists(cache_file):
+                    remote_cache.get('scons', os.path.basename(cache_file),
+                                     cache_file)
+            retrieved = scons_cache_dir.retrieve(self, node)
+            if retrieved:
+                scache_manager.record(self.cachepath(node)[1])
+            return retrieved
+
+        def push(self, node):
+            cache_file = self.cachepath(node)[1]
+            pushed = cache_file and not os.path.exists(cache_file)
+            ret = scons_cache_dir.push(self, node)
+            scache_manager.record(cache_file)
+            if remote_cache and pushed and os.path.exists(cache_file):
+                remote_cache.put('scons', os.path.basename(cache_file),
+                                 cache_file)
+            return ret
+
+    SCons.CacheDir.CacheDir = BladeCacheDir
+    # Let scons initialize the cache dir before the index is created in it
+    SCons.Defaults.DefaultEnvironment().get_CacheDir()
+    scache_manager.open()
+    atexit.register(scache_manager.close)
+
+
+def stamp_build_time(target, source, env):
+    """Stamp the build time into the linked binaries. """
+    for t in target:
+        blade_util.stamp_build_time(str(t))
+    return 0
+
+
+def intern_env(key, base_env, *flags_list):
+    """Return the environment cloned from base_env with the flags appended.
+
+    The key is the digest of base_env and the flags, computed by blade when
+    generating the rules, the environment is cloned only once for all of
+    the targets with the same key.
+
+    """
+    env = _interned_envs.get(key)
+    if env is None:
+        env = base_env.Clone()
+        for flags in flags_list:
+            env.Append(**flags)
+        _interned_envs[key] = env
+    return env
+
+
+# The suffixes of the sources compiled into .dwo files with -gsplit-dwarf
+_SPLIT_DWARF_SUFFIXES = frozenset(['.c', '.cc', '.cpp', '.cxx', '.c++', '.C'])
+
+
+def _split_dwarf_emitter(target, source, env):
+    """Add the .dwo file written by the compiler to the targets. """
+    if os.path.splitext(str(source[0]))[1] in _SPLIT_DWARF_SUFFIXES:
+        target = target + [os.path.splitext(str(target[0]))[0] + '.dwo']
+    return target, source
+
+
+def setup_split_dwarf(env):
+    """Declare the .dwo files of the objects compiled with -gsplit-dwarf.
+
+    So they are cleaned, and cached together with the objects, otherwise
+    the objects retrieved from the cache have no debug information.  The
+    .dwo files are not returned by env.SharedObject, so they are never
+    linked.
+
+    """
+    builder = env['BUILDERS']['SharedObject']
+    for suffix, emitter in builder.emitter.items():
+        builder.add_emitter(suffix, SCons.Builder.ListEmitter(
+                [emitter, _split_dwarf_emitter]))
+
+    def shared_object(env, *args, **kwargs):
+        nodes = builder(env, *args, **kwargs)
+        return SCons.Node.NodeList([node for node in nodes
+                                    if not str(node).endswith('.dwo')])
+    env.AddMethod(shared_object, 'SharedObject')
+
+
 def MakeAction(cmd, cmdstr):
     global option_verbose
     if option_verbose:
@@ -197,6 +327,89 @@ def MakeAction(cmd, cmdstr):
         return SCons.Action.Action(cmd, cmdstr)
 
 
+def setup_action_cache(cache):
+    """Enable the action cache for the actions made by MakeCachedAction. """
+    global action_cache
+    action_cache = cache
+
+
+def _toolchain_fingerprint(cmdline):
+    """Return the fingerprint of the program run by the command line.
+
+    It is the md5sum of the program, so the keys of the action are the
+    same on the machines sharing the remote cache.  Returns None if the
+    program is not found, then the action is not cached.
+
+    """
+    words = cmdline.split()
+    if not words:
+        return None
+    return blade_util.get_program_digest(words[0])
+
+
+def _run_cached_action(signature, target, source, execute):
+    """Run the action unless its outputs are found in the action cache. """
+    if action_cache is None:
+        return execute()
+    outputs = [str(t) for t in target]
+    inputs = [(str(node), node.get_csig()) for node in target[0].children()]
+    key = action_cache.key(signature, outputs, inputs)
+    if action_cache.retrieve(key, outputs):
+        for output in outputs:
+            print "Retrieved `%s' from action cache" % output
+        return 0
+    ret = execute()
+    if not ret:
+        action_cache.store(key, outputs)
+    return ret
+
+
+class _CachedCommandAction(SCons.Action.CommandAction):
+    """The command action whose outputs are saved in the action cache. """
+    def execute(self, target, source, env, *args, **kwargs):
+        cmdline = env.subst(self.cmd_list, 0, target, source)
+        if not isinstance(cmdline, str):
+            cmdline = ' '.join([str(c) for c in cmdline])
+
+        def execute():
+            return SCons.Action.CommandAction.execute(
+                    self, target, source, env, *args, **kwargs)
+
+        fingerprint = _toolchain_fingerprint(cmdline)
+        if fingerprint is None:
+            return execute()
+        return _run_cached_action([cmdline, fingerprint],
+                                  target, source, execute)
+
+
+def _cached_function(func):
+    """Wrap the function action to save its outputs in the action cache. """
+    def cached_function(target, source, env):
+        def execute():
+            return func(target, source, env)
+        return _run_cached_action([func.__name__, blade_util.get_blade_digest()],
+                                  target, source, execute)
+    cached_function.__name__ = func.__name__
+    return cached_function
+
+
+def MakeCachedAction(cmd, cmdstr=None):
+    """Make the action whose outputs are saved in the action cache.
+
+    cmd is a command line or a python function, the default message of
+    scons is shown if cmdstr is not specified.  The outputs are reused
+    if the command line, the inputs and the toolchain are not changed.
+
+    """
+    if callable(cmd):
+        if cmdstr is None:
+            return SCons.Action.Action(_cached_function(cmd))
+        return MakeAction(_cached_function(cmd), cmdstr)
+    if option_verbose or cmdstr is None:
+        return _CachedCommandAction(cmd)
+    return _CachedCommandAction(cmd, cmdstr=cmdstr)
+
+
 _ERRORS = [': error:', ': fatal error:', ': undefined reference to',
            ': cannot find ', ': ld returned 1 exit status']
 _WARNINGS = [': warning:', ': note: ']
@@ -226,6 +439,77 @@ def error_colorize(message):
     return ''.join(colored_message)
 
 
+def setup_link_scheduler(history_path, linker):
+    """Run the link commands in a separate pool.
+
+    The link_jobs argument of scons is the size of the link pool, the
+    other commands are limited by the rest of the jobs.
+
+    """
+    global link_scheduler, compile_limiter, linker_program
+    import SCons.Script
+    link_jobs = int(SCons.Script.ARGUMENTS.get('link_jobs', 0))
+    if link_jobs <= 0:
+        return
+    jobs = SCons.Script.GetOption('num_jobs')
+    link_scheduler = LinkScheduler(link_jobs, history_path)
+    compile_limiter = threading.Semaphore(max(jobs - link_jobs, 1))
+    linker_program = linker.split()[0]
+    atexit.register(link_scheduler.close)
+
+
+def setup_concurrency_controller(log_path, distcc_hosts=''):
+    """Adjust the number of the non-link commands at runtime.
+
+    It is enabled by the adaptive_jobs argument of scons, the jobs are
+    at most the number of the jobs of scons minus the link jobs.  The
+    capacity of the distcc hosts probed by blade is passed by the
+    distcc_jobs argument, so they are not probed again at start.
+
+    """
+    global compile_limiter
+    import SCons.Script
+    if SCons.Script.ARGUMENTS.get('adaptive_jobs') != '1':
+        return
+    jobs = SCons.Script.GetOption('num_jobs')
+    link_jobs = int(SCons.Script.ARGUMENTS.get('link_jobs', 0))
+    distcc_jobs = SCons.Script.ARGUMENTS.get('distcc_jobs')
+    if distcc_jobs is not None:
+        distcc_jobs = int(distcc_jobs)
+    compile_limiter = ConcurrencyController(max(jobs - link_jobs, 1),
+                                            log_path, distcc_hosts.split(),
+                                            distcc_jobs=distcc_jobs)
+    atexit.register(compile_limiter.close)
+
+
+def _link_output(args):
+    """Return the output if the command is a link, otherwise None. """
+    if (not link_scheduler or not args or args[0] != linker_program or
+        '-c' in args or '-o' not in args):
+        return None
+    index = args.index('-o') + 1
+    if index < len(args):
+        # The paths are quoted by scons
+        return args[index].strip('"\'')
+    return None
+
+
+def _run_link(cmdline, env, output):
+    """Run the link command when the link scheduler allows.
+
+    The scons worker thread is blocked while the link waits, at most
+    link_jobs of them wait for the memory, see LinkScheduler.
+
+    """
+    link_scheduler.acquire(output)
+    peak_rss = 0
+    try:
+        (returncode, stdout, stderr, peak_rss) = run_command(cmdline, env)
+    finally:
+        link_scheduler.release(output, peak_rss)
+    return returncode, stdout, stderr
+
+
 def echospawn(sh, escape, cmd, args, env):
     # convert env from unicode strings
     asciienv = {}
@@ -233,17 +517,28 @@ def echospawn(sh, escape, cmd, args, env):
         asciienv[key] = str(value)
 
     cmdline = ' '.join(args)
-    p = subprocess.Popen(
-        cmdline,
-        env=asciienv,
-        stderr=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        shell=True,
-        universal_newlines=True)
-    (stdout, stderr) = p.communicate()
-
-    if p.returncode:
-        if p.returncode != -signal.SIGINT:
+    output = _link_output(args)
+    if output:
+        (returncode, stdout, stderr) = _run_link(cmdline, asciienv, output)
+    else:
+        if compile_limiter:
+            compile_limiter.acquire()
+        try:
+            p = subprocess.Popen(
+                cmdline,
+                env=asciienv,
+                stderr=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                shell=True,
+                universal_newlines=True)
+            (stdout, stderr) = p.communicate()
+            returncode = p.returncode
+        finally:
+            if compile_limiter:
+                compile_limiter.release()
+
+    if returncode:
+        if returncode != -signal.SIGINT:
             # Error
             sys.stdout.write(error_colorize(stdout))
             sys.stderr.write(error_colorize(stderr))
@@ -255,7 +550,7 @@ def echospawn(sh, escape, cmd, args, env):
         else:
             sys.stdout.write(stdout)
 
-    return p.returncode
+    return returncode
 
 
 def _blade_action_postfunc(closing_message):
@@ -267,22 +562,13 @@ def _blade_action_postfunc(closing_message):
     SCons.SConsign.write()
 
 
-def _fast_link_helper(target, source, env, link_com):
-    """fast link helper function. """
-    target_file = str(target[0])
-    prefix_str = 'blade_%s' % target_file.replace('/', '_').replace('.', '_')
-    fd, temporary_file = tempfile.mkstemp(suffix='xianxian',
-                                          prefix=prefix_str,
-                                          dir=linking_tmp_dir)
-    os.close(fd)
-
-    sources = []
-    for s in source:
-        sources.append(str(s))
-
+def _run_fast_link(link_com, output, sources, target_file):
+    """Run the link command writing the output. """
     link_com_str = link_com.substitute(
-                   FL_TARGET=temporary_file,
+                   FL_TARGET=output,
                    FL_SOURCE=' '.join(sources))
+    if link_scheduler:
+        return _run_link(link_com_str, os.environ, target_file)
     p = subprocess.Popen(
                         link_com_str,
                         env=os.environ,
@@ -291,17 +577,71 @@ def _fast_link_helper(target, source, env, link_com):
                         shell=True,
                         universal_newlines=True)
     std_out, std_err = p.communicate()
+    return p.returncode, std_out, std_err
+
+
+def _fast_link_on_tmpfs(link_com, sources, target_file):
+    """Link on tmpfs and move the output to the build dir.
+
+    Returns None if tmpfs is full, either before or during the link.
+
+    """
+    prefix_str = 'blade_%s' % target_file.replace('/', '_').replace('.', '_')
+    fd, temporary_file = tempfile.mkstemp(suffix='xianxian',
+                                          prefix=prefix_str,
+                                          dir=fast_linker.tmp_dir)
+    os.close(fd)
+    try:
+        (returncode, std_out, std_err) = _run_fast_link(
+                link_com, temporary_file, sources, target_file)
+        if returncode == 0:
+            shutil.move(temporary_file, target_file)
+        elif 'No space left on device' in std_err:
+            return None
+        return returncode, std_out, std_err
+    finally:
+        if os.path.exists(temporary_file):
+            os.remove(temporary_file)
+
+
+def _fast_link_helper(target, source, env, link_com):
+    """fast link helper function.
+
+    The link runs on tmpfs if the space for its output could be reserved,
+    otherwise it runs on disk.
+
+    """
+    target_file = str(target[0])
+    sources = []
+    for s in source:
+        sources.append(str(s))
+
+    start_time = time.time()
+    result = None
+    inputs = [str(node) for node in target[0].children()]
+    size = fast_link.estimate_link_size(target_file, inputs)
+    on_tmpfs = fast_linker.reserve(target_file, size)
+    if on_tmpfs:
+        try:
+            result = _fast_link_on_tmpfs(link_com, sources, target_file)
+        finally:
+            fast_linker.release(target_file)
+        if result is None:
+            on_tmpfs = False
+            start_time = time.time()
+    if result is None:
+        result = _run_fast_link(link_com, target_file, sources, target_file)
+
+    (returncode, std_out, std_err) = result
     if std_out:
         print std_out
     if std_err:
         print std_err
-    if p.returncode == 0:
-        shutil.move(temporary_file, target_file)
-        if not os.path.exists(target_file):
-            console.warning('failed to genreate %s in link on tmpfs mode' % target_file)
+    if returncode == 0:
+        fast_linker.account(target_file, time.time() - start_time, on_tmpfs)
     else:
         _blade_action_postfunc('failed while fast linking')
-        return p.returncode
+        return returncode
 
 
 def fast_link_sharelib_action(target, source, env):
@@ -371,41 +711,30 @@ def create_fast_link_sharelib_builder(env):
     env['BUILDERS']['SharedLibrary'] = sharedlib
 
 
-def create_fast_link_builders(env):
-    """Creates fast link builders - Program and  SharedLibrary. """
-    # Check requirement
-    acquire_temp_place = "df | grep tmpfs | awk '{print $5, $6}'"
-    p = subprocess.Popen(
-                        acquire_temp_place,
-                        env=os.environ,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        shell=True,
-                        universal_newlines=True)
-    std_out, std_err = p.communicate()
+def create_fast_link_builders(env, history_path):
+    """Creates fast link builders - Program and  SharedLibrary.
 
-    # Do not try to overwrite builder with error
-    if p.returncode:
-        console.warning('you have link on tmp enabled, but it is not fullfilled to make it.')
-        return
+    The tmpfs with the most available space is used.
 
-    # No tmpfs to do fastlink, will not overwrite the builder
-    if not std_out:
+    """
+    tmp_dirs = fast_link.find_tmpfs_dirs()
+    if not tmp_dirs:
         console.warning('you have link on tmp enabled, but there is no tmpfs to make it.')
         return
 
-    # Use the first one
-    global linking_tmp_dir
-    usage, linking_tmp_dir = tuple(std_out.splitlines(False)[0].split())
-
-    # Do not try to do that if there is no memory space left
-    usage = int(usage.replace('%', ''))
-    if usage > 90:
-        console.warning('you have link on tmp enabled, '
-                        'but there is not enough space on %s to make it.' %
-                        linking_tmp_dir)
+    best_space = None
+    for tmp_dir in tmp_dirs:
+        space = fast_link.get_space(tmp_dir)
+        if space and (not best_space or space[0] > best_space[0]):
+            linking_tmp_dir = tmp_dir
+            best_space = space
+    if not best_space:
+        console.warning('you have link on tmp enabled, but it is not fullfilled to make it.')
         return
 
+    global fast_linker
+    fast_linker = fast_link.FastLinker(linking_tmp_dir, history_path)
+    atexit.register(fast_linker.close)
     console.info('building in link on tmpfs mode')
 
     create_fast_link_sharelib_builder(env)
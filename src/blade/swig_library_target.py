@@ -24,6 +24,8 @@ class SwigLibrary(CcTarget):
     This class is derived from SconsCCTarget.
 
     """
+    __slots__ = ('phpswig_flags',)
+
     def __init__(self,
                  name,
                  srcs,
@@ -57,10 +59,6 @@ class SwigLibrary(CcTarget):
         self.data['python_vars'] = []
         self.data['python_sources'] = []
 
-        scons_platform = self.blade.get_scons_platform()
-        self.php_inc_list = scons_platform.get_php_include()
-        self.options = self.blade.get_options()
-
     def _pyswig_gen_python_file(self, path, src):
         """Generate swig python file for python. """
         swig_name = src[:-2]
@@ -81,14 +79,27 @@ class SwigLibrary(CcTarget):
         swig_name = src[:-2]
         return os.path.join(self.build_path, path, '%s_phpwrap.cxx' % swig_name)
 
-    def _swig_extract_dependency_files(self, src):
+    def _swig_included_files(self, src):
         dep = []
         for line in open(src):
             if line.startswith('#include') or line.startswith('%include'):
                 line = line.split(' ')[1].strip("""'"\r\n""")
                 if not ('<' in line or line in dep):
                     dep.append(line)
-        return [i for i in dep if os.path.exists(i)]
+        return dep
+
+    def _swig_extract_dependency_files(self, src):
+        return [i for i in self._swig_included_files(src) if os.path.exists(i)]
+
+    def get_rules_input_files(self):
+        """The swig files are read to find the files they include. """
+        input_files = []
+        for src in self.srcs:
+            src_path = os.path.join(self.path, src)
+            input_files.append(src_path)
+            if os.path.isfile(src_path):
+                input_files += self._swig_included_files(src_path)
+        return input_files
 
     def _swig_library_rules_py(self):
         """_swig_library_rules_py.
@@ -116,6 +127,7 @@ class SwigLibrary(CcTarget):
         self._write_rule('%s = Builder(action=MakeAction("%s", '
                          'compile_swig_python_message))' % (
                              builder_name, swig_bld_cmd))
+        # The builder alias is unique, so it could be added to the shared env
         self._write_rule('%s.Append(BUILDERS={"%s" : %s})' % (
                 env_name, builder_alias, builder_name))
 
@@ -165,8 +177,7 @@ class SwigLibrary(CcTarget):
          lib_str,
          whole_link_flags) = self._get_static_deps_lib_list()
         if whole_link_flags:
-            self._write_rule(
-                    '%s.Append(LINKFLAGS=[%s])' % (env_name, whole_link_flags))
+            self._env_append('LINKFLAGS=[%s]' % whole_link_flags)
 
         if self.srcs or self.expanded_deps:
             self._write_rule('%s = %s.SharedLibrary("%s", %s, %s, SHLIBPREFIX = "")'
@@ -194,7 +205,7 @@ class SwigLibrary(CcTarget):
                                                 'dynamic_java')
 
         # Append -fno-strict-aliasing flag to cxxflags and cppflags
-        self._write_rule('%s.Append(CPPFLAGS = ["-fno-strict-aliasing"])' % env_name)
+        self._env_append('CPPFLAGS=["-fno-strict-aliasing"]')
         build_jar = self.data.get('generate_java')
 
         flag_list = []
@@ -269,7 +280,7 @@ class SwigLibrary(CcTarget):
         scons_platform = self.blade.get_scons_platform()
         java_includes = scons_platform.get_java_include()
         if java_includes:
-            self._write_rule('%s.Append(CPPPATH=%s)' % (env_name, java_includes))
+            self._env_append('CPPPATH=%s' % java_includes)
 
         dep_files = []
         for src in self.srcs:
@@ -372,8 +383,9 @@ class SwigLibrary(CcTarget):
         self._write_rule('%s.Append(BUILDERS={"%s" : %s})' % (
                           env_name, builder_alias, builder_name))
 
-        if self.php_inc_list:
-            self._write_rule('%s.Append(CPPPATH=%s)' % (env_name, self.php_inc_list))
+        php_inc_list = self.blade.get_scons_platform().get_php_include()
+        if php_inc_list:
+            self._env_append('CPPPATH=%s' % php_inc_list)
 
         dep_files = []
         dep_files_map = {}
@@ -442,11 +454,12 @@ class SwigLibrary(CcTarget):
 
         dep_files_map = {}
         dep_files_map = self._swig_library_rules_py()
-        if (getattr(self.options, 'generate_java', False) or
+        options = self.blade.get_options()
+        if (getattr(options, 'generate_java', False) or
             self.data.get('generate_java')):
             self._swig_library_rules_java(dep_files_map)
-        if getattr(self.options, 'generate_php', False):
-            if not self.php_inc_list:
+        if getattr(options, 'generate_php', False):
+            if not self.blade.get_scons_platform().get_php_include():
                 console.error_exit('failed to build //%s:%s, please install php modules' % (
                            self.path, self.name))
             else:
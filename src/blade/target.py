@@ -16,16 +16,56 @@ import os
 import string
 
 import console
+from blade_util import md5sum_str
 from blade_util import var_to_list
 
 
+# All target keys ever created, to make the same key referenced by many
+# targets be stored only once.
+_interned_target_keys = {}
+
+
+def intern_target_key(key):
+    """Return the unique instance of the target key tuple.
+
+    The path and name strings are interned too, so that they are shared
+    with the path and name attributes of targets.
+
+    """
+    interned_key = _interned_target_keys.get(key)
+    if interned_key is None:
+        path, name = key
+        if isinstance(path, str) and isinstance(name, str):
+            key = (intern(path), intern(name))
+        _interned_target_keys[key] = key
+        interned_key = key
+    return interned_key
+
+
 class Target(object):
     """Abstract target class.
 
     This class should be derived by subclass like CcLibrary CcBinary
     targets, etc.
 
+    Targets use __slots__ to reduce memory usage when there are a lot of
+    targets, subclasses should declare their own attributes in __slots__.
+
     """
+    __slots__ = ('blade',
+                 'build_path',
+                 'target_database',
+                 'key',
+                 'name',
+                 'path',
+                 'type',
+                 'srcs',
+                 'deps',
+                 'expanded_deps',
+                 'data',
+                 'scons_rule_buf',
+                 'env_config')
+
     def __init__(self,
                  name,
                  target_type,
@@ -43,10 +83,8 @@ class Target(object):
         current_source_path = self.blade.get_current_source_path()
         self.target_database = self.blade.get_target_database()
 
-        self.key = (current_source_path, name)
-        self.fullname = '%s:%s' % self.key
-        self.name = name
-        self.path = current_source_path
+        self.key = intern_target_key((current_source_path, name))
+        self.path, self.name = self.key
         self.type = target_type
         self.srcs = srcs
         self.deps = []
@@ -59,10 +97,81 @@ class Target(object):
         self._check_deps_in_build_file(deps)
         self._init_target_deps(deps)
         self.scons_rule_buf = []
+        self.env_config = None
+
+    @property
+    def fullname(self):
+        return '%s:%s' % self.key
+
+    def __getstate__(self):
+        """Drop the references to the blade manager when being pickled. """
+        state = {}
+        for cls in type(self).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                if hasattr(self, name):
+                    state[name] = getattr(self, name)
+        del state['blade']
+        del state['target_database']
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state, with the target keys interned. """
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+        self.key = intern_target_key(self.key)
+        self.path, self.name = self.key
+        self.deps = [intern_target_key(k) for k in self.deps]
+        self.expanded_deps = [intern_target_key(k) for k in self.expanded_deps]
+
+    def attach_blade(self, blade):
+        """Attach the target restored from the build file cache to blade.
+
+        The system libraries are not saved in the cache, register them
+        again if they don't exist.  The source files are checked again
+        because other targets may be loaded in another way.
+
+        """
+        self.blade = blade
+        self.target_database = blade.get_target_database()
+        self._check_srcs_owner()
+        for dkey in self.expanded_deps:
+            if dkey[0] == '#':
+                self._add_system_library(dkey, '#' + dkey[1])
 
     def _clone_env(self):
         """Clone target's environment. """
-        self._write_rule('%s = top_env.Clone()' % self._env_name())
+        self._setup_env('top_env')
+
+    def _setup_env(self, base_env):
+        """Setup target's environment based on base_env.
+
+        The environment is shared by all targets with the same base_env
+        and the same flags appended by _env_append, so it is assigned in
+        get_rules after all of the flags are known.
+
+        """
+        self.env_config = (len(self.scons_rule_buf), base_env, [])
+        self.scons_rule_buf.append(None)
+
+    def _env_append(self, flags):
+        """Append the flags such as 'CPPFLAGS=["-g"]' to target's environment.
+
+        The values of the flags are evaluated before the other rules of the
+        target, so they could only refer to the rules of its deps.
+
+        """
+        if self.env_config:
+            self.env_config[2].append(flags)
+        else:
+            self._write_rule('%s.Append(%s)' % (self._env_name(), flags))
+
+    def _env_rule(self):
+        """Returns the rule to get target's shared environment. """
+        (index, base_env, flags_list) = self.env_config
+        key = md5sum_str('\n'.join([base_env] + flags_list))
+        args = ['"%s"' % key, base_env]
+        args += ['dict(%s)' % flags for flags in flags_list]
+        return '%s = intern_env(%s)\n' % (self._env_name(), ', '.join(args))
 
     def _prepare_to_generate_rule(self):
         """Should be overridden. """
@@ -83,6 +192,11 @@ class Target(object):
     # exactly one target(only library target).
     __src_target_map = {}
 
+    # Whether to check the owner of source files when the target is created.
+    # It is disabled in the worker processes of parallel loading, and the
+    # check is done when the loaded targets are attached to blade.
+    check_srcs_owner_on_init = True
+
     def _check_srcs(self):
         """Check source files.
         Description
@@ -90,14 +204,19 @@ class Target(object):
         It will warn if one file belongs to two different targets.
 
         """
-        allow_dup_src_type_list = ['cc_binary', 'cc_test']
         for s in self.srcs:
             if '..' in s or s.startswith('/'):
                 raise Exception, (
                     'Invalid source file path: %s. '
                     'can only be relative path, and must in current directory or '
                     'subdirectories') % s
+        if Target.check_srcs_owner_on_init:
+            self._check_srcs_owner()
 
+    def _check_srcs_owner(self):
+        """Warn if one source file belongs to two different targets. """
+        allow_dup_src_type_list = ['cc_binary', 'cc_test']
+        for s in self.srcs:
             src_key = os.path.normpath('%s/%s' % (self.path, s))
             src_value = '%s %s:%s' % (
                     self.type, self.path, self.name)
@@ -105,7 +224,7 @@ class Target(object):
                 value_existed = Target.__src_target_map[src_key]
                   # May insert multiple time in test because of not unloading module
                 if (value_existed != src_value and
-                    not (value_existed.split(': ')[0] in allow_dup_src_type_list and
+                    not (value_existed.split(' ')[0] in allow_dup_src_type_list and
                          self.type in allow_dup_src_type_list)):
                     # Just warn here, not raising exception
                     console.warning('Source file %s belongs to both %s and %s' % (
@@ -120,6 +239,8 @@ class Target(object):
                 self._add_system_library(dkey, dep)
             if dkey not in self.expanded_deps:
                 self.expanded_deps.append(dkey)
+            if dkey not in self.deps:
+                self.deps.append(dkey)
 
     def _add_system_library(self, key, name):
         """Add system library entry to database. """
@@ -166,6 +287,7 @@ class Target(object):
                 dkey = (os.path.normpath('%s/%s' % (
                                           self.path, path)), lib)
 
+            dkey = intern_target_key(dkey)
             if dkey not in self.expanded_deps:
                 self.expanded_deps.append(dkey)
 
@@ -342,6 +464,96 @@ class Target(object):
         """
         console.error_exit('%s: should be subclassing' % self.type)
 
+    def build_actions(self):
+        """build_actions.
+
+        Returns
+        -----------
+        The list of build actions lowered from the target, or None if the
+        target can only be built by scons.
+
+        Description
+        -----------
+        The build actions are the backend neutral representation of the
+        rules, should be implemented in subclass.
+
+        """
+        return None
+
+    def get_generated_headers(self):
+        """get_generated_headers.
+
+        Returns
+        -----------
+        The header files generated by the target, which should be generated
+        before compiling the sources including them.
+
+        """
+        return []
+
+    def _source_file_path(self, src):
+        """_source_file_path.
+
+        Returns
+        -----------
+        The path of the source file, it is under the building path if it
+        is not in the source tree but generated.
+
+        """
+        src_path = os.path.join(self.path, src)
+        if os.path.exists(src_path):
+            return src_path
+        return self._target_file_path(self.path, src)
+
+    def _explict_dependency_files(self):
+        """_explict_dependency_files.
+
+        Returns
+        -----------
+        The files generated by the gen_rule deps, see
+        _generate_target_explict_dependency.
+
+        """
+        files = []
+        targets = self.blade.get_build_targets()
+        for d in self.expanded_deps:
+            dep_target = targets[d]
+            if dep_target.type == 'gen_rule':
+                files += dep_target.get_outputs()
+        return files
+
+    def get_load_input_files(self):
+        """get_load_input_files.
+
+        Returns
+        -----------
+        The files read when the target is created besides the BUILD file.
+
+        Description
+        -----------
+        It is used to check whether the target saved in the build file
+        cache could be reused.  Should be overridden in subclasses which
+        read files in __init__.
+
+        """
+        return []
+
+    def get_rules_input_files(self):
+        """get_rules_input_files.
+
+        Returns
+        -----------
+        The files read when generating the rules besides the BUILD file,
+        or None if the rules depend on the state of building outputs.
+
+        Description
+        -----------
+        It is used to check whether the generated rules could be reused.
+        Should be overridden in subclasses which read files in scons_rules.
+
+        """
+        return []
+
     def get_rules(self):
         """get_rules.
 
@@ -354,6 +566,9 @@ class Target(object):
         Returns the buffer.
 
         """
+        if self.env_config:
+            self.scons_rule_buf[self.env_config[0]] = self._env_rule()
+            self.env_config = None
         return self.scons_rule_buf
 
     def _convert_string_to_target_helper(self, target_string):
@@ -364,13 +579,13 @@ class Target(object):
         bad_format = False
         if target_string:
             if target_string.startswith('#'):
-                return ('#', target_string[1:])
+                return intern_target_key(('#', target_string[1:]))
             elif target_string.find(':') != -1:
                 path, name = target_string.split(':')
                 path = path.strip()
                 if path.startswith('//'):
                     path = path[2:]
-                return (path, name.strip())
+                return intern_target_key((path, name.strip()))
             else:
                 bad_format = True
         else:
@@ -383,9 +598,10 @@ class Target(object):
 
 
 class SystemLibrary(Target):
+    __slots__ = ()
+
     def __init__(self, name, blade):
         name = name[1:]
         Target.__init__(self, name, 'system_library', [], [], blade, {})
-        self.key = ('#', name)
-        self.fullname = '%s:%s' % self.key
+        self.key = intern_target_key(('#', name))
         self.path = '#'
@@ -24,6 +24,7 @@ import java_jar_target
 import py_targets
 
 from blade_util import var_to_list
+from build_action import BuildAction
 from cc_targets import CcTarget
 from thrift_helper import ThriftHelper
 
@@ -34,6 +35,8 @@ class ThriftLibrary(CcTarget):
     This class is derived from CcTarget.
 
     """
+    __slots__ = ('thrift_helpers',)
+
     def __init__(self,
                  name,
                  srcs,
@@ -75,6 +78,9 @@ class ThriftLibrary(CcTarget):
         # Hardcode deps rule to thrift libraries.
         self._add_hardcode_library(thrift_lib)
 
+        # The generated headers include the headers of thrift
+        self.data['transitive_export_incs'] = True
+
         # Link all the symbols by default
         self.data['link_all_symbols'] = True
         self.data['deprecated'] = deprecated
@@ -87,6 +93,14 @@ class ThriftLibrary(CcTarget):
             self.thrift_helpers[src] = ThriftHelper(
                     os.path.join(self.path, src))
 
+    def get_load_input_files(self):
+        """The thrift files are parsed to get the generated files. """
+        return [os.path.join(self.path, src) for src in self.srcs]
+
+    def get_rules_input_files(self):
+        """The generated files in the rules depend on the thrift files. """
+        return self.get_load_input_files()
+
     def _check_thrift_srcs_name(self, srcs):
         """_check_thrift_srcs_name.
 
@@ -191,17 +205,17 @@ class ThriftLibrary(CcTarget):
         # Build java source according to its option
         env_name = self._env_name()
 
-        self.options = self.blade.get_options()
-        self.direct_targets = self.blade.get_direct_targets()
+        options = self.blade.get_options()
+        direct_targets = self.blade.get_direct_targets()
 
-        if (getattr(self.options, 'generate_java', False) or
+        if (getattr(options, 'generate_java', False) or
             self.data.get('generate_java') or
-            self.key in self.direct_targets):
+            self.key in direct_targets):
             self._thrift_java_rules()
 
-        if (getattr(self.options, 'generate_python', False) or
+        if (getattr(options, 'generate_python', False) or
             self.data.get('generate_python') or
-            self.key in self.direct_targets):
+            self.key in direct_targets):
             self._thrift_python_rules()
 
         self._setup_cc_flags()
@@ -239,6 +253,42 @@ class ThriftLibrary(CcTarget):
             self.data.get('build_dynamic')):
             self._dynamic_cc_library()
 
+    def get_generated_headers(self):
+        """Returns the generated header files. """
+        headers = []
+        for src in self.srcs:
+            headers += [f for f in self._thrift_gen_cpp_files(self.path, src)
+                        if f.endswith('.h')]
+        return headers
+
+    def build_actions(self):
+        """build_actions.
+
+        It returns the build actions according to user options. Only the
+        cc files are generated.
+
+        """
+        self._check_deprecated_deps()
+
+        actions = []
+        sources = []
+        for src in self.srcs:
+            thrift_cpp_files = self._thrift_gen_cpp_files(self.path, src)
+            actions.append(BuildAction('thrift_cc',
+                                       thrift_cpp_files,
+                                       os.path.join(self.path, src)))
+            sources += [f for f in thrift_cpp_files if f.endswith('.cpp')]
+        objects = ['%s.o' % src for src in sources]
+        actions += self._cc_objects_actions(sources, objects,
+                                            self.get_generated_headers())
+
+        actions += self._cc_library_actions(objects)
+        options = self.blade.get_options()
+        if (getattr(options, 'generate_dynamic', False) or
+            self.data.get('build_dynamic')):
+            actions += self._dynamic_cc_library_actions(objects)
+        return actions
+
 
 def thrift_library(name,
                    srcs=[],
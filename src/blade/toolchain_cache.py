@@ -0,0 +1,85 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the toolchain cache module which saves the information probed
+ by running the programs of the toolchain, such as the gcc version, so
+ that they needn't be run again in the next run.
+
+"""
+
+
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import console
+from blade_util import get_program_stamp
+
+
+class ToolchainCache(object):
+    """The on-disk cache of the information probed from the toolchain.
+
+    Each entry is keyed by a name, and records the probed result together
+    with the stamp of the program run to probe it, so the entry is out of
+    date once the program is changed.  The cache is only kept in memory
+    if no cache file is given.
+
+    """
+    def __init__(self, cache_file=None):
+        self.cache_file = cache_file
+        self.entries = None
+
+    def _load(self):
+        """Load the cache file. """
+        self.entries = {}
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            f = open(self.cache_file, 'rb')
+            try:
+                self.entries = pickle.load(f)
+            finally:
+                f.close()
+        except Exception:
+            console.warning('error loading toolchain cache %s, ignored' %
+                            self.cache_file)
+
+    def _save(self):
+        """Write the cache back to disk. """
+        if not self.cache_file:
+            return
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        temp_file = '%s.tmp' % self.cache_file
+        f = open(temp_file, 'wb')
+        try:
+            pickle.dump(self.entries, f, 2)
+        finally:
+            f.close()
+        os.rename(temp_file, self.cache_file)
+
+    def get(self, name, program, probe):
+        """Return the result of probe, which runs the program.
+
+        The probe is only called if there is no cached result or the
+        program is changed.
+
+        """
+        if self.entries is None:
+            self._load()
+        stamp = get_program_stamp(program)
+        entry = self.entries.get(name)
+        if entry and entry[0] == stamp:
+            return entry[1]
+        value = probe()
+        self.entries[name] = (stamp, value)
+        self._save()
+        return value
@@ -0,0 +1,160 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the action cache.
+
+"""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+from blade.action_cache import ActionCache
+
+
+class _FakeScacheManager(object):
+    def __init__(self):
+        self.recorded = []
+
+    def record(self, cache_file):
+        self.recorded.append(cache_file)
+
+
+class _FakeRemoteCache(object):
+    def __init__(self):
+        self.files = {}
+
+    def get(self, kind, name, path):
+        content = self.files.get((kind, name))
+        if content is None:
+            return False
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        f = open(path, 'wb')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        return True
+
+    def put(self, kind, name, path):
+        self.files[(kind, name)] = open(path, 'rb').read()
+
+
+class TestActionCache(unittest.TestCase):
+    """Test the action cache in a temp dir. """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.temp_dir, 'cache')
+        self.scache_manager = _FakeScacheManager()
+        self.cache = ActionCache(self.cache_path, self.scache_manager)
+        self.outputs = [os.path.join(self.temp_dir, 'a.pb.h'),
+                        os.path.join(self.temp_dir, 'a.pb.cc')]
+        self.key = ActionCache.key(['protoc a.proto', 'digest'], self.outputs,
+                                   [('a.proto', 'csig')])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _write_outputs(self):
+        for output in self.outputs:
+            f = open(output, 'w')
+            try:
+                f.write(os.path.basename(output))
+            finally:
+                f.close()
+
+    def _remove_outputs(self):
+        for output in self.outputs:
+            if os.path.exists(output):
+                os.remove(output)
+
+    def testKey(self):
+        """Test that the key changes with everything the action depends on. """
+        signature = ['protoc a.proto', 'digest']
+        inputs = [('a.proto', 'csig')]
+        self.assertEqual(ActionCache.key(signature, self.outputs, inputs),
+                         self.key)
+        keys = set([
+                self.key,
+                ActionCache.key(['protoc -I. a.proto', 'digest'],
+                                self.outputs, inputs),
+                ActionCache.key(['protoc a.proto', 'new digest'],
+                                self.outputs, inputs),
+                ActionCache.key(signature, self.outputs[:1], inputs),
+                ActionCache.key(signature, self.outputs,
+                                [('a.proto', 'new csig')]),
+                ActionCache.key(signature, self.outputs,
+                                inputs + [('b.proto', 'csig')])])
+        self.assertEqual(len(keys), 6)
+
+    def testMiss(self):
+        """Test that nothing is retrieved if the action is not cached. """
+        self.assertFalse(self.cache.retrieve(self.key, self.outputs))
+        for output in self.outputs:
+            self.assertFalse(os.path.exists(output))
+
+    def testHit(self):
+        """Test that the stored outputs are retrieved. """
+        self._write_outputs()
+        self.cache.store(self.key, self.outputs)
+        self.assertEqual(len(self.scache_manager.recorded), 2)
+        self._remove_outputs()
+
+        self.assertTrue(self.cache.retrieve(self.key, self.outputs))
+        for output in self.outputs:
+            self.assertEqual(open(output).read(), os.path.basename(output))
+        self.assertEqual(len(self.scache_manager.recorded), 4)
+
+        # The outputs of other actions are not retrieved
+        other_key = ActionCache.key(['protoc a.proto', 'digest'], self.outputs,
+                                    [('a.proto', 'new csig')])
+        self.assertFalse(self.cache.retrieve(other_key, self.outputs))
+
+    def testPartialOutputs(self):
+        """Test that it is a miss if any output is missing in the cache. """
+        self._write_outputs()
+        self.cache.store(self.key, self.outputs)
+        self._remove_outputs()
+        os.remove(self.cache._cache_file(self.key, 1))
+        self.assertFalse(self.cache.retrieve(self.key, self.outputs))
+        for output in self.outputs:
+            self.assertFalse(os.path.exists(output))
+
+    def testStoreMissingOutputs(self):
+        """Test that nothing is stored if any output is not generated. """
+        self._write_outputs()
+        os.remove(self.outputs[1])
+        self.cache.store(self.key, self.outputs)
+        self.assertEqual(self.scache_manager.recorded, [])
+        self.assertFalse(os.path.exists(self.cache._cache_file(self.key, 0)))
+
+    def testRemoteCache(self):
+        """Test that the outputs are shared by the remote cache. """
+        remote_cache = _FakeRemoteCache()
+        cache = ActionCache(self.cache_path, remote_cache=remote_cache)
+        self._write_outputs()
+        cache.store(self.key, self.outputs)
+        self.assertEqual(len(remote_cache.files), 2)
+        self._remove_outputs()
+
+        # Downloaded on the other machine
+        cache = ActionCache(os.path.join(self.temp_dir, 'other'),
+                            remote_cache=remote_cache)
+        self.assertTrue(cache.retrieve(self.key, self.outputs))
+        for output in self.outputs:
+            self.assertEqual(open(output).read(), os.path.basename(output))
+
+
+if __name__ == '__main__':
+    blade_test.run(TestActionCache)
@@ -16,23 +16,31 @@ import sys
 import unittest
 
 sys.path.append('..')
+from action_cache_test import TestActionCache
+from blade_util_test import TestBladeUtil
+from build_environment_test import TestScacheManager
 from cc_binary_test import TestCcBinary
 from cc_library_test import TestCcLibrary
 from cc_plugin_test import TestCcPlugin
 from cc_test_test import TestCcTest
+from concurrency_controller_test import TestConcurrencyController
+from fast_link_test import TestFastLink
 from gen_rule_test import TestGenRule
 from java_jar_test import TestJavaJar
 from lex_yacc_test import TestLexYacc
+from link_scheduler_test import TestLinkScheduler
 from load_builds_test import TestLoadBuilds
 from proto_library_test import TestProtoLibrary
 from prebuild_cc_library_test import TestPrebuildCcLibrary
 from query_target_test import TestQuery
+from remote_cache_test import TestRemoteCache
 from resource_library_test import TestResourceLibrary
 from swig_library_test import TestSwigLibrary
 from target_dependency_test import TestDepsAnalyzing
 
 from html_test_runner import HTMLTestRunner
 from test_target_test import TestTestRunner
+from thrift_library_test import TestThriftLibrary
 
 
 def _main():
@@ -40,19 +48,27 @@ def _main():
     suite_test = unittest.TestSuite()
     suite_test.addTests([
         unittest.defaultTestLoader.loadTestsFromTestCase(TestCcLibrary),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestActionCache),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestBladeUtil),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestScacheManager),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestCcBinary),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestCcPlugin),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestCcTest),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestConcurrencyController),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestFastLink),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestGenRule),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestJavaJar),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestLexYacc),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestLinkScheduler),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestLoadBuilds),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestProtoLibrary),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestResourceLibrary),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestSwigLibrary),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestDepsAnalyzing),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestQuery),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestRemoteCache),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestTestRunner),
+        unittest.defaultTestLoader.loadTestsFromTestCase(TestThriftLibrary),
         unittest.defaultTestLoader.loadTestsFromTestCase(TestPrebuildCcLibrary)
         ])
 
@@ -0,0 +1,76 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the utilities of blade.
+
+"""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+from blade.blade_util import get_blade_digest
+from blade.blade_util import get_program_digest
+from blade.blade_util import md5sum_file
+
+
+class TestBladeUtil(unittest.TestCase):
+    """Test the utilities of blade. """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cur_dir = os.getcwd()
+
+    def tearDown(self):
+        os.chdir(self.cur_dir)
+        shutil.rmtree(self.temp_dir)
+
+    def _write_program(self, path, content):
+        f = open(path, 'w')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+        os.chmod(path, 0755)
+
+    def testProgramDigest(self):
+        """Test that the digest of a program depends only on its content. """
+        os.chdir(self.temp_dir)
+        os.mkdir('bin')
+        program = os.path.join('bin', 'protoc')
+        self._write_program(program, '#!/bin/sh\necho 1\n')
+        digest = get_program_digest(program)
+        self.assertEqual(digest, md5sum_file(program))
+
+        # The same content installed at another time on another machine
+        os.utime(program, (0, 0))
+        self.assertEqual(get_program_digest(program), digest)
+        other_program = os.path.join(self.temp_dir, 'protoc')
+        self._write_program(other_program, '#!/bin/sh\necho 1\n')
+        self.assertEqual(get_program_digest(other_program), digest)
+
+        self._write_program(program, '#!/bin/sh\necho 2\n')
+        os.utime(program, (1, 1))
+        self.assertNotEqual(get_program_digest(program), digest)
+
+        # The program which is not found is not fingerprinted
+        self.assertEqual(get_program_digest('bin/missing'), None)
+        self.assertEqual(get_program_digest('blade-missing-program'), None)
+
+    def testBladeDigest(self):
+        """Test that the digest of blade is stable. """
+        self.assertEqual(len(get_blade_digest()), 32)
+        self.assertEqual(get_blade_digest(), get_blade_digest())
+
+
+if __name__ == '__main__':
+    blade_test.run(TestBladeUtil)
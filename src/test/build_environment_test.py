@@ -0,0 +1,194 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the scons cache manager.
+
+"""
+
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+from blade.build_environment import ScacheManager
+
+
+class TestScacheManager(unittest.TestCase):
+    """Test the index and the eviction of the scons cache manager. """
+    def setUp(self):
+        self.cache_path = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.cache_path, '.blade_cache_index')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_path)
+
+    def _write_cache_file(self, path, size):
+        cache_file = os.path.join(self.cache_path, path)
+        if not os.path.isdir(os.path.dirname(cache_file)):
+            os.makedirs(os.path.dirname(cache_file))
+        f = open(cache_file, 'wb')
+        try:
+            f.write('x' * size)
+        finally:
+            f.close()
+        return cache_file
+
+    def _write_index(self, content):
+        f = open(self.index_path, 'w')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+
+    def _read_index(self):
+        f = open(self.index_path)
+        try:
+            return f.readlines()
+        finally:
+            f.close()
+
+    def _open(self, cache_limit=1000):
+        manager = ScacheManager(self.cache_path, cache_limit)
+        manager.open()
+        return manager
+
+    def testLoadIndex(self):
+        """Test replaying the index log. """
+        self._write_index('100 10 a/a1\n'
+                          '101 20 b/b1\n'
+                          '102 30 a/a1\n'
+                          'bad record\n'
+                          '- b/b1\n'
+                          '103 40 c/c1\n'
+                          '104 50 d/d')
+        manager = self._open()
+        self.assertEqual(manager.entries, {'a/a1': (102, 30),
+                                           'c/c1': (103, 40)})
+        self.assertEqual(manager.total_size, 70)
+        self.assertEqual(manager.index_records, 6)
+        manager.close()
+
+    def testScanCacheDir(self):
+        """Test that the index is built from the cache dir at first. """
+        self._write_cache_file('a/a1', 10)
+        self._write_cache_file('b/b1', 20)
+        manager = self._open()
+        self.assertEqual(sorted(manager.entries.keys()), ['a/a1', 'b/b1'])
+        self.assertEqual(manager.total_size, 30)
+        manager.close()
+        self.assertEqual(len(self._read_index()), 2)
+
+    def testCompaction(self):
+        """Test that the index is rewritten when it is too long. """
+        records = ['%d 10 a/a1\n' % atime for atime in range(1010)]
+        self._write_index(''.join(records) + '1010 20 b/b1\n')
+        manager = self._open()
+        self.assertEqual(manager.index_records, 2)
+        self.assertEqual(sorted(self._read_index()),
+                         ['1009 10 a/a1\n', '1010 20 b/b1\n'])
+        manager.close()
+
+        # Not compacted if it is not long enough
+        self._write_index(''.join(records[:1000]))
+        manager = self._open()
+        self.assertEqual(manager.index_records, 1000)
+        manager.close()
+        self.assertEqual(len(self._read_index()), 1000)
+
+    def testEvict(self):
+        """Test that the least recently used files are evicted. """
+        records = []
+        for i in range(10):
+            path = '%d/f' % i
+            self._write_cache_file(path, 100)
+            # The later files are used earlier
+            records.append('%d 100 %s\n' % (1000 - i, path))
+        self._write_index(''.join(records))
+        manager = self._open()
+        self.assertEqual(manager.total_size, 1000)
+        self.assertEqual(manager.evict_thread, None)
+
+        manager.record(self._write_cache_file('new/f', 200))
+        manager.close()
+        # Evicted down to the low water mark of 900
+        self.assertEqual(manager.total_size, 900)
+        self.assertEqual(manager.purge_cnt, 1)
+        for i in range(7):
+            self.assertTrue(os.path.exists(
+                    os.path.join(self.cache_path, '%d/f' % i)))
+        for i in range(7, 10):
+            self.assertFalse(os.path.exists(
+                    os.path.join(self.cache_path, '%d/f' % i)))
+        self.assertTrue('- 9/f\n' in self._read_index())
+
+        # The index is the same after replaying
+        entries = manager.entries
+        manager = self._open()
+        self.assertEqual(manager.entries, entries)
+        manager.close()
+
+    def testRecordDuringEvict(self):
+        """Test that the file recorded after it is selected is kept. """
+        records = []
+        for i in range(3):
+            path = '%d/f' % i
+            self._write_cache_file(path, 100)
+            records.append('%d 100 %s\n' % (1000 + i, path))
+        self._write_index(''.join(records))
+        manager = ScacheManager(self.cache_path, 250)
+        remove_victims = manager._remove_victims
+
+        def record_then_remove_victims(victims):
+            manager.record(os.path.join(self.cache_path, '0/f'))
+            return remove_victims(victims)
+
+        manager._remove_victims = record_then_remove_victims
+        manager.open()
+        manager.close()
+        self.assertTrue(os.path.exists(os.path.join(self.cache_path, '0/f')))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_path, '1/f')))
+        self.assertEqual(sorted(manager.entries.keys()), ['0/f', '2/f'])
+
+    def testConcurrentRecord(self):
+        """Test that the index matches the files when recording while evicting. """
+        cache_files = [self._write_cache_file('%d/f' % i, 10)
+                       for i in range(100)]
+        manager = ScacheManager(self.cache_path, 500)
+        manager.open()
+
+        def record(cache_files):
+            for i in range(5):
+                for cache_file in cache_files:
+                    manager.record(cache_file)
+
+        threads = [threading.Thread(target=record, args=(cache_files[i::4],))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        manager.close()
+
+        for path in manager.entries:
+            self.assertTrue(os.path.exists(os.path.join(self.cache_path, path)))
+        self.assertEqual(manager.total_size,
+                         sum([size for (atime, size)
+                              in manager.entries.values()]))
+        entries = manager.entries
+        manager = self._open(500)
+        self.assertEqual(sorted(manager.entries.keys()), sorted(entries.keys()))
+        manager.close()
+
+
+if __name__ == '__main__':
+    blade_test.run(TestScacheManager)
@@ -57,6 +57,18 @@ class TestCcBinary(blade_test.TargetTest):
         self.assertTrue('liblowercase.a' in string_main_depends_libs)
         self.assertTrue('libuppercase.a' in string_main_depends_libs)
 
+    def testSplitDebug(self):
+        """Test that the debug information is split and packaged. """
+        self.tearDown()
+        self.doSetUp('test_cc_binary', backend='ninja',
+                     split_debug=True, dwp=True)
+        rules = ''.join(self.blade.generate_build_rules())
+        self.assertTrue('-gsplit-dwarf' in rules)
+        binary = 'build64_release/test_cc_binary/string_main_prog'
+        self.assertTrue('build %s.dwp: command %s\n'
+                        '  cmd = dwp -e %s -o %s.dwp\n' % (
+                        binary, binary, binary, binary) in rules)
+
 
 if __name__ == '__main__':
     blade_test.run(TestCcBinary)
@@ -11,8 +11,15 @@
 """
 
 
+import os
+import subprocess
+import sys
+
 import blade_test
 
+sys.path.append('..')
+import blade.rules_generator
+
 
 class TestCcLibrary(blade_test.TargetTest):
     """Test cc_library """
@@ -66,6 +73,234 @@ class TestCcLibrary(blade_test.TargetTest):
         self.assertTrue('liblowercase.so' in string_depends_libs)
         self.assertTrue('libuppercase.so' in string_depends_libs)
 
+    def testReuseRules(self):
+        """Test that the rules are reused when nothing is changed. """
+        saved_scons_path = os.path.join(self.current_building_path,
+                                        '.blade.sconstruct')
+        rules = []
+        for verbose in (True, True, False):
+            self.tearDown()
+            self.doSetUp('test_cc_library', build_cache=True, verbose=verbose)
+            rules.append(''.join(self.blade.generate_build_rules()))
+            self.assertTrue(os.path.exists(saved_scons_path))
+            self.assertEqual(open('SConstruct').read(), rules[-1])
+        self.assertEqual(rules[0], rules[1])
+        self.assertNotEqual(rules[1], rules[2])
+        os.remove(saved_scons_path)
+
+    def testReuseFragments(self):
+        """Test that the unchanged SConscript fragments are not rewritten. """
+        fragment_path = os.path.join(self.current_building_path,
+                                     self.target_path, 'SConscript')
+        fragments_index_path = os.path.join(self.current_building_path,
+                                            '.blade.sconscripts')
+        mtimes = []
+        for i in range(2):
+            self.tearDown()
+            self.doSetUp('test_cc_library', build_cache=True)
+            rules = self.blade.generate_build_rules()
+            self.assertEqual(rules[-1], 'execfile("%s")\n' % fragment_path)
+            mtimes.append(os.path.getmtime(fragment_path))
+            os.utime(fragment_path, (0, 0))
+        self.assertEqual(mtimes[1], 0)
+        self.assertTrue('plowercase.cpp' in open(fragment_path).read())
+        self.assertTrue(self.dryRun())
+        os.remove(fragments_index_path)
+        os.remove(os.path.join(self.current_building_path, '.blade.sconstruct'))
+
+    def testGenerateNinja(self):
+        """Test that build.ninja is generated correctly. """
+        self.tearDown()
+        self.doSetUp('test_cc_library', backend='ninja')
+        rules = ''.join(self.blade.generate_build_rules())
+        ninja_path = os.path.join(self.current_building_path, 'build.ninja')
+        self.assertEqual(open(ninja_path).read(), rules)
+        self.assertFalse(os.path.exists('SConstruct'))
+
+        self.assertTrue('deps = gcc' in rules)
+        self.assertTrue('depfile = $out.d' in rules)
+        self.assertTrue('build build64_release/test_cc_library/lowercase.objs/'
+                        'plowercase.cpp.o: cxx test_cc_library/plowercase.cpp'
+                        in rules)
+        self.assertTrue('  target_cppflags = -w -DBLADE_STR_DEF -O2' in rules)
+        self.assertEqual(rules.count('  warnings = $cpp_warnings $cxx_warnings'), 2)
+        self.assertTrue('build build64_release/test_cc_library/uppercase.objs/'
+                        'pcharacter.c.o: cc test_cc_library/pcharacter.c\n'
+                        '  target_cppflags = -O2 -fno-omit-frame-pointer\n'
+                        '  warnings = $cpp_warnings $c_warnings\n' in rules)
+        self.assertTrue('build build64_release/test_cc_library/'
+                        'libblade_string.so: solink' in rules)
+        self.assertTrue('  libs = build64_release/test_cc_library/liblowercase.so '
+                        'build64_release/test_cc_library/libuppercase.so' in rules)
+        self.assertTrue('build test_cc_library$:blade_string: phony' in rules)
+
+    def testThinArchive(self):
+        """Test that the static libraries are created by ar in one step. """
+        for thin_archive in (False, True):
+            self.tearDown()
+            self.doSetUp('test_cc_library', backend='ninja',
+                         thin_archive=thin_archive)
+            rules = ''.join(self.blade.generate_build_rules())
+            self.assertTrue('  command = rm -f $out && ar $arflags $out $in\n'
+                            in rules)
+            ar_modifiers = self.blade.build_environment.ar_modifiers
+            arflags = 'rcs'
+            thin_arflags = 'rcs'
+            if 'T' in ar_modifiers:
+                thin_arflags += 'T'
+            if 'D' in ar_modifiers:
+                arflags += 'D'
+                thin_arflags += 'D'
+            self.assertTrue('\narflags = %s\n' % arflags in rules)
+            self.assertTrue('\nthin_arflags = %s\n' % thin_arflags in rules)
+            # Only the intermediate libraries are thin archives
+            statements = rules.split('\nbuild ')
+            for name in ('lowercase', 'uppercase'):
+                statement = [s for s in statements if s.startswith(
+                        'build64_release/test_cc_library/lib%s.a: ar ' %
+                        name)][0]
+                self.assertEqual('\n  arflags = $thin_arflags' in statement,
+                                 thin_archive)
+            statement = [s for s in statements if s.startswith(
+                    'build64_release/test_cc_library/libblade_string.a: ar ')]
+            self.assertFalse('arflags' in statement[0])
+
+        # The flags are expanded in the native backend
+        self.tearDown()
+        self.doSetUp('test_cc_library', backend='native', thin_archive=True)
+        commands = ''.join(self.blade.generate_build_rules())
+        self.assertTrue('ar %s build64_release/test_cc_library/liblowercase.a ' %
+                        thin_arflags in commands)
+        self.assertTrue('ar %s build64_release/test_cc_library/'
+                        'libblade_string.a ' % arflags in commands)
+
+    def testThinArchiveScons(self):
+        """Test that the libraries opting out are full archives in scons. """
+        self.tearDown()
+        self.doSetUp('test_cc_library', thin_archive=True)
+        self.blade.generate_build_rules()
+        fragment = open('build64_release/test_cc_library/SConscript').read()
+        self.assertTrue('.Library("build64_release/test_cc_library/lowercase", '
+                        'objs_v_test_cc_library_mAgIc_lowercase, '
+                        'ARFLAGS="$THIN_ARFLAGS")' in fragment)
+        self.assertTrue('.Library("build64_release/test_cc_library/'
+                        'blade_string", '
+                        'objs_v_test_cc_library_mAgIc_blade_string)' in fragment)
+
+    def testGenerateNative(self):
+        """Test that the native actions are generated correctly. """
+        self.tearDown()
+        self.doSetUp('test_cc_library', backend='native')
+        commands = self.blade.generate_build_rules()
+        self.assertFalse(os.path.exists('SConstruct'))
+        self.assertFalse(os.path.exists(
+                os.path.join(self.current_building_path, 'build.ninja')))
+
+        com_lower_line = ''
+        for command in commands:
+            if 'plowercase.cpp.o -MMD' in command:
+                com_lower_line = command
+        self.assertCxxFlags(com_lower_line)
+        self.assertTrue('-MF build64_release/test_cc_library/lowercase.objs/'
+                        'plowercase.cpp.o.d' in com_lower_line)
+        self.assertTrue(com_lower_line.endswith(
+                ' test_cc_library/plowercase.cpp\n'))
+        self.assertTrue('$' not in ''.join(commands))
+
+    def testExportIncs(self):
+        """Test that export_incs are only propagated to the direct dependers. """
+        self.tearDown()
+        self.doSetUp('test_cc_export_incs')
+        targets = self.blade.get_build_targets()
+        middle = targets[(self.target_path, 'middle')]
+        top = targets[(self.target_path, 'top')]
+
+        base_inc = 'test_cc_export_incs/base_inc'
+        middle_inc = 'test_cc_export_incs/middle_inc'
+        wrapper_inc = 'test_cc_export_incs/wrapper_inc'
+        self.assertTrue(base_inc in middle._get_incs_list())
+
+        # base_inc is reexported by the wrapper
+        incs = top._get_incs_list()
+        self.assertEqual(incs.count(base_inc), 1)
+        self.assertTrue(middle_inc in incs)
+        self.assertTrue(wrapper_inc in incs)
+
+        # base_inc is only seen by the app if it is transitive
+        app = targets[(self.target_path, 'app')]
+        self.assertFalse(base_inc in app._get_incs_list())
+        self.assertTrue(base_inc in app._get_incs_list(True))
+        self.assertEqual(app.get_include_paths_reduction(), (1, 2))
+
+    def testPrecompiledHeader(self):
+        """Test that the c++ sources are compiled with the pch. """
+        self.tearDown()
+        self.doSetUp('test_cc_pch', backend='ninja')
+        rules = ''.join(self.blade.generate_build_rules())
+        library = self.blade.get_build_targets()[(self.target_path, 'strings')]
+        pch_header = library._pch_header_path()
+        self.assertTrue(pch_header.startswith('build64_release/test_cc_pch/.pch/'))
+
+        # The pch is shared by the targets with the same flags
+        self.assertEqual(rules.count('build %s.gch: pch test_cc_pch/common.h\n'
+                                     % pch_header), 1)
+        self.assertEqual(rules.count(': cxx test_cc_pch/strings.cpp | %s.gch\n'
+                                     % pch_header), 1)
+        self.assertEqual(rules.count('-Winvalid-pch -include %s\n'
+                                     % pch_header), 3)
+        self.assertTrue('build build64_release/test_cc_pch/strings.objs/'
+                        'plain.c.o: cc test_cc_pch/plain.c\n' in rules)
+        self.assertFalse('-fpch-preprocess' in rules)
+
+        # The header to include is there, the sources could be preprocessed
+        self.assertEqual(open(pch_header).read(),
+                         '// This file was automatically generated by blade\n'
+                         '#include "../../../../test_cc_pch/common.h"\n')
+        self.assertEqual(subprocess.call(
+                ['g++', '-E', '-o', os.devnull, '-Winvalid-pch',
+                 '-include', pch_header, 'test_cc_pch/strings.cpp']), 0)
+
+    def testPrecompiledHeaderWithCcache(self):
+        """Test that the pch is kept in the sources preprocessed by ccache,
+
+           but not by distcc, which compiles them on other hosts.
+
+        """
+        header_generator = blade.rules_generator.SconsFileHeaderGenerator
+        build_with_distcc = header_generator._build_with_distcc
+        try:
+            for distcc in (False, True):
+                self.tearDown()
+                self.doSetUp('test_cc_pch', backend='ninja')
+                build_environment = self.blade.build_environment
+                build_environment._BuildEnvironment__ccache_installed = True
+                header_generator._build_with_distcc = lambda self: distcc
+                rules = ''.join(self.blade.generate_build_rules())
+                self.assertEqual('\ncxxflags = -fpch-preprocess\n' in rules,
+                                 not distcc)
+        finally:
+            header_generator._build_with_distcc = build_with_distcc
+
+    def testUnityBuild(self):
+        """Test that the sources are compiled in unity chunks. """
+        self.tearDown()
+        self.doSetUp('test_cc_unity', backend='ninja')
+        rules = ''.join(self.blade.generate_build_rules())
+        chunk = 'build64_release/test_cc_unity/numbers.unity/chunk_0.cpp'
+        self.assertEqual(open(chunk).read(),
+                         '// This file was automatically generated by blade\n'
+                         '#include "../../../test_cc_unity/one.cpp"\n'
+                         '#include "../../../test_cc_unity/two.cpp"\n'
+                         '#include "../../../test_cc_unity/three.cpp"\n')
+        self.assertTrue('build %s.o: cxx %s\n' % (chunk, chunk) in rules)
+        self.assertTrue(': cxx test_cc_unity/conflict.cpp\n' in rules)
+        self.assertTrue(': cc test_cc_unity/plain.c\n' in rules)
+        self.assertFalse(': cxx test_cc_unity/one.cpp\n' in rules)
+
+        # A single source is not put into a chunk
+        self.assertTrue(': cxx test_cc_unity/numbers_main.cpp\n' in rules)
+        self.assertFalse(os.path.exists(
+                'build64_release/test_cc_unity/numbers_main.unity'))
 
 if __name__ == '__main__':
     blade_test.run(TestCcLibrary)
@@ -11,6 +11,8 @@
 """
 
 
+import os
+
 import blade_test
 
 
@@ -58,6 +60,50 @@ class TestCcTest(blade_test.TargetTest):
         self.assertTrue('liblowercase.a' in string_main_depends_libs)
         self.assertTrue('libuppercase.a' in string_main_depends_libs)
 
+    def testSharedObjects(self):
+        """Test that the sources with the same flags are compiled once. """
+        self.tearDown()
+        self.doSetUp('test_cc_shared_objects', backend='ninja')
+        rules = ''.join(self.blade.generate_build_rules())
+        self.assertEqual(rules.count(': cxx test_cc_shared_objects/test_helper.cpp'), 2)
+        for name in ('first_test', 'second_test', 'third_test'):
+            link_line = rules[rules.index('%s: link' % name):]
+            link_line = link_line[:link_line.index('\n')]
+            self.assertTrue('/.shared_objs/' in link_line)
+        self.assertTrue('build build64_release/test_cc_shared_objects/first_test.objs/'
+                        'first_test.cpp.o: cxx' in rules)
+
+        self.tearDown()
+        self.doSetUp('test_cc_shared_objects')
+        self.blade.generate_build_rules()
+        self.assertTrue(self.dryRun())
+        helper_lines = [line for line in self.scons_output
+                        if 'test_helper.cpp.o -c' in line]
+        self.assertEqual(len(helper_lines), 2)
+        self.assertTrue('-DTHIRD_TEST' in ''.join(helper_lines))
+
+    def testSharedEnvs(self):
+        """Test that the targets with the same flags share the env. """
+        self.tearDown()
+        self.doSetUp('test_cc_shared_objects')
+        self.blade.generate_build_rules()
+        fragment_path = os.path.join(self.current_building_path,
+                                     'test_cc_shared_objects', 'SConscript')
+        rules = open(fragment_path).read()
+        self.assertFalse('.Clone()' in rules)
+        keys = {}
+        for line in rules.splitlines():
+            if ' = intern_env(' in line:
+                name = line.split(' = ')[0]
+                keys[name] = line.split('"')[1]
+        first_env = 'env_v_test_cc_shared_objects_mAgIc_first_test'
+        second_env = 'env_v_test_cc_shared_objects_mAgIc_second_test'
+        third_env = 'env_v_test_cc_shared_objects_mAgIc_third_test'
+        self.assertEqual(keys[first_env], keys[second_env])
+        self.assertNotEqual(keys[first_env], keys[third_env])
+        self.assertTrue(self.dryRun())
+
+
 
 if __name__ == '__main__':
     blade_test.run(TestCcTest)
@@ -0,0 +1,132 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the concurrency controller.
+
+"""
+
+
+import sys
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+import blade.concurrency_controller
+from blade.concurrency_controller import ConcurrencyController
+from blade.concurrency_controller import _parse_distcc_host
+from blade.concurrency_controller import estimate_distcc_jobs
+
+
+_M = 1024 * 1024
+
+
+class TestConcurrencyController(unittest.TestCase):
+    """Test the concurrency controller with the load and memory stubbed. """
+    def setUp(self):
+        self.load = (1.0, 1)
+        self.available = 8000 * _M
+        self.probed_hosts = []
+        module = blade.concurrency_controller
+        self.saved = (module.get_load, module.get_available_memory,
+                      module.probe_distcc_hosts)
+        module.get_load = lambda: self.load
+        module.get_available_memory = lambda: self.available
+        module.probe_distcc_hosts = self._probe_distcc_hosts
+
+    def tearDown(self):
+        module = blade.concurrency_controller
+        (module.get_load, module.get_available_memory,
+         module.probe_distcc_hosts) = self.saved
+
+    def _probe_distcc_hosts(self, hosts):
+        self.probed_hosts.append(hosts)
+        return [('host1', 4, 0.01), ('host2', 4, None)]
+
+    def _controller(self, max_jobs, limit, **kwargs):
+        controller = ConcurrencyController(max_jobs, interval=0, **kwargs)
+        controller.cpu_count = 4
+        controller.limit = limit
+        return controller
+
+    def testParseDistccHost(self):
+        """Test parsing the hosts in DISTCC_HOSTS. """
+        self.assertEqual(_parse_distcc_host('localhost'), (None, None, 2))
+        self.assertEqual(_parse_distcc_host('localhost/8'), (None, None, 8))
+        self.assertEqual(_parse_distcc_host('host1'), ('host1', 3632, 4))
+        self.assertEqual(_parse_distcc_host('host1:4000/6'),
+                         ('host1', 4000, 6))
+        self.assertEqual(_parse_distcc_host('host1/10,lzo'),
+                         ('host1', 3632, 10))
+        self.assertEqual(_parse_distcc_host('user@host2/3'),
+                         ('user@host2', None, 3))
+        self.assertEqual(_parse_distcc_host('@host3'), ('@host3', None, 4))
+        self.assertEqual(_parse_distcc_host('--randomize'), None)
+        self.assertEqual(_parse_distcc_host('+zeroconf'), None)
+        self.assertEqual(_parse_distcc_host(''), None)
+
+    def testEstimateDistccJobs(self):
+        """Test that the down hosts are skipped and the slow are halved. """
+        self.assertEqual(estimate_distcc_jobs([('host1', 4, 0.01),
+                                               ('host2', 4, None),
+                                               ('host3', 6, 0.5),
+                                               ('localhost', 2, 0)]), 9)
+        self.assertEqual(estimate_distcc_jobs([('host1', 3, 0.3)]), 1)
+        self.assertEqual(estimate_distcc_jobs([('host1', 4, None)]), 0)
+        self.assertEqual(estimate_distcc_jobs([]), 0)
+
+    def testLowMemory(self):
+        """Test that the limit is halved when the memory is low. """
+        controller = self._controller(16, 6)
+        self.available = 100 * _M
+        self.assertEqual(controller.adjust(), 3)
+        self.assertEqual(controller.adjust(), 1)
+        self.assertEqual(controller.adjust(), 1)
+        self.assertEqual(controller.min_limit, 1)
+
+    def testOverloaded(self):
+        """Test that the limit is decreased when the cpu is overloaded. """
+        controller = self._controller(16, 6)
+        self.load = (8.0, 8)
+        self.assertEqual(controller.adjust(), 5)
+        # Not overloaded if the runnable processes are at most 1.25 times
+        self.load = (5.0, 5)
+        controller.runnable = None
+        self.assertEqual(controller.adjust(), 5)
+
+    def testIdle(self):
+        """Test that the limit is increased if all the commands are running. """
+        controller = self._controller(16, 6)
+        self.load = (1.0, 1)
+        self.assertEqual(controller.adjust(), 6)
+        controller.running = 6
+        self.assertEqual(controller.adjust(), 7)
+        self.assertEqual(controller.max_limit, 7)
+
+    def testCap(self):
+        """Test that the limit is at most max_jobs and the distcc capacity. """
+        controller = self._controller(5, 5)
+        controller.running = 5
+        self.assertEqual(controller.adjust(), 5)
+
+        controller = self._controller(16, 3, distcc_hosts=['localhost/3'],
+                                      distcc_jobs=3)
+        controller.running = 3
+        self.assertEqual(controller.adjust(), 3)
+        self.assertEqual(controller.distcc_jobs, 3)
+        self.assertEqual(self.probed_hosts, [])
+
+    def testProbeDistccHosts(self):
+        """Test that the hosts are probed if not probed before building. """
+        controller = ConcurrencyController(16, distcc_hosts=['host1', 'host2'])
+        self.assertEqual(self.probed_hosts, [['host1', 'host2']])
+        self.assertEqual(controller.distcc_jobs, 4)
+        self.assertEqual(controller.limit, 4)
+
+
+if __name__ == '__main__':
+    blade_test.run(TestConcurrencyController)
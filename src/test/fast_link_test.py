@@ -0,0 +1,118 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the fast link on tmpfs.
+
+"""
+
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+import blade.fast_link
+from blade.fast_link import FastLinker
+from blade.fast_link import _archive_size
+from blade.fast_link import find_tmpfs_dirs
+
+
+class TestFastLink(unittest.TestCase):
+    """Test the fast link with the space of tmpfs stubbed. """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.space = (500, 1000)
+        self.get_space = blade.fast_link.get_space
+        blade.fast_link.get_space = lambda path: self.space
+
+    def tearDown(self):
+        blade.fast_link.get_space = self.get_space
+        shutil.rmtree(self.temp_dir)
+
+    def _path(self, name):
+        return os.path.join(self.temp_dir, name)
+
+    def _write(self, name, size):
+        f = open(self._path(name), 'wb')
+        try:
+            f.write('x' * size)
+        finally:
+            f.close()
+        return self._path(name)
+
+    def testFindTmpfsDirs(self):
+        """Test that only the writable tmpfs mount points are found. """
+        for name in ('rw', 'ro', 'with space', 'ext4'):
+            os.mkdir(self._path(name))
+        mounts = self._path('mounts')
+        f = open(mounts, 'w')
+        f.write('tmpfs %s tmpfs rw,nosuid,nodev 0 0\n' % self._path('rw'))
+        f.write('tmpfs %s tmpfs ro,nosuid 0 0\n' % self._path('ro'))
+        f.write('tmpfs %s tmpfs rw 0 0\n' %
+                self._path('with space').replace(' ', '\\040'))
+        f.write('tmpfs %s tmpfs rw,noexec 0 0\n' % self._path('rw'))
+        f.write('/dev/sda1 %s ext4 rw,relatime 0 0\n' % self._path('ext4'))
+        f.write('tmpfs %s tmpfs rw 0 0\n' % self._path('missing'))
+        f.write('tmpfs\n')
+        f.close()
+        self.assertEqual(find_tmpfs_dirs(mounts),
+                         [self._path('rw'), self._path('with space')])
+        self.assertEqual(find_tmpfs_dirs(self._path('no_mounts')), [])
+
+    def testArchiveSize(self):
+        """Test the size of the thin and the normal archives. """
+        objects = [self._write('a.o', 1000), self._write('b.o', 3001)]
+        thin = self._path('libthin.a')
+        normal = self._path('libnormal.a')
+        subprocess.check_call(['ar', 'rcT', thin] + objects)
+        subprocess.check_call(['ar', 'rc', normal] + objects)
+        # The objects and the tables in the headers of the thin archive
+        size = _archive_size(thin)
+        self.assertTrue(4001 <= size < 4001 + os.path.getsize(thin))
+        self.assertEqual(_archive_size(normal), os.path.getsize(normal))
+
+    def testReserve(self):
+        """Test that 10% of tmpfs is kept free for the running links. """
+        linker = FastLinker(self.temp_dir, self._path('history'))
+        self.assertTrue(linker.reserve('a', 300))
+        # The space reserved by the running links is not available
+        self.assertFalse(linker.reserve('b', 150))
+        self.assertTrue(linker.reserve('b', 100))
+        self.assertEqual(linker.reserved, {'a': 300, 'b': 100})
+        self.assertFalse(linker.reserve('c', 1))
+        linker.release('a')
+        self.assertTrue(linker.reserve('c', 300))
+        self.assertFalse(linker.reserve('d', 1))
+        linker.release('b')
+        linker.release('c')
+        self.assertEqual(linker.reserved, {})
+
+        self.space = None
+        self.assertFalse(linker.reserve('a', 1))
+
+    def testAccount(self):
+        """Test that the time of the links on disk is saved. """
+        history = self._path('history')
+        linker = FastLinker(self.temp_dir, history)
+        linker.account('a', 3.0, False)
+        linker.account('b', 1.0, True)
+        linker.close()
+
+        linker = FastLinker(self.temp_dir, history)
+        self.assertEqual(linker.disk_link_time, {'a': 3.0})
+        linker.account('a', 1.0, True)
+        self.assertEqual((linker.compared_links, linker.saved_time), (1, 2.0))
+        linker.close()
+
+
+if __name__ == '__main__':
+    blade_test.run(TestFastLink)
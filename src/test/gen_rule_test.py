@@ -11,6 +11,8 @@
 """
 
 
+import os
+
 import blade_test
 
 
@@ -63,6 +65,19 @@ class TestGenRule(blade_test.TargetTest):
         self.assertTrue(gen_rule_index > lower_so_index)
         self.assertTrue(upper_so_index, gen_rule_index)
 
+    def testCachedAction(self):
+        """Test that the gen_rule without srcs is not in the action cache. """
+        self.blade.analyze_targets()
+        self.blade.generate_build_rules()
+        fragment = open(os.path.join(self.current_building_path,
+                                     self.target_path, 'SConscript')).read()
+        self.assertTrue('["build64_release/test_gen_rule/process.tmp"], '
+                        '[time_value], "echo this_is_the_process_gen_rule")'
+                        in fragment)
+        self.assertTrue('["build64_release/test_gen_rule/plowercase.cpp"], '
+                        'MakeCachedAction("cp $SOURCES $TARGETS"))'
+                        in fragment)
+
 
 if __name__ == '__main__':
     blade_test.run(TestGenRule)
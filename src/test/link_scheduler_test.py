@@ -0,0 +1,131 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the link scheduler.
+
+"""
+
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+import blade.link_scheduler
+from blade.link_scheduler import LinkScheduler
+from blade.link_scheduler import estimate_link_jobs
+
+
+_M = 1024 * 1024
+
+
+class TestLinkScheduler(unittest.TestCase):
+    """Test the link scheduler with the available memory stubbed. """
+    def setUp(self):
+        self.available = 8000 * _M
+        self.get_available_memory = blade.link_scheduler.get_available_memory
+        blade.link_scheduler.get_available_memory = lambda: self.available
+        fd, self.history_path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(self.history_path)
+
+    def tearDown(self):
+        blade.link_scheduler.get_available_memory = self.get_available_memory
+        if os.path.exists(self.history_path):
+            os.remove(self.history_path)
+
+    def testEstimateLinkJobs(self):
+        """Test that the link jobs are decided by the largest link. """
+        self.assertEqual(estimate_link_jobs(16, {'a': 1000 * _M,
+                                                 'b': 2000 * _M}), 3)
+        self.assertEqual(estimate_link_jobs(2, {'a': 1000 * _M}), 2)
+        self.assertEqual(estimate_link_jobs(16, {'a': 100000 * _M}), 1)
+        self.available = None
+        self.assertEqual(estimate_link_jobs(16, {}), 8)
+
+    def testAdmission(self):
+        """Test that the links are started within the budget. """
+        scheduler = LinkScheduler(3, self.history_path)
+        scheduler.link_memory = {'a': 3000 * _M, 'b': 3000 * _M,
+                                 'c': 1000 * _M, 'huge': 20000 * _M}
+        # The budget is 75% of 8000M
+        self.assertTrue(scheduler.try_acquire('a'))
+        self.assertTrue(scheduler.try_acquire('b'))
+        self.assertFalse(scheduler.try_acquire('c'))
+        scheduler.release('b')
+        self.assertTrue(scheduler.try_acquire('c'))
+
+        # Not started if the memory available now is not enough
+        self.available = 500 * _M
+        scheduler.release('c')
+        self.assertFalse(scheduler.try_acquire('c'))
+
+        # The first link is always started
+        scheduler.release('a')
+        self.assertTrue(scheduler.try_acquire('huge'))
+        scheduler.release('huge')
+
+    def testLinkJobs(self):
+        """Test that at most link_jobs links run at the same time. """
+        scheduler = LinkScheduler(2, self.history_path)
+        scheduler.link_memory = {'a': _M, 'b': _M, 'c': _M}
+        self.assertTrue(scheduler.try_acquire('a'))
+        self.assertTrue(scheduler.try_acquire('b'))
+        self.assertFalse(scheduler.try_acquire('c'))
+        scheduler.release('a')
+        self.assertTrue(scheduler.try_acquire('c'))
+
+    def testWaitingLinks(self):
+        """Test that at most link_jobs links wait for the memory. """
+        scheduler = LinkScheduler(2, self.history_path)
+        scheduler.link_memory = {'a': 1000 * _M, 'b': 1000 * _M,
+                                 'c': 1000 * _M}
+        scheduler.acquire('a')
+        self.available = 500 * _M
+        threads = [threading.Thread(target=scheduler.acquire, args=(output,))
+                   for output in ('b', 'c')]
+        for thread in threads:
+            thread.setDaemon(True)
+            thread.start()
+        time.sleep(0.2)
+        # One waits for the memory, the other waits for a slot
+        self.assertEqual(scheduler.waiting, 1)
+        self.assertEqual(scheduler.running.keys(), ['a'])
+        self.assertFalse(scheduler.try_acquire('d'))
+
+        scheduler.release('a')
+        time.sleep(0.2)
+        self.assertEqual(len(scheduler.running), 1)
+        self.assertEqual(scheduler.waiting, 1)
+        scheduler.release(scheduler.running.keys()[0])
+        for thread in threads:
+            thread.join()
+        self.assertEqual(scheduler.waiting, 0)
+        self.assertEqual(len(scheduler.running), 1)
+
+    def testReleaseRecordsPeakMemory(self):
+        """Test that the peak memory of the links is saved in the history. """
+        scheduler = LinkScheduler(2, self.history_path)
+        scheduler.acquire('a')
+        self.assertEqual(scheduler.running, {'a': 1024 * _M})
+        scheduler.release('a', 300 * _M)
+        self.assertEqual(scheduler.running, {})
+        scheduler.close()
+
+        scheduler = LinkScheduler(2, self.history_path)
+        self.assertEqual(scheduler.link_memory, {'a': 300 * _M})
+        self.assertEqual(scheduler.running, {})
+        scheduler.close()
+
+
+if __name__ == '__main__':
+    blade_test.run(TestLinkScheduler)
@@ -12,6 +12,8 @@
 """
 
 
+import os
+
 import blade_test
 
 
@@ -62,5 +64,47 @@ class TestLoadBuilds(blade_test.TargetTest):
 
         self.assertEqual(target_count, 10)
 
+    def testBuildFileCache(self):
+        """Test that targets restored from the build file cache are
+
+           the same as the ones loaded by executing the BUILD files.
+
+        """
+        cache_file = os.path.join(self.current_building_path,
+                                  '.blade.build_cache')
+        if os.path.exists(cache_file):
+            os.remove(cache_file)
+        try:
+            results = []
+            for i in range(2):
+                self.tearDown()
+                self.doSetUp('test_loadbuilds', build_cache=True)
+                self.assertTrue(os.path.exists(cache_file))
+                for target in self.all_targets.values():
+                    self.assertEqual(target.blade, self.blade)
+                results.append((
+                        sorted(self.all_command_targets),
+                        sorted([(key, target.expanded_deps)
+                                for key, target in self.all_targets.items()])))
+            self.assertEqual(results[0], results[1])
+        finally:
+            os.remove(cache_file)
+
+    def testParallelLoading(self):
+        """Test that targets loaded in parallel are the same as the ones
+
+           loaded serially.
+
+        """
+        results = []
+        for load_jobs in (1, 4):
+            self.tearDown()
+            self.doSetUp('test_query', load_jobs=load_jobs)
+            results.append((
+                    sorted(self.all_command_targets),
+                    sorted([(key, target.type, target.expanded_deps)
+                            for key, target in self.all_targets.items()])))
+        self.assertEqual(results[0], results[1])
+
 if __name__ == '__main__':
     blade_test.run(TestLoadBuilds)
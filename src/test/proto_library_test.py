@@ -86,6 +86,13 @@ class TestProtoLibrary(blade_test.TargetTest):
         self.assertTrue('librpc_meta_info_proto.so' in lower_depends_libs)
         self.assertTrue('librpc_option_proto.so' in lower_depends_libs)
 
+    def testRuntimeExportIncs(self):
+        """Test that the export_incs of protobuf reach the dependers. """
+        targets = self.blade.get_build_targets()
+        lower = targets[(self.target_path, 'lowercase')]
+        self.assertTrue('thirdparty/protobuf/include' in
+                        lower._get_incs_list(False))
+
 
 if __name__ == '__main__':
     blade_test.run(TestProtoLibrary)
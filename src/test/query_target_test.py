@@ -46,6 +46,18 @@ class TestQuery(blade_test.TargetTest):
         self.assertTrue(depended_one_key in depended_by)
         self.assertTrue(depended_second_key in depended_by)
 
+    def testDependersIndex(self):
+        """Test the reverse dependency index matches the expanded deps. """
+        for key in self.all_targets:
+            dependers = [tkey for tkey in self.all_targets
+                         if key in self.all_targets[tkey].expanded_deps]
+            self.assertEqual(sorted(dependers),
+                             sorted(self.blade.get_all_dependers(key)))
+        direct_dependers = self.blade.get_direct_dependers(
+                ('test_query', 'poppy'))
+        self.assertTrue(('test_query', 'poppy_mock') in direct_dependers)
+        self.assertTrue(('test_query', 'poppy_client') in direct_dependers)
+
 
 if __name__ == '__main__':
     blade_test.run(TestQuery)
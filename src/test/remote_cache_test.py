@@ -0,0 +1,151 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for the remote cache client, which runs against
+ the remote-cache-server shipped with blade.
+
+"""
+
+
+import imp
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import blade_test
+
+sys.path.append('..')
+from blade.remote_cache import RemoteCache
+
+
+_SERVER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            '..', '..', 'remote-cache-server')
+
+
+def _unused_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+class TestRemoteCache(unittest.TestCase):
+    """Test the remote cache client with a local server. """
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, 'server')
+        os.mkdir(self.cache_dir)
+        server_module = imp.load_source('remote_cache_server', _SERVER_PATH)
+        self.server = server_module.CacheServer(('127.0.0.1', 0),
+                                                self.cache_dir, False)
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.setDaemon(True)
+        self.server_thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def _server_file(self, kind, name):
+        return os.path.join(self.cache_dir, kind, name[:2], name)
+
+    def testHit(self):
+        """Test that the file on the server is downloaded. """
+        server_file = self._server_file('obj', 'abcdef')
+        os.makedirs(os.path.dirname(server_file))
+        open(server_file, 'wb').write('content')
+        cache = RemoteCache(self.url)
+        path = os.path.join(self.temp_dir, 'local', 'abcdef')
+        self.assertTrue(cache.get('obj', 'abcdef', path))
+        self.assertEqual(open(path, 'rb').read(), 'content')
+        # The connection is reused
+        self.assertTrue(cache.get('obj', 'abcdef', path))
+        self.assertEqual(len(cache.idle_connections), 1)
+        self.assertEqual((cache.hit_count, cache.miss_count), (2, 0))
+        cache.close()
+
+    def testMiss(self):
+        """Test that the missing file is counted as a miss. """
+        cache = RemoteCache(self.url)
+        path = os.path.join(self.temp_dir, 'abcdef')
+        self.assertFalse(cache.get('obj', 'abcdef', path))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual((cache.hit_count, cache.miss_count), (0, 1))
+        self.assertEqual(cache.failures, 0)
+        cache.close()
+
+    def testUpload(self):
+        """Test that the file is uploaded before the client is closed. """
+        path = os.path.join(self.temp_dir, 'abcdef')
+        open(path, 'wb').write('content')
+        cache = RemoteCache(self.url)
+        cache.put('obj', 'abcdef', path)
+        cache.close()
+        self.assertEqual(cache.upload_count, 1)
+        self.assertEqual(open(self._server_file('obj', 'abcdef'), 'rb').read(),
+                         'content')
+
+    def testReadOnly(self):
+        """Test that nothing is uploaded to the read only cache. """
+        path = os.path.join(self.temp_dir, 'abcdef')
+        open(path, 'wb').write('content')
+        cache = RemoteCache(self.url, read_only=True)
+        cache.put('obj', 'abcdef', path)
+        cache.close()
+        self.assertFalse(os.path.exists(self._server_file('obj', 'abcdef')))
+
+    def testFailureThreshold(self):
+        """Test that the server is not requested after failures in a row. """
+        cache = RemoteCache('http://127.0.0.1:%d' % _unused_port(),
+                            failure_threshold=2, retry_interval=60)
+        path = os.path.join(self.temp_dir, 'abcdef')
+        self.assertFalse(cache.get('obj', 'abcdef', path))
+        self.assertTrue(cache._is_available())
+        self.assertFalse(cache.get('obj', 'abcdef', path))
+        self.assertFalse(cache._is_available())
+
+        # The circuit is closed again after the retry interval
+        cache.netloc = '127.0.0.1:%d' % self.server.server_address[1]
+        self.assertFalse(cache.get('obj', 'abcdef', path))
+        self.assertEqual(cache.failures, 2)
+        cache.disabled_until = time.time()
+        self.assertFalse(cache.get('obj', 'abcdef', path))
+        self.assertEqual(cache.failures, 0)
+        self.assertEqual(cache.miss_count, 4)
+        cache.close()
+
+    def testTimeout(self):
+        """Test that a server which never responds is a failure. """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('127.0.0.1', 0))
+        sock.listen(1)
+        try:
+            cache = RemoteCache('http://127.0.0.1:%d' % sock.getsockname()[1],
+                                timeout=0.2, failure_threshold=1)
+            connection = cache._get_connection(False)[0]
+            self.assertEqual(connection.timeout, 0.2)
+            connection.close()
+            start = time.time()
+            self.assertFalse(cache.get('obj', 'abcdef',
+                                       os.path.join(self.temp_dir, 'abcdef')))
+            self.assertTrue(time.time() - start < 2)
+            self.assertFalse(cache._is_available())
+            cache.close()
+        finally:
+            sock.close()
+
+
+if __name__ == '__main__':
+    blade_test.run(TestRemoteCache)
@@ -11,6 +11,8 @@
 """
 
 
+import os
+
 import blade_test
 
 
@@ -71,6 +73,25 @@ class TestSwigLibrary(blade_test.TargetTest):
         self.assertDynamicLinkFlags(swig_python_so)
         self.assertDynamicLinkFlags(swig_java_so)
 
+    def testBuildFileCacheOptions(self):
+        """Test that the options are not restored from the build file cache. """
+        build_path = self.current_building_path
+        cache_files = [os.path.join(build_path, name) for name in (
+                '.blade.build_cache', '.blade.sconstruct', '.blade.sconscripts')]
+        fragment_path = os.path.join(build_path, self.target_path, 'SConscript')
+        try:
+            for generate_java in (True, False):
+                self.tearDown()
+                self.doSetUp('test_swig_library', generate_php=False,
+                             generate_java=generate_java, build_cache=True)
+                self.blade.generate_build_rules()
+                fragment = open(fragment_path).read()
+                self.assertEqual('swig -java' in fragment, generate_java)
+        finally:
+            for cache_file in cache_files:
+                if os.path.exists(cache_file):
+                    os.remove(cache_file)
+
 
 if __name__ == '__main__':
     blade_test.run(TestSwigLibrary)
@@ -14,6 +14,7 @@
 
 import os
 import blade_test
+from blade import dependency_analyzer
 
 
 class TestDepsAnalyzing(blade_test.TargetTest):
@@ -77,6 +78,52 @@ class TestDepsAnalyzing(blade_test.TargetTest):
         self.assertTrue(java_jar_prebuild in java_jar_deps)
         self.assertTrue(cc_library_poppy not in java_jar_deps)
 
+    def testLinkOrder(self):
+        """Test that a target is always after the targets depend on it. """
+        for key, target in self.all_targets.items():
+            deps = target.expanded_deps
+            self.assertEqual(len(deps), len(set(deps)))
+            for i, dep in enumerate(deps):
+                for dep_of_dep in self.all_targets[dep].expanded_deps:
+                    self.assertTrue(deps.index(dep_of_dep) > i,
+                                    '%s: %s should be after %s' % (
+                                    key, dep_of_dep, dep))
+
+    def testCompactTargets(self):
+        """Test that targets have no __dict__ and share interned keys. """
+        for key, target in self.all_targets.items():
+            self.assertFalse(hasattr(target, '__dict__'), target.type)
+            self.assertEqual(target.fullname, '%s:%s' % key)
+            for dep in target.expanded_deps:
+                self.assertTrue(dep is self.all_targets[dep].key)
+
+    def testLoopDependency(self):
+        """Test that the full loop path is reported. """
+        class FakeTarget(object):
+            def __init__(self, deps):
+                self.expanded_deps = deps
+        a, b, c, d = [('loop', name) for name in 'abcd']
+        targets = {
+            a: FakeTarget([b]),
+            b: FakeTarget([c]),
+            c: FakeTarget([d]),
+            d: FakeTarget([b]),
+        }
+        errors = []
+        def error_exit(msg):
+            errors.append(msg)
+            raise SystemExit(1)
+        old_error_exit = dependency_analyzer.console.error_exit
+        dependency_analyzer.console.error_exit = error_exit
+        try:
+            self.assertRaises(SystemExit,
+                              dependency_analyzer._find_all_deps,
+                              a, targets, {})
+        finally:
+            dependency_analyzer.console.error_exit = old_error_exit
+        self.assertEqual(errors, ['loop dependency found: //loop:b --> '
+                                  '//loop:c --> //loop:d --> //loop:b'])
+
 
 if __name__ == '__main__':
     blade_test.run(TestDepsAnalyzing)
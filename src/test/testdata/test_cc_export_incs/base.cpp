@@ -0,0 +1,3 @@
+int base() {
+    return 0;
+}
@@ -0,0 +1,3 @@
+int middle() {
+    return 0;
+}
@@ -0,0 +1,3 @@
+int top() {
+    return 0;
+}
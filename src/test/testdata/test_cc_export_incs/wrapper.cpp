@@ -0,0 +1,3 @@
+int wrapper() {
+    return 0;
+}
@@ -0,0 +1,3 @@
+int is_upper_char(int c) {
+    return c >= 'A' && c <= 'Z';
+}
@@ -0,0 +1,7 @@
+std::string Join(const std::vector<std::string>& strings) {
+    std::string result;
+    for (size_t i = 0; i < strings.size(); ++i) {
+        result += strings[i];
+    }
+    return result;
+}
@@ -0,0 +1,7 @@
+std::string Repeat(const std::string& s, int n) {
+    std::string result;
+    for (int i = 0; i < n; ++i) {
+        result += s;
+    }
+    return result;
+}
@@ -0,0 +1,5 @@
+std::string Repeat(const std::string& s, int n);
+
+int main() {
+    return Repeat("a", 2) == "aa" ? 0 : 1;
+}
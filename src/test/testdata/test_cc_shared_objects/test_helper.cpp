@@ -0,0 +1,5 @@
+#include "test_helper.h"
+
+int TestHelper() {
+    return 0;
+}
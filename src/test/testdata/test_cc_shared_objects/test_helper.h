@@ -0,0 +1,6 @@
+#ifndef TEST_HELPER_H
+#define TEST_HELPER_H
+
+int TestHelper();
+
+#endif
@@ -0,0 +1,7 @@
+static int value() {
+    return 2;
+}
+
+int conflict() {
+    return value();
+}
@@ -0,0 +1,8 @@
+int one();
+int two();
+int three();
+int conflict();
+
+int main() {
+    return one() + two() + three() + conflict() - 5;
+}
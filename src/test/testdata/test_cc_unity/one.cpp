@@ -0,0 +1,7 @@
+static int value() {
+    return 1;
+}
+
+int one() {
+    return value();
+}
@@ -0,0 +1,3 @@
+int three() {
+    return 1;
+}
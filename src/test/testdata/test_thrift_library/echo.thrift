@@ -0,0 +1,5 @@
+namespace cpp test
+
+struct EchoRequest {
+    1: string message
+}
@@ -0,0 +1,97 @@
+# Copyright (c) 2013 Tencent Inc.
+# All rights reserved.
+#
+# Author: Feng Chen <phongchen@tencent.com>
+
+
+"""
+ This is the test module for thrift_library target.
+
+"""
+
+
+import os
+import sys
+
+import blade_test
+
+sys.path.append('..')
+from blade.rules_generator import SconsRulesGenerator
+
+
+class TestThriftLibrary(blade_test.TargetTest):
+    """Test thrift_library """
+    def setUp(self):
+        """setup method. """
+        self.doSetUp('test_thrift_library')
+
+    def _generated_cpp_files(self):
+        target = self.all_targets[(self.target_path, 'echo_thrift')]
+        return target._thrift_gen_cpp_files(target.path, 'echo.thrift')
+
+    def _write_thrift_file(self, content):
+        f = open(os.path.join(self.target_path, 'echo.thrift'), 'w')
+        try:
+            f.write(content)
+        finally:
+            f.close()
+
+    def testBuildFileCache(self):
+        """Test that the cached target is reloaded if the thrift file is
+
+           changed, the generated files depend on its content.
+
+        """
+        cache_file = os.path.join(self.current_building_path,
+                                  '.blade.build_cache')
+        thrift_file = os.path.join(self.target_path, 'echo.thrift')
+        content = open(thrift_file).read()
+        try:
+            results = []
+            for service in ('', 'service EchoServer {\n}\n'):
+                self._write_thrift_file(content + service)
+                self.tearDown()
+                self.doSetUp('test_thrift_library', build_cache=True)
+                results.append(self._generated_cpp_files())
+            self.assertTrue(os.path.exists(cache_file))
+            server_cpp = os.path.join(self.current_building_path,
+                                      self.target_path, 'EchoServer.cpp')
+            self.assertFalse(server_cpp in results[0])
+            self.assertTrue(server_cpp in results[1])
+        finally:
+            self._write_thrift_file(content)
+            if os.path.exists(cache_file):
+                os.remove(cache_file)
+
+    def testReuseRules(self):
+        """Test that the rules are regenerated if the thrift file is changed. """
+        build_path = self.current_building_path
+        fragment_path = os.path.join(build_path, self.target_path, 'SConscript')
+        cache_files = [os.path.join(build_path, name) for name in (
+                '.blade.build_cache', '.blade.sconstruct', '.blade.sconscripts')]
+        content = open(os.path.join(self.target_path, 'echo.thrift')).read()
+        try:
+            fragments = []
+            fingerprints = []
+            for service in ('', 'service EchoServer {\n}\n'):
+                self._write_thrift_file(content + service)
+                self.tearDown()
+                self.doSetUp('test_thrift_library', build_cache=True)
+                self.blade.generate_build_rules()
+                fragments.append(open(fragment_path).read())
+                generator = SconsRulesGenerator('SConstruct', self.blade_path,
+                                                self.blade)
+                fingerprints.append(generator._target_fingerprint(
+                        (self.target_path, 'echo_thrift')))
+            self.assertNotEqual(fingerprints[0], fingerprints[1])
+            self.assertFalse('EchoServer.cpp' in fragments[0])
+            self.assertTrue('EchoServer.cpp' in fragments[1])
+        finally:
+            self._write_thrift_file(content)
+            for cache_file in cache_files:
+                if os.path.exists(cache_file):
+                    os.remove(cache_file)
+
+
+if __name__ == '__main__':
+    blade_test.run(TestThriftLibrary)